@@ -0,0 +1,450 @@
+"""Local stand-in for the hosted/self-hosted backends used by generate.py.
+
+Shapes: OpenAI /v1/chat/completions (also vLLM/TGI), Anthropic /v1/messages,
+Ollama /api/chat and /api/generate, plus the OpenAI Batch and Anthropic
+Message Batches endpoints. Streaming, latency distributions, token rates and
+error / 429 injection are configurable. Standard library only.
+
+    python -m bench.mock_server --port 8800 --ttft lognormal:0.3,0.5 --tps 60 --rate_limit 0.02
+"""
+import argparse
+import email.parser
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+SEG_ID = re.compile(r"<seg id=(\d+)>")
+# 스트리밍/usage 단위: 태그 하나 또는 단어 하나(+공백) = 1 토큰
+PIECE = re.compile(r"<[^>]*>|[^<\s]+\s*|\s+")
+TRAILER = " Note: the post-edited segment above keeps the original meaning."
+
+
+def parse_dist(spec: str):
+    """'fixed:0.2' | 'uniform:a,b' | 'exp:mean' | 'lognormal:median,sigma' -> sampler in seconds."""
+    kind, _, args = spec.partition(":")
+    vals = [float(x) for x in args.split(",") if x] if args else []
+    if kind == "fixed":
+        return lambda: vals[0] if vals else 0.0
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / vals[0])
+    if kind == "lognormal":
+        median, sigma = vals
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class MockConfig:
+    ttft: str = "fixed:0.05"          # 첫 토큰까지 지연 분포
+    tps: float = 200.0                # 출력 토큰/초
+    seg_tokens: int = 30              # segment 하나당 출력 토큰
+    trailing_tokens: int = 0          # </pe> 뒤에 붙는 잡담 (스트리밍 조기 중단 효과 측정)
+    error_rate: float = 0.0           # 500 비율
+    rate_limit: float = 0.0           # 429 비율
+    retry_after: float = 1.0
+    max_concurrency: int = 0          # 초과 요청은 429 (0 = 무제한)
+    batch_delay: float = 0.5          # batch job이 끝나기까지 걸리는 시간
+    cached_ratio: float = 0.0         # usage에 보고할 캐시된 입력 비율
+    load_time: float = 0.0            # Ollama: (model, num_ctx)가 바뀔 때 모델 로드 시간 (한 번에 하나만 상주)
+
+
+class MockState:
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.ttft = parse_dist(cfg.ttft)
+        self.inflight = 0
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0, "model_loads": 0}
+        self.loaded = None           # Ollama에 상주 중인 (model, num_ctx)
+        self.load_lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def answer(self, prompt: str) -> str:
+        ids = SEG_ID.findall(prompt)
+        words = " ".join(["edited"] * max(self.cfg.seg_tokens - 2, 1))  # 태그 2개 + 단어
+        if len(ids) > 1:
+            text = "\n".join(f"<pe id={k}>{words}</pe>" for k in ids)
+        else:
+            text = f"<pe>{words}</pe>"
+        if self.cfg.trailing_tokens:
+            text += (TRAILER * (self.cfg.trailing_tokens // 12 + 1))
+        return text
+
+    def pieces(self, text: str):
+        return PIECE.findall(text)
+
+
+def _multipart_file(content_type: str, body: bytes) -> bytes:
+    msg = email.parser.BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    for part in msg.get_payload():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True)
+    raise ValueError("multipart body has no 'file' part")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, *args):
+        pass
+
+    # ---- helpers ----
+    def _json(self, obj, status: int = 200, headers: Optional[dict] = None):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _text(self, text: str, content_type: str = "application/jsonl"):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: str) -> bool:
+        raw = data.encode("utf-8")
+        try:
+            self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 </pe>에서 끊음
+            return False
+
+    def _end_stream(self):
+        try:
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(n) if n else b""
+
+    def _inject(self, anthropic: bool = False) -> bool:
+        """Maybe answer with an injected error; returns True if the request was consumed."""
+        st, cfg = self.state, self.state.cfg
+        with st.lock:
+            st.counts["requests"] += 1
+            overloaded = cfg.max_concurrency and st.inflight >= cfg.max_concurrency
+        if overloaded or random.random() < cfg.rate_limit:
+            with st.lock:
+                st.counts["rate_limited"] += 1
+            err = {"type": "error", "error": {"type": "rate_limit_error", "message": "mock rate limit"}}
+            self._json(err, 429, {"retry-after": str(cfg.retry_after)})
+            return True
+        if random.random() < cfg.error_rate:
+            with st.lock:
+                st.counts["errors"] += 1
+            self._json({"error": {"type": "api_error", "message": "mock server error"}}, 500)
+            return True
+        return False
+
+    def _generate(self, prompt: str, stream_piece=None):
+        """Sleep like a real server; returns (text, in_tok, out_tok, completed)."""
+        st, cfg = self.state, self.state.cfg
+        text = st.answer(prompt)
+        pieces = st.pieces(text)
+        with st.lock:
+            st.inflight += 1
+        try:
+            time.sleep(st.ttft())
+            if stream_piece is None:
+                time.sleep(len(pieces) / cfg.tps)
+                return text, count_tokens(prompt), len(pieces), True
+            sent = []
+            for p in pieces:
+                if not stream_piece(p):
+                    return "".join(sent), count_tokens(prompt), len(sent), False
+                sent.append(p)
+                time.sleep(1.0 / cfg.tps)
+            return text, count_tokens(prompt), len(pieces), True
+        finally:
+            with st.lock:
+                st.inflight -= 1
+
+    def _cached(self, in_tok: int) -> int:
+        return int(in_tok * self.state.cfg.cached_ratio)
+
+    # ---- routes ----
+    def do_GET(self):
+        st = self.state
+        if self.path in ("/health", "/api/version", "/api/tags", "/"):
+            return self._json({"status": "ok", "version": "mock", **st.counts})
+        m = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+        if m:
+            return self._text(st.files[m.group(1)])
+        m = re.fullmatch(r"/v1/batches/([^/]+)", self.path)
+        if m:
+            return self._json(self._openai_batch(m.group(1)))
+        m = re.fullmatch(r"/v1/messages/batches/([^/]+)", self.path)
+        if m:
+            return self._json(self._anthropic_batch(m.group(1)))
+        m = re.fullmatch(r"/v1/messages/batches/([^/]+)/results", self.path)
+        if m:
+            return self._text(st.files[f"results-{m.group(1)}"])
+        self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/v1/files":
+            fid = f"file-{len(self.state.files)}"
+            self.state.files[fid] = _multipart_file(self.headers["Content-Type"], body).decode("utf-8")
+            return self._json({"id": fid, "object": "file", "purpose": "batch"})
+        data = json.loads(body or b"{}")
+        if self.path == "/v1/chat/completions":
+            return self._openai_chat(data)
+        if self.path == "/v1/messages":
+            return self._anthropic_messages(data)
+        if self.path in ("/api/chat", "/api/generate"):
+            return self._ollama(data)
+        if self.path == "/v1/batches":
+            return self._create_openai_batch(data)
+        if self.path == "/v1/messages/batches":
+            return self._create_anthropic_batch(data)
+        self._json({"error": "not found"}, 404)
+
+    # OpenAI / vLLM / TGI
+    def _openai_chat(self, data: dict):
+        if self._inject():
+            return
+        prompt = "\n".join(m.get("content") or "" for m in data.get("messages", []))
+        model = data.get("model", "mock")
+        if not data.get("stream"):
+            text, tin, tout, _ = self._generate(prompt)
+            return self._json(self._openai_body(model, text, tin, tout))
+        self._start_stream("text/event-stream")
+        emit = lambda p: self._chunk("data: " + json.dumps(
+            {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": p}}]}) + "\n\n")
+        text, tin, tout, done = self._generate(prompt, emit)
+        if done:
+            if (data.get("stream_options") or {}).get("include_usage"):
+                self._chunk("data: " + json.dumps({"choices": [], "usage": self._openai_usage(tin, tout)}) + "\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self._end_stream()
+
+    def _openai_usage(self, tin: int, tout: int) -> dict:
+        return {"prompt_tokens": tin, "completion_tokens": tout, "total_tokens": tin + tout,
+                "prompt_tokens_details": {"cached_tokens": self._cached(tin)}}
+
+    def _openai_body(self, model: str, text: str, tin: int, tout: int) -> dict:
+        return {
+            "id": f"chatcmpl-mock{random.randrange(10**9)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": self._openai_usage(tin, tout),
+        }
+
+    # Anthropic
+    def _anthropic_messages(self, data: dict):
+        if self._inject(anthropic=True):
+            return
+        system = data.get("system") or ""
+        if isinstance(system, list):
+            system = "".join(b.get("text", "") for b in system)
+        prompt = system + "\n" + "\n".join(
+            m["content"] if isinstance(m["content"], str) else "".join(b.get("text", "") for b in m["content"])
+            for m in data.get("messages", [])
+        )
+        model = data.get("model", "mock")
+        if not data.get("stream"):
+            text, tin, tout, _ = self._generate(prompt)
+            return self._json(self._anthropic_body(model, text, tin, tout))
+        self._start_stream("text/event-stream")
+        send = lambda event, obj: self._chunk(f"event: {event}\ndata: {json.dumps({'type': event, **obj})}\n\n")
+        tin = count_tokens(prompt)
+        send("message_start", {"message": {"id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                                           "content": [], "usage": self._anthropic_usage(tin, 1)}})
+        send("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        emit = lambda p: send("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": p}})
+        text, tin, tout, done = self._generate(prompt, emit)
+        if done:
+            send("content_block_stop", {"index": 0})
+            send("message_delta", {"delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": tout}})
+            send("message_stop", {})
+            self._end_stream()
+
+    def _anthropic_usage(self, tin: int, tout: int) -> dict:
+        cached = self._cached(tin)
+        return {"input_tokens": tin - cached, "output_tokens": tout,
+                "cache_creation_input_tokens": 0, "cache_read_input_tokens": cached}
+
+    def _anthropic_body(self, model: str, text: str, tin: int, tout: int) -> dict:
+        return {
+            "id": f"msg_mock{random.randrange(10**9)}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": self._anthropic_usage(tin, tout),
+        }
+
+    # Ollama
+    def _ollama_load(self, model: str, num_ctx) -> int:
+        """Swap the resident model like Ollama does when (model, num_ctx) changes; returns load ns."""
+        st = self.state
+        with st.load_lock:
+            if st.loaded == (model, num_ctx):
+                return 1_000_000
+            time.sleep(st.cfg.load_time)
+            st.loaded = (model, num_ctx)
+            with st.lock:
+                st.counts["model_loads"] += 1
+            return int(st.cfg.load_time * 1e9) + 1_000_000
+
+    def _ollama(self, data: dict):
+        if self._inject():
+            return
+        if "messages" in data:
+            prompt = "\n".join(m.get("content") or "" for m in data["messages"])
+        else:
+            prompt = data.get("prompt", "")
+        model = data.get("model", "mock")
+        chat = self.path == "/api/chat"
+        wrap = (lambda t: {"message": {"role": "assistant", "content": t}}) if chat else (lambda t: {"response": t})
+        load = self._ollama_load(model, (data.get("options") or {}).get("num_ctx"))
+        if not prompt and "messages" not in data:
+            # 빈 prompt = 모델 preload
+            return self._json({"model": model, "response": "", "done": True, "load_duration": load})
+        if data.get("stream", True) is False:
+            text, tin, tout, _ = self._generate(prompt)
+            return self._json({"model": model, **wrap(text), "done": True,
+                               "prompt_eval_count": tin, "eval_count": tout, "load_duration": load})
+        self._start_stream("application/x-ndjson")
+        emit = lambda p: self._chunk(json.dumps({"model": model, **wrap(p), "done": False}) + "\n")
+        text, tin, tout, done = self._generate(prompt, emit)
+        if done:
+            self._chunk(json.dumps({"model": model, **wrap(""), "done": True,
+                                    "prompt_eval_count": tin, "eval_count": tout, "load_duration": load}) + "\n")
+            self._end_stream()
+
+    # Batch APIs: 요청 내용은 제출 시점에 바로 처리하고, batch_delay 뒤에 완료로 보고
+    def _create_openai_batch(self, data: dict):
+        st = self.state
+        bid = f"batch_mock{len(st.batches)}"
+        lines = []
+        for line in st.files[data["input_file_id"]].splitlines():
+            if not line.strip():
+                continue
+            req = json.loads(line)
+            prompt = "\n".join(m.get("content") or "" for m in req["body"].get("messages", []))
+            text = st.answer(prompt)
+            tin, tout = count_tokens(prompt), len(st.pieces(text))
+            lines.append(json.dumps({"id": f"req_{len(lines)}", "custom_id": req["custom_id"], "response": {
+                "status_code": 200, "body": self._openai_body(req["body"].get("model", "mock"), text, tin, tout)},
+                "error": None}))
+        st.files[f"out-{bid}"] = "\n".join(lines) + "\n"
+        st.batches[bid] = {"created": time.time(), "n": len(lines)}
+        self._json(self._openai_batch(bid))
+
+    def _openai_batch(self, bid: str) -> dict:
+        b = self.state.batches[bid]
+        done = time.time() - b["created"] >= self.state.cfg.batch_delay
+        return {"id": bid, "object": "batch", "endpoint": "/v1/chat/completions",
+                "status": "completed" if done else "in_progress",
+                "output_file_id": f"out-{bid}" if done else None, "error_file_id": None,
+                "request_counts": {"total": b["n"], "completed": b["n"] if done else 0, "failed": 0}}
+
+    def _create_anthropic_batch(self, data: dict):
+        st = self.state
+        bid = f"msgbatch_mock{len(st.batches)}"
+        lines = []
+        for req in data.get("requests", []):
+            params = req["params"]
+            system = params.get("system") or ""
+            if isinstance(system, list):
+                system = "".join(b.get("text", "") for b in system)
+            prompt = system + "\n" + "\n".join(m["content"] for m in params.get("messages", []))
+            text = st.answer(prompt)
+            tin, tout = count_tokens(prompt), len(st.pieces(text))
+            lines.append(json.dumps({"custom_id": req["custom_id"], "result": {
+                "type": "succeeded", "message": self._anthropic_body(params.get("model", "mock"), text, tin, tout)}}))
+        st.files[f"results-{bid}"] = "\n".join(lines) + "\n"
+        st.batches[bid] = {"created": time.time(), "n": len(lines)}
+        self._json(self._anthropic_batch(bid))
+
+    def _anthropic_batch(self, bid: str) -> dict:
+        b = self.state.batches[bid]
+        done = time.time() - b["created"] >= self.state.cfg.batch_delay
+        host = self.headers.get("Host", "127.0.0.1")
+        return {"id": bid, "type": "message_batch", "processing_status": "ended" if done else "in_progress",
+                "request_counts": {"processing": 0 if done else b["n"], "succeeded": b["n"] if done else 0,
+                                   "errored": 0, "canceled": 0, "expired": 0},
+                "results_url": f"http://{host}/v1/messages/batches/{bid}/results" if done else None}
+
+
+def start(cfg: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the mock on a daemon thread; the bound port is `server.server_port`."""
+    state = MockState(cfg or MockConfig())
+    handler = type("MockHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def add_config_args(ap: argparse.ArgumentParser):
+    d = MockConfig()
+    ap.add_argument("--ttft", default=d.ttft, help="첫 토큰 지연 분포: fixed:s | uniform:a,b | exp:mean | lognormal:median,sigma")
+    ap.add_argument("--tps", type=float, default=d.tps, help="출력 토큰/초")
+    ap.add_argument("--seg_tokens", type=int, default=d.seg_tokens, help="segment당 출력 토큰 수")
+    ap.add_argument("--trailing_tokens", type=int, default=d.trailing_tokens, help="</pe> 뒤에 붙일 토큰 수")
+    ap.add_argument("--error_rate", type=float, default=d.error_rate, help="500 응답 비율")
+    ap.add_argument("--rate_limit", type=float, default=d.rate_limit, help="429 응답 비율")
+    ap.add_argument("--retry_after", type=float, default=d.retry_after)
+    ap.add_argument("--max_concurrency", type=int, default=d.max_concurrency, help="초과 동시 요청은 429 (0=무제한)")
+    ap.add_argument("--batch_delay", type=float, default=d.batch_delay, help="batch job 완료까지 초")
+    ap.add_argument("--cached_ratio", type=float, default=d.cached_ratio, help="usage에 보고할 캐시된 입력 비율")
+    ap.add_argument("--load_time", type=float, default=d.load_time,
+                    help="Ollama 모델 (model, num_ctx) 교체 시 로드 초 (한 번에 하나만 상주)")
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(**{k: getattr(args, k) for k in MockConfig.__dataclass_fields__})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock OpenAI / Anthropic / Ollama server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8800)
+    add_config_args(ap)
+    args = ap.parse_args()
+    server = start(config_from_args(args), args.host, args.port)
+    print(f"[MOCK] listening on http://{args.host}:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
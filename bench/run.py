@@ -0,0 +1,192 @@
+"""End-to-end throughput benchmark: generate.py against the local mock server.
+
+Runs every (backend, mode) case as its own generate.py process over
+data/inputs/en-ko.jsonl and reports throughput, tail latency, error rate and
+peak memory. Results can be appended to a JSONL file and compared with an
+earlier run to catch regressions between releases.
+
+    python -m bench.run --limit 500 --max_workers 16 --out bench_results.jsonl
+    python -m bench.run --backends openai --modes seg --baseline bench_results.jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench import mock_server
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_INPUT = ROOT / "data" / "inputs" / "en-ko.jsonl"
+BACKENDS = ("openai", "anthropic", "ollama", "hf")
+MODES = ("seg", "doc")
+# 비교 시 값이 클수록 나쁜 지표
+LOWER_IS_BETTER = ("p50_latency", "p95_latency", "p99_latency", "error_rate", "max_rss_mb", "wall_s")
+
+# generate.main()을 실행하고 자기 프로세스의 최대 RSS를 보고하는 자식 프로세스
+CHILD = """
+import json, resource, sys
+sys.path.insert(0, {root!r})
+sys.argv = ["generate.py"] + sys.argv[1:]
+import generate
+try:
+    generate.main()
+finally:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("BENCH_MAXRSS_KB=" + str(rss), file=sys.stderr)
+"""
+
+
+def model_config(base: str) -> str:
+    return f"""models:
+  - name: mock-openai
+    backend: openai
+    model_id: gpt-4o-mini
+  - name: mock-ollama
+    backend: ollama
+    model_id: mock:latest
+    host: {base}
+  - name: mock-hf
+    backend: hf
+    model_id: mock
+    endpoint: {base}/v1/chat/completions
+"""
+
+
+def case_command(backend: str, mode: str, args, cfg_path: Path, out_dir: Path) -> list:
+    # 클라이언트 쪽 rpm/tpm 한도는 풀어둠 (429는 mock의 --rate_limit/--max_concurrency로 주입)
+    cmd = ["--input_file", str(args.input_file), "--output_dir", str(out_dir),
+           "--limit", str(args.limit), "--max_workers", str(args.max_workers),
+           "--rpm", "1e9", "--tpm", "1e12"]
+    if backend == "anthropic":
+        cmd += ["--models", "claude"]
+    else:
+        cmd += ["--config", str(cfg_path), "--models", f"mock-{backend}"]
+    if mode == "doc":
+        cmd.append("--with_doc")
+    return cmd + list(args.extra)
+
+
+def percentile(ordered: list, q: float):
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 3)
+
+
+def summarize(out_file: Path, wall: float) -> dict:
+    recs = [json.loads(l) for l in out_file.open(encoding="utf-8") if l.strip()] if out_file.exists() else []
+    ok = [r for r in recs if not str(r.get("output", "")).startswith("[ERROR]")]
+    lat = sorted(float(r["latency"]) for r in ok if r.get("latency"))
+    out_tok = sum(r.get("output_token", 0) for r in ok)
+    return {
+        "rows": len(recs),
+        "wall_s": round(wall, 2),
+        "rows_per_s": round(len(recs) / wall, 2) if wall else None,
+        "output_tokens_per_s": round(out_tok / wall, 1) if wall else None,
+        "error_rate": round(1 - len(ok) / len(recs), 4) if recs else None,
+        "p50_latency": percentile(lat, 0.5),
+        "p95_latency": percentile(lat, 0.95),
+        "p99_latency": percentile(lat, 0.99),
+    }
+
+
+def run_case(backend: str, mode: str, args, env: dict, cfg_path: Path, work: Path) -> dict:
+    out_dir = work / f"{backend}-{mode}"
+    cmd = [sys.executable, "-c", CHILD.format(root=str(ROOT))] + case_command(backend, mode, args, cfg_path, out_dir)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:], proc.stderr[-4000:], sep="\n", file=sys.stderr)
+        raise RuntimeError(f"{backend}/{mode}: generate.py exited with {proc.returncode}")
+    outputs = sorted(out_dir.glob("*.jsonl"))
+    result = {"backend": backend, "mode": mode, **summarize(outputs[0] if outputs else out_dir / "none", wall)}
+    for line in proc.stderr.splitlines():
+        if line.startswith("BENCH_MAXRSS_KB="):
+            result["max_rss_mb"] = round(int(line.split("=", 1)[1]) / 1024, 1)
+    return result
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list, baseline_path: Path):
+    """Print the change against the latest baseline row for each (backend, mode)."""
+    base = {}
+    for line in baseline_path.open(encoding="utf-8"):
+        if line.strip():
+            r = json.loads(line)
+            base[r["backend"], r["mode"]] = r
+    for r in results:
+        b = base.get((r["backend"], r["mode"]))
+        if not b:
+            continue
+        diffs = []
+        for k in ("rows_per_s", "p95_latency", "p99_latency", "max_rss_mb"):
+            if r.get(k) is None or not b.get(k):
+                continue
+            pct = (r[k] - b[k]) / b[k] * 100
+            worse = pct > 0 if k in LOWER_IS_BETTER else pct < 0
+            flag = " !" if worse and abs(pct) >= 10 else ""
+            diffs.append(f"{k} {pct:+.1f}%{flag}")
+        print(f"[BASELINE {b.get('rev', '?')}] {r['backend']}/{r['mode']}: " + ", ".join(diffs))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark generate.py against the mock server")
+    ap.add_argument("--input_file", type=Path, default=DEFAULT_INPUT)
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    ap.add_argument("--limit", type=int, default=300)
+    ap.add_argument("--max_workers", type=int, default=8)
+    ap.add_argument("--out", type=Path, default=None, help="결과를 추가할 JSONL (릴리스 간 추적용)")
+    ap.add_argument("--baseline", type=Path, default=None, help="비교할 이전 결과 JSONL")
+    ap.add_argument("--extra", nargs=argparse.REMAINDER, default=[],
+                    help="generate.py에 그대로 넘길 인자 (예: --extra --stream --batch_size 4)")
+    mock_server.add_config_args(ap)
+    args = ap.parse_args()
+
+    server = mock_server.start(mock_server.config_from_args(args))
+    base = f"http://127.0.0.1:{server.server_port}"
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "OPENAI_API_KEYS": "mock-key",
+        "ANTHROPIC_BASE_URL": base,
+        "ANTHROPIC_API_KEY": "mock-key",
+    }
+    env.pop("ANTHROPIC_API_KEYS", None)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        work = Path(tmp)
+        cfg_path = work / "models.yaml"
+        cfg_path.write_text(model_config(base), encoding="utf-8")
+        for backend in args.backends:
+            for mode in args.modes:
+                r = run_case(backend, mode, args, env, cfg_path, work)
+                results.append(r)
+                print(json.dumps(r, ensure_ascii=False), flush=True)
+    server.shutdown()
+
+    meta = {"rev": git_rev(), "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "limit": args.limit,
+            "max_workers": args.max_workers, "ttft": args.ttft, "tps": args.tps, "extra": " ".join(args.extra)}
+    if args.baseline and args.baseline.exists():
+        compare(results, args.baseline)
+    if args.out:
+        with args.out.open("a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps({**meta, **r}, ensure_ascii=False) + "\n")
+        print(f"[BENCH] appended {len(results)} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""CLI import-time budget.
+
+Imports each entry module in a fresh interpreter several times, subtracts the
+bare interpreter start-up, and fails (exit 1) when the median is over budget or
+when a backend SDK is imported before any model is selected.
+
+    python -m bench.startup                    # generate, evaluate, results, sweep
+    python -m bench.startup --budget 0.2 --top 10
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("generate", "evaluate", "results", "sweep")
+# 모델을 고르기 전에는 import되면 안 되는 무거운 패키지
+HEAVY = ("openai", "anthropic", "ollama", "requests", "httpx", "torch", "transformers", "pyarrow")
+
+
+def _run(code: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    return time.perf_counter() - t0
+
+
+def measure(module: str, repeat: int) -> float:
+    base = statistics.median(_run("pass") for _ in range(repeat))
+    return max(statistics.median(_run(f"import {module}") for _ in range(repeat)) - base, 0.0)
+
+
+def heavy_imports(module: str) -> list:
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+    return [m for m in out.stdout.strip().split(",") if m]
+
+
+def top_imports(module: str, n: int) -> list:
+    """(cumulative seconds, module) of the slowest imports, from `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                         check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in out.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1e6, parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check CLI import time against a budget")
+    ap.add_argument("--modules", nargs="+", default=list(MODULES))
+    ap.add_argument("--budget", type=float, default=0.3, help="모듈별 import 시간 상한 (초, 인터프리터 시작 제외)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=0, help="가장 느린 import N개 출력")
+    args = ap.parse_args()
+
+    failed = False
+    for module in args.modules:
+        seconds = measure(module, args.repeat)
+        heavy = heavy_imports(module)
+        ok = seconds <= args.budget and not heavy
+        failed |= not ok
+        extra = f" heavy imports: {heavy}" if heavy else ""
+        print(f"[STARTUP] {module}: {seconds:.3f}s (budget {args.budget:.3f}s) {'ok' if ok else 'FAIL'}{extra}")
+        for cum, name in top_imports(module, args.top):
+            print(f"    {cum:7.3f}s {name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from tqdm import tqdm
+from pipeline.io import iter_jsonl, JsonlWriter
+from pipeline.metrics import (METRICS_VERSION, extract_pe, reference_stats, segment_stats,
+                              scores_from_stats, corpus_scores)
+
+# worker 프로세스마다 한 번 받는 참조 통계 (sample_id -> RefStats)
+_REFS = {}
+
+def _init_worker(refs: dict):
+    global _REFS
+    _REFS = refs
+
+def score_chunk(recs: list[dict]) -> list[tuple]:
+    """(sample_id, pe, status, stats) per record; stats is None when there is nothing to score."""
+    out = []
+    for rec in recs:
+        sid = rec.get("sample_id")
+        pe, status = extract_pe(rec.get("output"))
+        ref = _REFS.get(sid)
+        if ref is None:
+            out.append((sid, pe, "no_ref", None))
+        elif pe is None:
+            out.append((sid, pe, status, None))
+        else:
+            out.append((sid, pe, status, segment_stats(pe, ref)))
+    return out
+
+def _fingerprint(path: Path, ref_field: str, draft_field: str) -> str:
+    st = path.stat()
+    key = f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{ref_field}|{draft_field}|{METRICS_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def load_references(path: Path, ref_field: str, draft_field: str, cache_dir: Path | None) -> dict:
+    """sample_id -> RefStats, pickled under cache_dir so every scoring run reuses the same tokenization/n-grams."""
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = cache_dir / f"{path.stem}.{_fingerprint(path, ref_field, draft_field)}.refstats.pkl"
+        if cache_file.exists():
+            with cache_file.open("rb") as f:
+                refs = pickle.load(f)
+            print(f"[REF] {len(refs)} references from cache: {cache_file}")
+            return refs
+
+    refs = {}
+    for row in iter_jsonl(path):
+        if row.get(ref_field) is None:
+            continue
+        refs[row.get("sample_id")] = reference_stats(row[ref_field], row.get(draft_field, row[ref_field]))
+
+    if cache_file is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(refs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    print(f"[REF] {len(refs)} references indexed ({ref_field} vs. draft {draft_field})")
+    return refs
+
+def _chunks(it, size: int):
+    it = iter(it)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def score_file(out_path: Path, pool, score_dir: Path, chunk_size: int) -> dict:
+    """Score one generate.py output file; writes <stem>.scores.jsonl and returns the corpus summary."""
+    seg_path = score_dir / f"{out_path.stem}.scores.jsonl"
+    status, stats = Counter(), []
+    results = pool.map(score_chunk, _chunks(iter_jsonl(out_path), chunk_size)) if pool else \
+        map(score_chunk, _chunks(iter_jsonl(out_path), chunk_size))
+    with JsonlWriter(seg_path) as writer:
+        for chunk in tqdm(results, desc=f"Scoring {out_path.name}"):
+            for sid, pe, st, s in chunk:
+                status[st] += 1
+                rec = {"sample_id": sid, "pe": pe, "pe_status": st}
+                if s is not None:
+                    stats.append(s)
+                    rec.update(scores_from_stats(s, sentence=True))
+                writer.write(rec)
+
+    rows = sum(status.values())
+    summary = {"file": out_path.name, "rows": rows, "scored": len(stats), **corpus_scores(stats),
+               "pe_status": dict(status)}
+    print(f"[SCORE] {out_path.name}: " + " ".join(f"{k}={summary[k]}" for k in
+          ("rows", "scored", "chrf", "bleu", "ter", "edit_rate", "changed_rate")) + f" pe_status={dict(status)}")
+    print(f"[DONE] segment scores: {seg_path}")
+    return summary
+
+def main():
+    ap = argparse.ArgumentParser(description="generate.py 출력에서 <pe>를 추출해 chrF/BLEU/TER/edit rate 계산")
+    ap.add_argument("--outputs", required=True, nargs="+", help="출력 JSONL 파일(들) 또는 glob (예: results/*.jsonl)")
+    ap.add_argument("--input_file", required=True, help="참조/초안이 있는 입력 JSONL (예: data/inputs/en-ko.jsonl)")
+    ap.add_argument("--ref_field", default="tgt_seg",
+                    help="chrF/BLEU/TER 참조 필드 (기본: 초안 tgt_seg, 사람 참조가 있으면 그 필드)")
+    ap.add_argument("--draft_field", default="tgt_seg", help="edit rate 기준 초안 필드")
+    ap.add_argument("--score_dir", default=None, help="문장별 점수/요약 저장 위치 (기본: <출력 폴더>/scores)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="채점 프로세스 수")
+    ap.add_argument("--chunk_size", type=int, default=200, help="프로세스에 한 번에 넘기는 레코드 수")
+    ap.add_argument("--ref_cache", default=".cache/refstats",
+                    help="참조 토큰화/n-gram 통계 캐시 폴더 ('none'이면 사용 안 함)")
+    args = ap.parse_args()
+
+    paths = []
+    for pattern in args.outputs:
+        matched = sorted(glob.glob(pattern)) or [pattern]
+        paths += [Path(p) for p in matched if not p.endswith(".scores.jsonl")]
+
+    cache_dir = None if args.ref_cache == "none" else Path(args.ref_cache)
+    refs = load_references(Path(args.input_file), args.ref_field, args.draft_field, cache_dir)
+
+    summaries = []
+    pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(refs,)) if args.workers > 1 else None
+    if pool is None:
+        _init_worker(refs)
+    try:
+        for path in paths:
+            score_dir = Path(args.score_dir) if args.score_dir else path.parent / "scores"
+            summary = score_file(path, pool, score_dir, args.chunk_size)
+            summary["ref_field"] = args.ref_field
+            summaries.append((score_dir, summary))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for score_dir, summary in summaries:
+        with (score_dir / "summary.jsonl").open("a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,485 @@
 import argparse
-import json
+import sys
+import threading
 import time
 from pathlib import Path
 from tqdm import tqdm
-from prompts.ape_prompt import build_prompt
+from prompts.context import ContextSelector, STRATEGIES, budget_for
+from models.cache import ResponseCache
+from models.ratelimit import limiter_for
+from models.resilience import Resilience, RetryBudget, AIMDLimiter, CircuitBreaker, Backoff, CircuitOpen
+from models.clients import configure_pool, KEY_STRATEGIES
+from pipeline.executor import run_ordered
+from pipeline.io import JsonlIndex, JsonlWriter, succeeded_ids, compact_jsonl, shard_positions, shard_name
+from pipeline.scheduler import group_by_doc, doc_positions, DocPrimer, residency_lanes
+from pipeline.batching import chunk_rows, split_batch_output, split_usage
+from pipeline.planner import plan_run, latency_history, format_plan
+from pipeline.batch_api import run_batch_api
+from pipeline.render import PromptRenderer, Condition
+from pipeline.telemetry import Telemetry
+from pipeline.workqueue import WorkQueue, worker_name
+from prompts.ape_prompt import default_store
 
-def read_jsonl(path: Path) -> list[dict]:
-    rows = []
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip(): rows.append(json.loads(line.strip()))
-    return rows
+# 백엔드가 주는 경우에만 기록하는 usage 필드
+OPTIONAL_USAGE = ("cached_input_token", "load_time", "ttft", "decode_tps", "early_stop", "retries", "local_batch",
+                  "cache_hit")
+# 배치 호출 usage 중 split_usage가 행별로 나누는 필드 (나머지는 호출 단위 값)
+SPLIT_USAGE = ("input_token", "output_token", "latency", "cached_input_token")
 
-def write_jsonl(path: Path, records: list[dict]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+def render(model, renderer: PromptRenderer, rows: list[dict], cond: Condition):
+    if model.telemetry is None:
+        return renderer.render(rows, cond.with_doc, cond.layout, cond.context)
+    with model.telemetry.span("render", model.name):
+        return renderer.render(rows, cond.with_doc, cond.layout, cond.context)
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--models", required=True, help="claude 또는 llama 입력")
+def run_row(model, row: dict, cond: Condition, renderer: PromptRenderer) -> dict:
+    try:
+        system, user, meta = render(model, renderer, [row], cond)
+        text, usage = model.generate(system, user)
+        rec = {
+            "sample_id": row.get("sample_id"),
+            "output": text,
+            "input_token": usage.get("input_token", 0),
+            "output_token": usage.get("output_token", 0),
+            "latency": usage.get("latency", 0),
+        }
+        rec.update({k: usage[k] for k in OPTIONAL_USAGE if k in usage})
+        rec.update(meta)
+        return rec
+    except CircuitOpen:
+        # 백엔드가 계속 실패 -> 남은 데이터를 [ERROR]로 채우지 않고 이 모델 실행을 중단 (--resume으로 이어서)
+        raise
+    except Exception as e:
+        return {"sample_id": row.get("sample_id"), "output": f"[ERROR] {str(e)}"}
+
+def run_batch(model, rows: list[dict], cond: Condition, renderer: PromptRenderer) -> list[dict]:
+    """N segments of one doc in a single request; rows that fail to parse are retried one by one."""
+    if len(rows) == 1:
+        return [run_row(model, rows[0], cond, renderer)]
+    meta = {}
+    try:
+        system, user, meta = render(model, renderer, rows, cond)
+        text, usage = model.generate(system, user)
+        outputs = split_batch_output(text, len(rows))
+    except Exception:
+        outputs = [None] * len(rows)
+        usage = {}
+
+    # 배치 호출의 usage는 파싱에 성공한 row끼리만 나눔 (fallback row는 자기 호출 usage를 가짐)
+    parsed = [o for o in outputs if o is not None]
+    shares = iter(split_usage(usage, parsed))
+    # 하나도 파싱되지 않으면 버려진 배치 호출의 usage를 fallback row들에 batch_wasted_*로 나눠 기록 (비용/지연 합계 유지)
+    wasted = iter(split_usage(usage, outputs) if usage and not parsed else [])
+    # ttft/early_stop/cache_hit 등 호출 단위 값은 모든 row에 복사. retries는 합계가 맞도록 첫 row에만
+    call_usage = {k: usage[k] for k in OPTIONAL_USAGE if k in usage and k not in SPLIT_USAGE and k != "retries"}
+    retries = usage.get("retries")
+    recs = []
+    for row, out in zip(rows, outputs):
+        if out is None:
+            # 누락/형식 오류 segment는 단일 요청으로 fallback
+            rec = run_row(model, row, cond, renderer)
+            rec["batch_fallback"] = True
+            rec.update({f"batch_wasted_{k}": v for k, v in next(wasted, {}).items()})
+        else:
+            rec = {"sample_id": row.get("sample_id"), "output": out, **next(shares), **call_usage, **meta}
+            if retries is not None:
+                rec["retries"], retries = retries, 0
+        rec["batch_size"] = len(rows)
+        recs.append(rec)
+    return recs
+
+# --config 없이 쓰던 기존 모델 이름
+def legacy_model(name: str):
+    # Sonnet 모델 유지
+    if name == "claude":
+        from models.claude import ClaudeModel
+        return ClaudeModel(model_name="claude-3-5-sonnet-20240620")
+    if name == "llama":
+        from models.llama_ollama import OllamaModel
+        return OllamaModel(model_name="llama3.1:8b")
+    raise ValueError(f"지원하지 않는 모델명입니다: {name} (설정 파일 모델은 --config 사용)")
+
+def build_models(args) -> list[tuple[str, object]]:
+    """(출력 파일 prefix, model) 목록."""
+    names = [n.strip() for v in args.models for n in v.split(",") if n.strip()]
+    if not args.config:
+        return [(name, legacy_model(name)) for name in names]
+
+    from models.loaders import load_models_from_yaml
+    models = load_models_from_yaml(Path(args.config), names)
+    missing = set(names) - {m.name for m in models}
+    if missing:
+        raise ValueError(f"설정 파일에 없는 모델: {sorted(missing)} ({args.config})")
+    return [(m.name, m) for m in models]
+
+def make_cache(args):
+    if not args.cache:
+        return None
+    max_age = args.cache_max_age_days * 86400 if args.cache_max_age_days else None
+    return ResponseCache(args.cache, mode=args.cache_mode, max_entries=args.cache_max_entries, max_age=max_age)
+
+def configure_model(model, args, cache, budget=None, telemetry=None):
+    model.telemetry = telemetry
+    if hasattr(model, "key_pool"):
+        model.key_pool.strategy = args.key_strategy
+    model.limiter = limiter_for(model, rpm=args.rpm, tpm=args.tpm)
+    if args.max_attempts > 0:
+        workers = getattr(model, "max_workers", None) or args.max_workers
+        model.resilience = Resilience(
+            max_attempts=args.max_attempts,
+            backoff=Backoff(base=args.backoff_base, cap=args.backoff_cap),
+            budget=budget,
+            aimd=AIMDLimiter(workers),
+            breaker=CircuitBreaker(threshold=args.breaker_threshold, reset_timeout=args.breaker_reset),
+        )
+        if telemetry is not None:
+            def backoff_sleep(seconds, name=model.name):
+                telemetry.record("backoff", seconds, name)
+                time.sleep(seconds)
+            model.resilience.sleep = backoff_sleep
+    if hasattr(model, "endpoints"):
+        model.endpoints.hedge = model.endpoints.hedge or args.hedge
+        # 헤지 스레드 pool 크기 = 모델의 동시 요청 수
+        model.endpoints.max_workers = getattr(model, "max_workers", None) or args.max_workers
+    model.prompt_cache = args.prefix_cache and args.with_doc
+    model.stream = args.stream
+    if hasattr(model, "keep_alive"):
+        if args.keep_alive is not None:
+            model.keep_alive = int(args.keep_alive) if args.keep_alive.lstrip("-").isdigit() else args.keep_alive
+        elif model.prompt_cache and model.keep_alive is None:
+            model.keep_alive = "30m"
+    model.cache = cache
+
+def warm_up(label: str, model, args):
+    """Ollama: 첫 요청 전에 모델을 (설정한 num_ctx로) 메모리에 올림. 로드 시간은 model_load span으로 따로 기록."""
+    if args.no_warmup or args.dry_run or args.batch_api or not hasattr(model, "preload"):
+        return
+    try:
+        loads = model.preload()
+    except Exception as e:
+        print(f"[WARN] {label}: preload 실패 ({e}) -> 첫 요청에서 로드됨")
+        return
+    for host, seconds in loads.items():
+        if model.telemetry is not None:
+            model.telemetry.record("model_load", seconds, model.name, host=host)
+        print(f"[OLLAMA] {label}: {model.model_id} (num_ctx={model.decoding.num_ctx}) loaded on {host} in {seconds:.2f}s")
+
+def make_condition(model, args) -> Condition:
+    context = None
+    if args.with_doc and args.context != "full":
+        budget = args.context_budget or budget_for(model)
+        if not budget:
+            print(f"[WARN] {model.name}: context budget 없음 -> 전체 문서 사용 (--context_budget 지정)")
+        context = ContextSelector(args.context, budget=budget, count_tokens=model.count_tokens,
+                                  counter_name=model.token_counter.name)
+    prefix_cache = args.prefix_cache and args.with_doc
+    return Condition(
+        with_doc=args.with_doc,
+        layout="doc_first" if prefix_cache else "seg_first",
+        context=context,
+        batch_size=max(args.batch_size, 1),
+        prefix_cache=prefix_cache,
+    )
+
+def run_model(label: str, model, rows_source, args, renderer: PromptRenderer, position: int = 0) -> Path:
+    """모델 하나를 자기 worker pool과 출력 파일로 실행."""
+    out_dir = Path(args.output_dir)
+    cond = make_condition(model, args)
+    out_path = out_dir / f"{label}_5_samples.{cond.suffix}.jsonl"
+    if args.shard:
+        # shard마다 자기 파일에 기록 -> results.py merge로 합침
+        out_path = shard_name(out_path, *args.shard)
+    workers = getattr(model, "max_workers", None) or args.max_workers
+    if model.telemetry is not None:
+        model.telemetry.start(model.name)
+
+    done = succeeded_ids(out_path) if args.resume else set()
+    if done:
+        print(f"[RESUME] {label}: {len(done)}개 sample 건너뜀: {out_path}")
+    # prefix_cache: 같은 doc_id를 연속 실행하고 (입력 색인 순서만 재배열), 문서별 첫 요청이 prefix를 캐시한 뒤 나머지를 보냄
+    todo = (row for row in rows_source(by_doc=cond.prefix_cache) if row.get("sample_id") not in done)
+    primer = DocPrimer() if cond.prefix_cache else None
+
+    def task(rows):
+        call = lambda: run_batch(model, rows, cond, renderer)
+        return call() if primer is None else primer.run(rows[0].get("doc_id"), call)
+
+    # batch_size=1이면 row 1개짜리 chunk
+    chunks = chunk_rows(todo, cond.batch_size)
+
+    if args.dry_run:
+        # 같은 조건(cond.suffix)의 이전 출력만 사용 (seg/doc/window/batch는 지연 분포가 다름). shard 출력 포함
+        stem = f"{label}_5_samples.{cond.suffix}"
+        history = latency_history(p for p in [out_dir / f"{stem}.jsonl", *out_dir.glob(f"{stem}.shard*of*.jsonl")]
+                                  if p.is_file())
+        requests = ((rows, *renderer.render(rows, cond.with_doc, cond.layout, cond.context)[:2]) for rows in chunks)
+        plan = plan_run(model, requests, workers, history)
+        print(f"[DRY-RUN] {out_path}\n{format_plan(plan)}")
+        return out_path
+
+    totals = {"input_token": 0, "cached_input_token": 0}
+    if args.batch_api:
+        # 제공자 batch job으로 제출 -> 완료까지 polling -> sample_id로 결과 매핑
+        render = lambda rows: renderer.render(rows, cond.with_doc, cond.layout, cond.context)
+        state_path = out_path.with_name(out_path.name + ".batch.json")
+        recs = run_batch_api(model, chunks, render, state_path, base_url=args.batch_base_url,
+                             job_id=args.batch_job_id, poll=args.batch_poll)
+        jobs = ((None, [rec]) for rec in recs)
+    else:
+        # 결과는 제출 순서대로 반환되며, 완료 즉시 파일에 기록됨
+        # 제출 시각을 붙여 worker가 잡기까지의 대기(queue_wait)를 기록
+        tel = model.telemetry
+
+        def timed_task(item):
+            submitted, rows = item
+            if tel is not None:
+                tel.record("queue_wait", time.perf_counter() - submitted, model.name)
+            return task(rows)
+
+        jobs = run_ordered(timed_task, ((time.perf_counter(), rows) for rows in chunks), workers)
+    with JsonlWriter(out_path, append=args.resume, fsync=args.fsync) as writer:
+        for _, recs in tqdm(jobs, desc=f"Running {label}", position=position):
+            for rec in recs:
+                writer.write(rec)
+                if model.telemetry is not None:
+                    model.telemetry.row(model.name, rec)
+                for k in totals:
+                    totals[k] += rec.get(k, 0)
+
+    if args.resume or cond.prefix_cache or args.batch_api:
+        # 재시도 결과로 대체된 [ERROR] 행 제거 + sample_id 순 정렬
+        compact_jsonl(out_path)
+    cached = totals["cached_input_token"]
+    print(f"[TOKENS] {label}: input={totals['input_token']} cached={cached} uncached={totals['input_token'] - cached}")
+    if model.resilience is not None:
+        print(f"[RETRY] {label}: {model.resilience.stats()}")
+    if hasattr(model, "endpoints"):
+        print(f"[ENDPOINTS] {label}: {model.endpoints.stats()}")
+    if hasattr(model, "engine"):
+        print(f"[LOCAL_BATCH] {label}: {model.engine.summary()}")
+    if model.telemetry is not None:
+        model.telemetry.finish(model.name)
+        print(f"[TELEMETRY] {label}\n{model.telemetry.format_summary(model.name)}")
+    print(f"[DONE] 물리 파일 생성 완료: {out_path}")
+    return out_path
+
+def run_queue(label: str, model, rows_source, args, renderer: PromptRenderer, position: int = 0,
+              queue: WorkQueue = None) -> Path:
+    """--queue 모드: 공유 SQLite 큐에서 task를 lease해서 실행. 마지막에 끝난 worker가 출력 파일을 만듦.
+
+    같은 명령을 한 머신의 여러 프로세스에서 실행하면 빠른 worker가 더 많은 task를 가져감.
+    SQLite WAL 모드는 네트워크 파일시스템(NFS 등)에서 동작하지 않으므로 큐 파일은 로컬 디스크에 둘 것.
+    """
+    cond = make_condition(model, args)
+    mode = cond.suffix
+    out_path = Path(args.output_dir) / f"{label}_5_samples.{mode}.jsonl"
+    workers = getattr(model, "max_workers", None) or args.max_workers
+    worker = worker_name()
+    added = queue.enqueue(label, mode, enumerate(rows_source()))
+    print(f"[QUEUE] {label}/{mode}: {added} tasks added, worker {worker}")
+    if model.telemetry is not None:
+        model.telemetry.start(model.name)
+
+    task = lambda rows: run_batch(model, rows, cond, renderer)
+    primer = DocPrimer() if cond.prefix_cache else None
+    if primer is not None:
+        task = lambda rows: primer.run(rows[0].get("doc_id"), lambda: run_batch(model, rows, cond, renderer))
+
+    # lease를 잡고 있는 동안 주기적으로 갱신 (프로세스가 죽으면 만료 후 다른 worker가 가져감)
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(queue.lease_seconds / 3):
+            queue.renew(label, mode, worker)
+
+    threading.Thread(target=heartbeat, name=f"lease-{label}", daemon=True).start()
+    totals = {"done": 0, "retry": 0, "lost": 0}
+    bar = tqdm(desc=f"Queue {label}", position=position)
+    try:
+        while True:
+            rows = queue.lease(label, mode, worker, workers * cond.batch_size * 2)
+            if not rows:
+                if queue.counts(label, mode).get("leased"):
+                    # 다른 worker가 처리 중 -> 끝나거나 lease가 만료될 때까지 대기
+                    time.sleep(min(queue.lease_seconds / 4, 5.0))
+                    continue
+                break
+            if cond.prefix_cache:
+                rows = list(group_by_doc(rows))
+            for _, recs in run_ordered(task, chunk_rows(rows, cond.batch_size), workers):
+                for k, v in queue.complete(label, mode, worker, recs).items():
+                    totals[k] += v
+                if model.telemetry is not None:
+                    for rec in recs:
+                        model.telemetry.row(model.name, rec)
+                bar.update(len(recs))
+    finally:
+        stop.set()
+        queue.release(label, mode, worker)
+        bar.close()
+
+    print(f"[QUEUE] {label}/{mode}: this worker {totals}")
+    if model.telemetry is not None:
+        model.telemetry.finish(model.name)
+        print(f"[TELEMETRY] {label}\n{model.telemetry.format_summary(model.name)}")
+    counts = queue.counts(label, mode)
+    if counts.get("pending") or counts.get("leased"):
+        return out_path
+    n = queue.export(label, mode, out_path)
+    print(f"[DONE] 물리 파일 생성 완료: {out_path} ({n} rows from {args.queue})")
+    return out_path
+
+def parse_shard(value: str) -> tuple[int, int]:
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {n}), got {i}")
+    return i, n
+
+def add_run_args(ap: argparse.ArgumentParser):
+    """generate.py와 sweep.py가 공유하는 실행 옵션 (입출력, 동시성, resilience, 캐시, telemetry)."""
+    ap.add_argument("--config", default=None, help="모델 설정 YAML (예: config/models.yaml)")
     ap.add_argument("--input_file", required=True)
     ap.add_argument("--output_dir", required=True)
-    ap.add_argument("--with_doc", action="store_true")
     ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--offset", type=int, default=0, help="앞에서 건너뛸 입력 행 수 (--limit보다 먼저 적용)")
+    ap.add_argument("--max_workers", "--concurrency", dest="max_workers", type=int, default=1,
+                    help="모델별 동시 요청 수 (thread pool 크기, 설정의 max_workers가 우선)")
+    ap.add_argument("--rpm", type=float, default=None, help="requests/min 한도 (백엔드 기본값 덮어쓰기)")
+    ap.add_argument("--tpm", type=float, default=None, help="tokens/min 한도 (백엔드 기본값 덮어쓰기)")
+    ap.add_argument("--key_strategy", choices=KEY_STRATEGIES, default="round_robin",
+                    help="API 키 풀 순환 방식 (OPENAI_API_KEYS / ANTHROPIC_API_KEYS)")
+    ap.add_argument("--pool_size", type=int, default=None, help="endpoint별 keep-alive 커넥션 풀 크기")
+    ap.add_argument("--resume", action="store_true",
+                    help="기존 출력 파일에서 성공한 sample_id는 건너뛰고 [ERROR] 행만 재시도")
+    ap.add_argument("--fsync", action="store_true", help="레코드마다 디스크에 fsync")
+    ap.add_argument("--prefix_cache", action="store_true",
+                    help="(--with_doc) 문서 컨텍스트를 앞에 두는 doc_first 레이아웃 + doc_id 단위 스케줄링 + 백엔드 prompt cache")
+    ap.add_argument("--batch_size", type=int, default=1,
+                    help="같은 doc_id의 연속 segment N개를 한 요청으로 묶음 (<pe id=k> 출력)")
+    ap.add_argument("--context_budget", type=int, default=None,
+                    help="문서 컨텍스트 토큰 예산 (기본: 모델 설정의 context_budget 또는 num_ctx - max_tokens)")
+    ap.add_argument("--stream", action="store_true",
+                    help="스트리밍 수신, </pe>가 나오면 생성 중단 (ttft, decode_tps 기록)")
+    ap.add_argument("--keep_alive", default=None, help="Ollama keep_alive (예: 30m, -1). 설정의 keep_alive보다 우선")
+    ap.add_argument("--no_warmup", action="store_true", help="Ollama 모델을 실행 전에 미리 로드하지 않음")
+    ap.add_argument("--max_attempts", type=int, default=4,
+                    help="요청당 최대 시도 횟수 (429/529/5xx/timeout만 재시도, 0이면 resilience 비활성)")
+    ap.add_argument("--backoff_base", type=float, default=1.0, help="지수 backoff 기본 초 (full jitter)")
+    ap.add_argument("--backoff_cap", type=float, default=60.0, help="backoff 최대 초 (Retry-After가 더 길면 그쪽)")
+    ap.add_argument("--retry_budget", type=float, default=0.2,
+                    help="실행 전체 재시도 예산: 첫 시도 수 대비 비율 (+ 최소 10회)")
+    ap.add_argument("--breaker_threshold", type=int, default=5, help="연속 실패 N회면 백엔드 일시 중지")
+    ap.add_argument("--breaker_reset", type=float, default=30.0, help="일시 중지 후 probe까지 대기 초")
+    ap.add_argument("--hedge", action="store_true",
+                    help="replica가 여러 개인 hf/ollama 모델: p95 지연을 넘긴 요청을 다른 replica로 중복 전송")
+    ap.add_argument("--telemetry", default=None,
+                    help="호출별 span/카운터 기록 파일 (.jsonl 또는 .csv). 요약은 항상 출력")
+    ap.add_argument("--metrics_port", type=int, default=None, help="Prometheus text 형식 /metrics 포트")
+    ap.add_argument("--cache", default=None, help="응답 캐시 SQLite 경로 (미지정 시 캐시 사용 안 함)")
+    ap.add_argument("--cache_mode", choices=["readwrite", "replay"], default="readwrite",
+                    help="replay: API 호출 없이 캐시된 응답만 사용")
+    ap.add_argument("--cache_max_entries", type=int, default=None)
+    ap.add_argument("--cache_max_age_days", type=float, default=None)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", required=True, nargs="+",
+                    help="모델 이름(들). --config 없이: claude 또는 llama / --config: 설정 파일의 name (공백 또는 쉼표 구분)")
+    ap.add_argument("--with_doc", action="store_true")
+    ap.add_argument("--shard", type=parse_shard, default=None,
+                    help="i/N: 0부터 시작하는 N개 shard 중 i번째만 실행 (doc_id 단위로 나눔, --offset/--limit 이후 적용)")
+    ap.add_argument("--context", choices=STRATEGIES, default="full",
+                    help="(--with_doc) 문서 컨텍스트 선택: full, window(슬라이딩), head(앞부분+주변), relevant(어휘 겹침)")
+    ap.add_argument("--dry_run", action="store_true",
+                    help="API 호출 없이 모든 프롬프트를 렌더링하고 토큰/비용/소요시간만 추정")
+    ap.add_argument("--batch_api", "--batch-api", dest="batch_api", action="store_true",
+                    help="OpenAI Batch / Anthropic Message Batches로 제출 (저렴, 비대화식). job id는 <output>.batch.json에 저장되어 재실행 시 이어짐")
+    ap.add_argument("--batch_job_id", default=None, help="이미 제출된 batch job에 연결해서 결과만 수집")
+    ap.add_argument("--batch_base_url", default=None,
+                    help="batch API base URL (기본: OPENAI_BASE_URL/ANTHROPIC_BASE_URL 또는 공식 API)")
+    ap.add_argument("--batch_poll", type=float, default=30.0, help="batch 상태 polling 시작 간격(초, 최대 600까지 증가)")
+    ap.add_argument("--queue", default=None,
+                    help="공유 작업 큐 SQLite 경로: 여러 worker 프로세스가 같은 명령으로 task를 나눠 가짐")
+    ap.add_argument("--lease", type=float, default=120.0, help="--queue task lease 초 (실행 중에는 자동 갱신)")
+    ap.add_argument("--queue_attempts", type=int, default=3, help="--queue에서 [ERROR] task를 다시 큐에 넣는 최대 횟수")
+    add_run_args(ap)
     args = ap.parse_args()
 
+    if args.queue and (args.batch_api or args.dry_run):
+        ap.error("--queue cannot be combined with --batch_api or --dry_run")
     in_path = Path(args.input_file)
-    out_dir = Path(args.output_dir)
+    if args.pool_size:
+        configure_pool(args.pool_size)
 
-    # Sonnet 모델 유지
-    if args.models == "claude":
-        from models.claude import ClaudeModel
-        model = ClaudeModel(model_name="claude-3-5-sonnet-20240620")
-    elif args.models == "llama":
-        from models.llama_ollama import OllamaModel
-        model = OllamaModel(model_name="llama3.1:8b")
-    else:
-        raise ValueError("지원하지 않는 모델명입니다.")
+    cache = make_cache(args)
+    models = build_models(args)
+    budget = RetryBudget(ratio=args.retry_budget)
+    telemetry = Telemetry(args.telemetry)
+    if args.metrics_port:
+        telemetry.serve(args.metrics_port)
+        print(f"[TELEMETRY] Prometheus metrics: http://0.0.0.0:{args.metrics_port}/metrics")
+    for _, model in models:
+        configure_model(model, args, cache, budget, telemetry)
+    renderer = PromptRenderer()
 
-    in_data = read_jsonl(in_path)
+    # 줄 단위 byte offset만 먼저 색인 -> offset/limit/shard 선택 후 필요한 행만 파싱
+    index = JsonlIndex(in_path)
+    positions = range(args.offset, len(index))
     if args.limit:
-        in_data = in_data[:args.limit]
-
-    out_dir.mkdir(parents=True, exist_ok=True)
-    outputs = []
-    
-    for row in tqdm(in_data, desc=f"Running {args.models}"):
-        try:
-            system, user = build_prompt(row, args.with_doc)
-            text, usage = model.generate(system, user)
-            outputs.append({
-                "sample_id": row.get("sample_id"),
-                "output": text,
-                "input_token": usage.get("input_token", 0),
-                "output_token": usage.get("output_token", 0),
-                "latency": usage.get("latency", 0),
-            })
-        except Exception as e:
-            outputs.append({"sample_id": row.get("sample_id"), "output": f"[ERROR] {str(e)}"})
-        
-        if args.models == "claude":
-            time.sleep(1)
-
-    suffix = "doc" if args.with_doc else "seg"
-    out_path = out_dir / f"{args.models}_5_samples.{suffix}.jsonl"
-    write_jsonl(out_path, outputs)
-    print(f"[DONE] 물리 파일 생성 완료: {out_path}")
+        positions = positions[:args.limit]
+    if args.shard:
+        positions = shard_positions(index.docs, positions, *args.shard)
+        print(f"[SHARD] {args.shard[0]}/{args.shard[1]}: {len(positions)} of {len(index)} rows")
+
+    def read_input(by_doc: bool = False):
+        # 입력은 스트리밍으로 읽음 (전체를 메모리에 올리지 않음). by_doc: doc_id별로 모은 순서
+        return index.read(doc_positions(index.docs, positions) if by_doc else positions)
+
+    run = run_model
+    if args.queue:
+        queue = WorkQueue(args.queue, lease=args.lease, max_attempts=args.queue_attempts)
+        run = lambda *a, **kw: run_queue(*a, **kw, queue=queue)
+
+    errors = {}
+    if len(models) == 1:
+        label, model = models[0]
+        warm_up(label, model, args)
+        run(label, model, read_input, args, renderer)
+    else:
+        # lane마다 자기 worker pool/출력 파일로 동시에 실행. 입력은 모델마다 색인에서 다시 스트리밍 (메모리 일정).
+        # 렌더링 결과는 PromptRenderer로 공유되며, 느린 모델이 빠른 모델을 막지 않음.
+        # 같은 Ollama 서버를 쓰는 모델은 한 lane에서 (model, num_ctx) 순으로 차례로 실행 (모델 교체 최소화)
+        position = {label: i for i, (label, _) in enumerate(models)}
+
+        def worker(lane):
+            for label, model in lane:
+                try:
+                    warm_up(label, model, args)
+                    run(label, model, read_input, args, renderer, position=position[label])
+                except Exception as e:
+                    errors[label] = e
+
+        threads = [threading.Thread(target=worker, args=(lane,), name=f"run-{lane[0][0]}")
+                   for lane in residency_lanes(models)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for label, e in errors.items():
+            print(f"[ERROR] {label}: {e}")
+
+    if cache is not None:
+        print(f"[CACHE] {cache.stats()}")
+        cache.close()
+    store = default_store()
+    if store.loads:
+        print(f"[TELEMETRY] doc_io: {store.loads} documents loaded in {store.io_seconds:.2f}s")
+    telemetry.close()
+    if errors:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,86 @@
-from .gpts import GPT4o, GPT4oMini
-from .llama3 import LLaMa3_8BInstruct
-from .qwen25 import Qwen25_32BInstruct
-
-REGISTRY = {
-    "gpt-4o": GPT4o,
-    "gpt-4o-mini": GPT4oMini,
-    "llama3-8b-instruct": LLaMa3_8BInstruct,
-    "qwen2.5-32b-instruct": Qwen25_32BInstruct,
-}
\ No newline at end of file
+import importlib
+from collections.abc import Mapping
+from importlib.metadata import entry_points
+
+# 외부 패키지가 모델/백엔드를 등록하는 entry point 그룹
+MODEL_ENTRY_POINTS = "longform_eval.models"
+BACKEND_ENTRY_POINTS = "longform_eval.backends"
+
+
+class LazyRegistry(Mapping):
+    """name -> model class, imported only when that name is looked up.
+
+    Built-ins are "module:attr" strings, so selecting an Ollama model never
+    imports openai (or torch). Third-party packages add names through the
+    `group` entry point group, e.g. in their pyproject.toml:
+
+        [project.entry-points."longform_eval.models"]
+        my-model = "my_pkg.models:MyModel"
+
+    Entry points are scanned on the first lookup that misses the built-ins.
+    """
+
+    def __init__(self, specs: dict, group: str):
+        self.specs = dict(specs)
+        self.group = group
+        self.loaded = {}
+        self.scanned = False
+
+    def register(self, name: str, target):
+        """Add a class (or a "module:attr" string) under `name`."""
+        self.specs[name] = target
+        self.loaded.pop(name, None)
+
+    def _scan(self):
+        if self.scanned:
+            return
+        self.scanned = True
+        for ep in entry_points(group=self.group):
+            self.specs.setdefault(ep.name, ep)   # 같은 이름이면 내장이 우선
+
+    def __getitem__(self, name: str):
+        if name in self.loaded:
+            return self.loaded[name]
+        if name not in self.specs:
+            self._scan()
+        target = self.specs[name]
+        if isinstance(target, str):
+            module, _, attr = target.partition(":")
+            cls = getattr(importlib.import_module(module, __name__), attr)
+        elif hasattr(target, "load"):
+            cls = target.load()
+        else:
+            cls = target
+        self.loaded[name] = cls
+        return cls
+
+    def __contains__(self, name) -> bool:
+        if name in self.specs:
+            return True
+        self._scan()
+        return name in self.specs
+
+    def __iter__(self):
+        self._scan()
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        self._scan()
+        return len(self.specs)
+
+
+# config의 name으로 바로 쓰는 모델
+REGISTRY = LazyRegistry({
+    "gpt-4o": ".gpts:GPT4o",
+    "gpt-4o-mini": ".gpts:GPT4oMini",
+    "llama3-8b-instruct": ".llama3:LLaMa3_8BInstruct",
+    "qwen2.5-32b-instruct": ".qwen25:Qwen25_32BInstruct",
+}, MODEL_ENTRY_POINTS)
+
+# config의 backend: 값 -> 모델 클래스
+BACKENDS = LazyRegistry({
+    "openai": ".basemodel:OpenAIModel",
+    "ollama": ".basemodel:OllamaModel",
+    "hf": ".basemodel:HFChatModel",
+    "local": ".llama3_1:Llama31Model",
+}, BACKEND_ENTRY_POINTS)
@@ -1,13 +1,16 @@
 import os
+import json
 import time
 import math
-import requests
 
-from .tools import timed, rough_token_count, get_keys
+from .tools import timed, get_keys, read_stream, expected_stops, decode_tps, STOP_TAG
+from .cache import cache_key
+from .tokens import get_counter
+from .clients import KeyPool, shared_session, httpx_client, is_rate_limited, retry_after
+from .endpoints import EndpointPool
 
-from openai import OpenAI
 from dataclasses import dataclass, asdict
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 
 
 @dataclass
@@ -26,28 +29,99 @@ class Decoding:
     
 
 class BaseModel:
+    # 백엔드별 기본 처리량 한도 (requests/min, tokens/min). None이면 제한 없음
+    rate_limits: Optional[Dict[str, float]] = None
+    # 문서 컨텍스트 토큰 예산 (prompts.context). None이면 num_ctx에서 유도
+    context_budget: Optional[int] = None
+
     def __init__(self, name: str, model_id: str, decoding: dict | Decoding | None):
         self.name = name
         self.model_id = model_id
         # dict, None 모두 허용. 최종적으로 Decoding 인스턴스로 보관
         self.decoding = decoding if isinstance(decoding, Decoding) else Decoding(**(decoding or {}))
+        # models.cache.ResponseCache (선택). None이면 항상 백엔드 호출
+        self.cache = None
+        # models.ratelimit.RateLimiter (선택). 실제 백엔드 호출에만 적용 (캐시 hit 제외)
+        self.limiter = None
+        # True면 백엔드별 prefix/prompt cache 기능 사용 (doc_first 레이아웃과 함께 사용)
+        self.prompt_cache = False
+        # 오프라인 토큰 카운터 (models.tokens). 설정의 `tokenizer`로 교체 가능
+        self.token_counter = get_counter(None)
+        # True면 스트리밍으로 받고 </pe>가 나오면 생성을 중단 (ttft/decode_tps 기록)
+        self.stream = False
+        # models.resilience.Resilience (선택). 재시도/AIMD/서킷 브레이커. None이면 한 번만 시도
+        self.resilience = None
+        # pipeline.telemetry.Telemetry (선택). limiter 대기/백엔드 호출 span 기록
+        self.telemetry = None
 
     def _call(self, system: str, user: str):
-        """서브클래스에서 구현. (text, in_tok, out_tok) 반환. @timed는 서브클래스에 붙일 것."""
+        """서브클래스에서 구현. (text, in_tok, out_tok[, extra_usage]) 반환. @timed는 서브클래스에 붙일 것."""
         raise NotImplementedError
 
     def generate(self, system: str, user: str):
+        if self.cache is None:
+            return self._resilient(system, user)
+        key = cache_key(self.model_id, self.decoding, system, user)
+        return self.cache.get_or_call(key, lambda: self._resilient(system, user))
+
+    def _resilient(self, system: str, user: str):
+        if self.resilience is None:
+            return self._limited(system, user)
+        # 재시도마다 rate limiter를 다시 거침. latency는 성공한 시도의 값만 남음
+        (text, usage), attempts = self.resilience.call(lambda: self._limited(system, user))
+        return text, {**usage, "retries": attempts - 1}
+
+    def _limited(self, system: str, user: str):
+        tel = self.telemetry
+        if self.limiter is not None:
+            est = self.count_tokens(system) + self.count_tokens(user)
+            t0 = time.perf_counter()
+            self.limiter.acquire(est)
+            if tel is not None:
+                tel.record("limiter_wait", time.perf_counter() - t0, self.name)
+        t0 = time.perf_counter()
+        try:
+            text, usage = self._generate(system, user)
+        except Exception as e:
+            if tel is not None:
+                tel.record("call", time.perf_counter() - t0, self.name, status="error", error=type(e).__name__)
+            raise
+        if tel is not None:
+            if usage.get("load_time"):
+                tel.record("model_load", usage["load_time"], self.name)
+            tel.record("call", usage.get("latency", 0.0), self.name, status="ok",
+                       input_token=usage.get("input_token", 0), output_token=usage.get("output_token", 0),
+                       **{k: usage[k] for k in ("ttft", "decode_tps", "cached_input_token") if usage.get(k) is not None})
+        if self.limiter is not None:
+            self.limiter.settle(est, usage.get("input_token", 0) + usage.get("output_token", 0))
+        return text, usage
+
+    def _generate(self, system: str, user: str):
         # _call은 @timed로 감싸져 (result, latency)를 반환해야 함
-        (text, in_token, out_token), latency = self._call(system, user)
+        (text, in_token, out_token, *extra), latency = self._call(system, user)
+        # 백엔드가 usage를 주지 않으면 로컬 토크나이저로 계산
         if in_token is None:
-            in_token = rough_token_count(user)
+            in_token = self.count_tokens(system) + self.count_tokens(user)
         if out_token is None:
-            out_token = rough_token_count(text)
-        return text, {
+            out_token = self.count_tokens(text)
+        usage = {
             "input_token": int(in_token),
             "output_token": int(out_token),
             "latency": float(latency),
         }
+        if extra and extra[0]:
+            usage.update(extra[0])
+        if usage.get("load_time"):
+            # 모델 로드(교체) 시간은 추론 지연과 분리해서 보고
+            usage["latency"] = max(usage["latency"] - usage["load_time"], 0.0)
+            if usage.get("ttft") is not None:
+                usage["ttft"] = max(usage["ttft"] - usage["load_time"], 0.0)
+        if "ttft" in usage:
+            usage["decode_tps"] = decode_tps(usage["output_token"], usage["latency"], usage["ttft"])
+        return text, usage
+
+    def count_tokens(self, text: str) -> int:
+        return self.token_counter.count(text)
 
     def with_decoding(self, **overrides):
         # 공통 디코딩 덮어쓰기
@@ -61,44 +135,117 @@ class BaseModel:
 # OpenAI
 # -----------------------------
 class OpenAIModel(BaseModel):
+    rate_limits = {"rpm": 500, "tpm": 30000}
+    # pipeline.batch_api 제공자 (--batch_api)
+    batch_provider = "openai"
+
     def __init__(self, name: str, model_id: str, decoding: Decoding | dict | None = None):
         super().__init__(name, model_id, decoding)
         keys = get_keys("OPENAI_API_KEYS")  # ['sk-...','sk-...']
-        self.client = OpenAI(api_key=keys[0])
+        # 키마다 클라이언트 하나, 커넥션 풀(httpx)은 공유
+        self.key_pool = KeyPool(keys)
+        from openai import OpenAI   # openai 모델을 만들 때만 import
+        http_client = httpx_client()
+        self.clients = {
+            k: OpenAI(api_key=k, http_client=http_client, max_retries=0) if http_client else OpenAI(api_key=k, max_retries=0)
+            for k in keys
+        }
 
     @timed
     def _call(self, system: str, user: str):
         kwargs = to_openai_kwargs(self.decoding)
-        resp = self.client.chat.completions.create(
-            model=self.model_id,
-            messages=[
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+        with self.key_pool.lease() as key:
+            try:
+                if self.stream:
+                    return self._stream(self.clients[key], messages, kwargs, expected_stops(user))
+                resp = self.clients[key].chat.completions.create(
+                    model=self.model_id,
+                    messages=messages,
+                    **kwargs,
+                )
+            except Exception as e:
+                if is_rate_limited(e):
+                    self.key_pool.cooldown(key, retry_after(e))
+                raise
+        text = resp.choices[0].message.content.strip()
+        usage = getattr(resp, "usage", None)
+        in_token = getattr(usage, "prompt_tokens", None) if usage else None
+        out_token = getattr(usage, "completion_tokens", None) if usage else None
+        # OpenAI는 1024 토큰 이상의 동일 prefix를 자동 캐시함
+        details = getattr(usage, "prompt_tokens_details", None) if usage else None
+        cached = getattr(details, "cached_tokens", None) if details else None
+        return text, in_token, out_token, _cached_usage(cached)
+
+    def batch_params(self, system: str, user: str) -> dict:
+        """Request body for one line of an OpenAI Batch input file."""
+        return {
+            "model": self.model_id,
+            "messages": [
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
             ],
+            **to_openai_kwargs(self.decoding),
+        }
+
+    def _stream(self, client, messages, kwargs, n_stops):
+        t0 = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=self.model_id,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
             **kwargs,
         )
-        text = resp.choices[0].message.content.strip()
-        usage = getattr(resp, "usage", None)
+        box = {}
+
+        def pieces():
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    box["usage"] = chunk.usage
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content
+
+        try:
+            text, ttft, stopped = read_stream(pieces(), t0, count=n_stops)
+        finally:
+            stream.close()
+        # 조기 중단 시 usage 청크가 오지 않음 -> 로컬 토크나이저로 계산됨
+        usage = box.get("usage")
         in_token = getattr(usage, "prompt_tokens", None) if usage else None
         out_token = getattr(usage, "completion_tokens", None) if usage else None
-        return text, in_token, out_token
+        return text.strip(), in_token, out_token, {"ttft": ttft, "early_stop": stopped}
 
 
 # -----------------------------
 # Ollama
 # -----------------------------
 class OllamaModel(BaseModel):
-    def __init__(self, name, model_id, decoding=None, host=None):
+    def __init__(self, name, model_id, decoding=None, host: str | Sequence[str] | None = None,
+                 keep_alive=None, hedge: bool = False):
         super().__init__(name, model_id, decoding or {})
-        self.host = host or os.getenv("OLLAMA_HOST", "http://localhost:11434")
-        self.chat_url = f"{self.host}/api/chat"
-        self.gen_url  = f"{self.host}/api/generate"
-        self.session = requests.Session()
-        self.session.headers.update({"Connection": "keep-alive"})
+        hosts = [host] if isinstance(host, str) else list(host or [])
+        hosts = [h.rstrip("/") for h in hosts] or [os.getenv("OLLAMA_HOST", "http://localhost:11434")]
+        self.host = hosts[0]
+        # 모델을 메모리에 유지해야 KV cache(같은 prefix) 재사용이 가능함. 예: "30m", -1
+        self.keep_alive = keep_alive
+        # replica 여러 개면 least-outstanding 분산 + health check (+ 선택적 hedging)
+        self.endpoints = EndpointPool(hosts, health_url=lambda h: f"{h}/api/version", hedge=hedge)
 
     @timed
     def _call(self, system: str, user: str):
+        return self.endpoints.call(lambda host, cancel: self._post(host, system, user, cancel))
+
+    def _post(self, host: str, system: str, user: str, cancel=None):
         options = to_ollama_options(self.decoding)
+        # 헤지 요청은 진 쪽을 끊어서 취소할 수 있도록 항상 스트리밍으로 받음
+        # (--stream이 아니면 끝까지 읽고 조기 중단/ttft 없이 비스트리밍과 같은 결과를 돌려줌)
+        stream = self.stream or cancel is not None
+        # 같은 host를 쓰는 모델끼리 keep-alive 커넥션 풀 공유
+        session = shared_session(host)
 
         # 1) most recent Ollama: /api/chat
         chat_payload = {
@@ -108,9 +255,12 @@ class OllamaModel(BaseModel):
                 {"role": "user", "content": user},
             ],
             "options": options,
-            "stream": False,
+            "stream": stream,
         }
-        r = self.session.post(self.chat_url, json=chat_payload, timeout=600)
+        if self.keep_alive is not None:
+            chat_payload["keep_alive"] = self.keep_alive
+        t0 = time.perf_counter()
+        r = session.post(f"{host}/api/chat", json=chat_payload, timeout=600, stream=stream)
 
         # 2) old version: /api/generate pullback
         if r.status_code == 404:
@@ -119,11 +269,17 @@ class OllamaModel(BaseModel):
                 "model": self.model_id,
                 "prompt": prompt,
                 "options": options,
-                "stream": False,
+                "stream": stream,
             }
-            r = self.session.post(self.gen_url, json=gen_payload, timeout=600)
+            if self.keep_alive is not None:
+                gen_payload["keep_alive"] = self.keep_alive
+            r = session.post(f"{host}/api/generate", json=gen_payload, timeout=600, stream=stream)
 
         r.raise_for_status()
+        if cancel is not None:
+            cancel.register(r)
+        if stream:
+            return _read_ndjson_stream(r, t0, expected_stops(user) if self.stream else None)
         data = r.json()
 
         if "message" in data: 
@@ -133,32 +289,67 @@ class OllamaModel(BaseModel):
 
         in_token  = data.get("prompt_eval_count")
         out_token = data.get("eval_count")
-        return text, in_token, out_token
+        return text, in_token, out_token, _load_usage(data)
+
+    def residency_key(self):
+        """(hosts, model_id, num_ctx): Ollama reloads the model whenever the latter two change on a host."""
+        return tuple(self.endpoints.urls), self.model_id, self.decoding.num_ctx
+
+    def preload(self) -> Dict[str, float]:
+        """Load the model with this run's num_ctx on every host (empty prompt); returns host -> load seconds."""
+        payload = {"model": self.model_id, "options": _drop_none({"num_ctx": self.decoding.num_ctx}), "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        loads = {}
+        for host in self.endpoints.urls:
+            t0 = time.perf_counter()
+            r = shared_session(host).post(f"{host}/api/generate", json=payload, timeout=600)
+            r.raise_for_status()
+            loads[host] = _load_usage(r.json()).get("load_time", time.perf_counter() - t0)
+        return loads
 
 
 # -----------------------------
 # HF Chat (vLLM/TGI /v1/chat/completions)
 # -----------------------------
 class HFChatModel(BaseModel):
+    """OpenAI-compatible chat endpoint (vLLM/TGI).
+
+    vLLM (--enable-prefix-caching) and TGI reuse KV blocks for a shared prompt
+    prefix automatically; use the doc_first layout with doc-grouped scheduling
+    so consecutive requests actually share one.
+
+    `endpoint` may be a list of replicas (see models.endpoints.EndpointPool).
+    """
+
     def __init__(
         self,
         name: str,
         model_id: str,
-        endpoint: str,
+        endpoint: str | Sequence[str],
         decoding: Decoding | dict | None = None,
         prompt_adapter=None,
         tgt_lang: str | None = None,
+        hedge: bool = False,
     ):
         super().__init__(name, model_id, decoding or Decoding())
         if not endpoint:
             raise ValueError("HFChatModel requires `endpoint`")
-        self.endpoint = endpoint
+        urls = [endpoint] if isinstance(endpoint, str) else list(endpoint)
+        self.endpoint = urls[0]
+        self.endpoints = EndpointPool(urls, health_url=_health_url, hedge=hedge)
         self.prompt_adapter = prompt_adapter
         self.tgt_lang = tgt_lang
 
     @timed
     def _call(self, system: str, user: str):
+        return self.endpoints.call(lambda url, cancel: self._post(url, system, user, cancel))
+
+    def _post(self, endpoint: str, system: str, user: str, cancel=None):
         kwargs = to_openai_kwargs(self.decoding)
+        # 헤지 요청은 진 쪽을 끊어서 취소할 수 있도록 항상 스트리밍으로 받음
+        # (--stream이 아니면 끝까지 읽고 조기 중단/ttft 없이 비스트리밍과 같은 결과를 돌려줌)
+        stream = self.stream or cancel is not None
 
         if self.prompt_adapter:
             user = self.prompt_adapter(user, self.tgt_lang) if self.tgt_lang else self.prompt_adapter(user)
@@ -171,18 +362,99 @@ class HFChatModel(BaseModel):
             ],
             **kwargs,
         }
-        response = requests.post(self.endpoint, json=payload, timeout=600)
+        if stream:
+            payload.update({"stream": True, "stream_options": {"include_usage": True}})
+        t0 = time.perf_counter()
+        response = shared_session(endpoint).post(endpoint, json=payload, timeout=600, stream=stream)
         response.raise_for_status()
+        if cancel is not None:
+            cancel.register(response)
+        if stream:
+            # 연결을 끊으면 vLLM/TGI가 해당 요청의 생성을 중단함
+            return _read_sse_stream(response, t0, expected_stops(user) if self.stream else None)
         data = response.json()
         text = data["choices"][0]["message"]["content"].strip()
 
         usage = data.get("usage", {}) or {}
         in_token = usage.get("prompt_tokens")
         out_token = usage.get("completion_tokens")
-        return text, in_token, out_token
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        return text, in_token, out_token, _cached_usage(cached)
     
     
 
+def _health_url(endpoint: str) -> str:
+    # vLLM/TGI 모두 서버 루트에 /health 제공
+    base = endpoint.split("/v1/")[0].rstrip("/")
+    return f"{base}/health"
+
+def _stream_timing(ttft, stopped, n_stops) -> dict:
+    # n_stops=None: 취소용으로만 스트리밍한 요청 (끝까지 읽음) -> 비스트리밍 요청과 같은 필드만 기록
+    return {} if n_stops is None else {"ttft": ttft, "early_stop": stopped}
+
+def _read_ndjson_stream(r, t0: float, n_stops: Optional[int]):
+    """Ollama streaming body: one JSON object per line, the last one has done=true + counts.
+
+    Stops at the n_stops-th </pe>; n_stops=None reads the whole body.
+    """
+    final = {}
+
+    def pieces():
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("done"):
+                final.update(data)
+            yield (data.get("message") or {}).get("content") or data.get("response")
+
+    try:
+        text, ttft, stopped = read_stream(pieces(), t0, stop=None if n_stops is None else STOP_TAG, count=n_stops or 1)
+    finally:
+        r.close()
+    return (text.strip(), final.get("prompt_eval_count"), final.get("eval_count"),
+            {**_stream_timing(ttft, stopped, n_stops), **_load_usage(final)})
+
+def _load_usage(data: dict) -> dict:
+    # Ollama load_duration (ns): 모델을 메모리에 올리는 데 쓴 시간 (이미 상주 중이면 거의 0)
+    ns = data.get("load_duration")
+    return {"load_time": ns / 1e9} if ns else {}
+
+def _read_sse_stream(r, t0: float, n_stops: Optional[int]):
+    """OpenAI-compatible SSE body ('data: {...}' lines, terminated by 'data: [DONE]').
+
+    Stops at the n_stops-th </pe>; n_stops=None reads the whole body.
+    """
+    box = {}
+
+    def pieces():
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            body = line[len("data:"):].strip()
+            if body == "[DONE]":
+                return
+            data = json.loads(body)
+            if data.get("usage"):
+                box["usage"] = data["usage"]
+            for choice in data.get("choices") or []:
+                yield (choice.get("delta") or {}).get("content")
+
+    try:
+        text, ttft, stopped = read_stream(pieces(), t0, stop=None if n_stops is None else STOP_TAG, count=n_stops or 1)
+    finally:
+        r.close()
+    usage = box.get("usage") or {}
+    return (
+        text.strip(),
+        usage.get("prompt_tokens"),
+        usage.get("completion_tokens"),
+        {**_stream_timing(ttft, stopped, n_stops), **_cached_usage((usage.get("prompt_tokens_details") or {}).get("cached_tokens"))},
+    )
+
+def _cached_usage(cached: Optional[int]) -> Dict[str, Any]:
+    return {"cached_input_token": int(cached)} if cached is not None else {}
+
 def _drop_none(d: Dict[str, Any]) -> Dict[str, Any]:
     return {k: v for k, v in d.items() if v is not None}
 
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+MODES = ("readwrite", "replay")
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode when a request is not in the cache."""
+
+
+def cache_key(model_id: str, decoding, system: str, user: str) -> str:
+    payload = {
+        "model_id": model_id,
+        "decoding": asdict(decoding) if decoding is not None else None,
+        "system": system,
+        "user": user,
+    }
+    blob = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk (SQLite) content-addressed cache of (text, usage) responses.
+
+    - mode="readwrite": look up first, call the backend on a miss and store the result.
+    - mode="replay": never call the backend; a miss raises CacheMiss.
+    Identical requests already in flight in this process are coalesced into one call.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str = "readwrite",
+        max_entries: Optional[int] = None,
+        max_age: Optional[float] = None,   # seconds
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (choose from {MODES})")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+        self.lock = threading.Lock()
+        self.inflight: dict[str, Future] = {}
+        self.hits = self.misses = self.coalesced = 0
+
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, usage TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.db.commit()
+        self.evict()
+
+    # -----------------------------
+    # storage
+    # -----------------------------
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        with self.lock:
+            row = self.db.execute("SELECT text, usage FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, text: str, usage: dict):
+        if self.mode == "replay":
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, usage, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, text, json.dumps(usage), now, now),
+            )
+            self.db.commit()
+
+    def evict(self):
+        """Drop entries older than max_age, then least-recently-used beyond max_entries."""
+        if self.mode == "replay":
+            return
+        with self.lock:
+            if self.max_age:
+                self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_entries:
+                self.db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+            self.db.commit()
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+    # -----------------------------
+    # lookup + call
+    # -----------------------------
+    def get_or_call(self, key: str, call: Callable[[], Tuple[str, dict]]) -> Tuple[str, dict]:
+        hit = self.get(key)
+        if hit is not None:
+            with self.lock:
+                self.hits += 1
+            text, usage = hit
+            return text, {**usage, "cache_hit": True}
+
+        if self.mode == "replay":
+            with self.lock:
+                self.misses += 1
+            raise CacheMiss(f"replay mode: no cached response for key {key[:12]}")
+
+        with self.lock:
+            fut = self.inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self.inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return fut.result()
+
+        try:
+            text, usage = call()
+            # 에러 응답은 캐시하지 않음
+            if not str(text).startswith("[ERROR]"):
+                self.put(key, text, usage)
+            fut.set_result((text, usage))
+            return text, usage
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            size = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": size}
@@ -2,39 +2,128 @@ import os
 import time
 import anthropic
 
-class ClaudeModel:
-    def __init__(self, model_name="claude-3-5-sonnet-20240620", max_tokens=4096):
+from .basemodel import BaseModel, Decoding
+from .clients import KeyPool, httpx_client, is_rate_limited, retry_after
+from .tools import read_stream, expected_stops, decode_tps
+
+_USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Decoding 필드 -> Messages API 파라미터 (max_tokens는 필수라 항상 보냄)
+_PARAM_NAMES = {"temperature": "temperature", "top_p": "top_p", "stop": "stop_sequences"}
+
+def _usage_dict(usage) -> dict:
+    return {k: getattr(usage, k, None) for k in _USAGE_FIELDS}
+
+class ClaudeModel(BaseModel):
+    # Anthropic tier-1 defaults; override with --rpm/--tpm
+    rate_limits = {"rpm": 50, "tpm": 40000}
+    # pipeline.batch_api 제공자 (--batch_api)
+    batch_provider = "anthropic"
+
+    def __init__(self, model_name="claude-3-5-sonnet-20240620", max_tokens=4096, decoding=None):
+        super().__init__("claude", model_name, decoding or Decoding(max_tokens=max_tokens))
         self.model_name = model_name
-        self.max_tokens = max_tokens
-        self.name = "claude"
+        # 사용자가 지정한 샘플링 필드만 보냄 (--models claude는 지정 없음 -> API 기본값 유지)
+        if decoding is None:
+            self.configured = frozenset()
+        elif isinstance(decoding, dict):
+            self.configured = frozenset(decoding)
+        else:
+            self.configured = frozenset(_PARAM_NAMES)
         
-        api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not api_key:
+        # ANTHROPIC_API_KEYS(쉼표 구분)가 있으면 모든 키를 순환 사용
+        keys = [k.strip() for k in os.environ.get("ANTHROPIC_API_KEYS", "").split(",") if k.strip()]
+        if not keys and os.environ.get("ANTHROPIC_API_KEY"):
+            keys = [os.environ["ANTHROPIC_API_KEY"]]
+        if not keys:
             raise ValueError("ANTHROPIC_API_KEY environment variable is not set.")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.key_pool = KeyPool(keys)
+        http_client = httpx_client()
+        self.clients = {
+            k: anthropic.Anthropic(api_key=k, http_client=http_client, max_retries=0) if http_client else anthropic.Anthropic(api_key=k, max_retries=0)
+            for k in keys
+        }
 
-    def generate(self, system: str, user: str) -> tuple[str, dict]:
-        start_time = time.time()
-        for attempt in range(3):
+    def _generate(self, system: str, user: str) -> tuple[str, dict]:
+        # 재시도는 models.resilience가 담당 -> 여기서는 한 번만 시도하고 실패는 그대로 raise
+        # [Fact] Claude Messages API spec: 'system' is separated from 'messages'
+        # prompt_cache: system 블록(doc_first 레이아웃의 문서 컨텍스트)에 cache breakpoint
+        system_arg = system
+        if self.prompt_cache:
+            system_arg = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        with self.key_pool.lease() as key:
+            start_time = time.time()
             try:
-                # [Fact] Claude Messages API spec: 'system' is separated from 'messages'
-                response = self.client.messages.create(
-                    model=self.model_name,
-                    system=system,
-                    messages=[{"role": "user", "content": user}],
-                    max_tokens=self.max_tokens
-                )
-                text = response.content[0].text
-                latency = time.time() - start_time
-                
-                usage = {
-                    "input_token": response.usage.input_tokens,
-                    "output_token": response.usage.output_tokens,
-                    "latency": round(latency, 2)
-                }
-                return text, usage
+                if self.stream:
+                    text, u, extra = self._stream(self.clients[key], system_arg, user)
+                else:
+                    response = self.clients[key].messages.create(**self._request(system_arg, user))
+                    text, u, extra = response.content[0].text, _usage_dict(response.usage), {}
             except Exception as e:
-                print(f"[Claude Error] {e}. Retrying ({attempt+1}/3)...")
-                time.sleep(2)
-        
-        return "[ERROR] API Failed", {"input_token": 0, "output_token": 0, "latency": 0.0}
\ No newline at end of file
+                if is_rate_limited(e):
+                    self.key_pool.cooldown(key, retry_after(e))
+                raise
+            latency = time.time() - start_time
+
+        # input_tokens는 캐시되지 않은 부분만 셈 -> 캐시 생성/읽기분을 합쳐 전체 입력으로 기록
+        cache_write = u.get("cache_creation_input_tokens") or 0
+        cache_read = u.get("cache_read_input_tokens") or 0
+        out_token = u.get("output_tokens")
+        usage = {
+            "input_token": (u.get("input_tokens") or 0) + cache_write + cache_read,
+            "output_token": out_token if out_token is not None else self.count_tokens(text),
+            "latency": round(latency, 2),
+            "cached_input_token": cache_read,
+            **extra,
+        }
+        if "ttft" in extra:
+            usage["decode_tps"] = decode_tps(usage["output_token"], latency, extra["ttft"])
+        return text, usage
+
+    def with_decoding(self, **overrides):
+        # 새 집합으로 교체 (sweep 변형은 얕은 복사본이라 base 모델과 공유하지 않게)
+        self.configured = self.configured | set(overrides)
+        return super().with_decoding(**overrides)
+
+    def _request(self, system_arg, user: str) -> dict:
+        """messages.create kwargs; decoding is read per request so overrides reach the API."""
+        dec = self.decoding
+        params = {_PARAM_NAMES[f]: getattr(dec, f) for f in self.configured if f in _PARAM_NAMES}
+        return {
+            "model": self.model_name,
+            "system": system_arg,
+            "messages": [{"role": "user", "content": user}],
+            "max_tokens": dec.max_tokens,
+            **{k: v for k, v in params.items() if v is not None},
+        }
+
+    def batch_params(self, system: str, user: str) -> dict:
+        """`params` of one Message Batches request (same shape as messages.create)."""
+        system_arg = system
+        if self.prompt_cache:
+            system_arg = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        return self._request(system_arg, user)
+
+    def _stream(self, client, system_arg, user: str):
+        """Raw event stream; stops (and closes the connection) once </pe> arrives."""
+        t0 = time.perf_counter()
+        stream = client.messages.create(**self._request(system_arg, user), stream=True)
+        u = {}
+
+        def pieces():
+            for event in stream:
+                if event.type == "message_start":
+                    u.update(_usage_dict(event.message.usage))
+                elif event.type == "content_block_delta":
+                    yield getattr(event.delta, "text", None)
+                elif event.type == "message_delta":
+                    u["output_tokens"] = event.usage.output_tokens
+
+        try:
+            text, ttft, stopped = read_stream(pieces(), t0, count=expected_stops(user))
+        finally:
+            stream.close()
+        if stopped:
+            # message_start의 output_tokens는 시작 시점 값 -> 조기 중단이면 로컬로 계산
+            u["output_tokens"] = None
+        return text, u, {"ttft": ttft, "early_stop": stopped}
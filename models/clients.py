@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+KEY_STRATEGIES = ("round_robin", "least_loaded")
+
+_SESSIONS: Dict[str, "requests.Session"] = {}
+_HTTPX = {}
+_LOCK = threading.Lock()
+
+
+def configure_pool(size: int):
+    """Set the per-endpoint connection pool size for clients created afterwards."""
+    global DEFAULT_POOL_SIZE
+    DEFAULT_POOL_SIZE = int(size)
+
+
+def shared_session(base_url: str, pool_size: Optional[int] = None) -> "requests.Session":
+    """One keep-alive requests.Session per endpoint, shared by every model that talks to it."""
+    with _LOCK:
+        sess = _SESSIONS.get(base_url)
+        if sess is None:
+            # requests는 HTTP 백엔드를 실제로 쓸 때만 import (CLI 시작 시간)
+            import requests
+            from requests.adapters import HTTPAdapter
+            size = pool_size or DEFAULT_POOL_SIZE
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            sess.headers.update({"Connection": "keep-alive"})
+            _SESSIONS[base_url] = sess
+        return sess
+
+
+def httpx_client(pool_size: Optional[int] = None):
+    """Shared httpx.Client for the OpenAI/Anthropic SDKs (HTTP/2 if `h2` is installed).
+
+    Returns None when httpx is unavailable so the SDK falls back to its own client.
+    """
+    size = pool_size or DEFAULT_POOL_SIZE
+    with _LOCK:
+        if size in _HTTPX:
+            return _HTTPX[size]
+        try:
+            import httpx
+        except ImportError:
+            return None
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        client = httpx.Client(http2=http2, limits=limits, timeout=httpx.Timeout(600.0, connect=10.0))
+        _HTTPX[size] = client
+        return client
+
+
+class KeyPool:
+    """Rotate requests over every API key we own, cooling down keys that hit a rate limit.
+
+    - round_robin:  next available key in turn
+    - least_loaded: available key with the fewest in-flight requests
+    """
+
+    def __init__(self, keys: List[str], strategy: str = "round_robin", cooldown: float = 60.0):
+        if not keys:
+            raise ValueError("KeyPool requires at least one key")
+        if strategy not in KEY_STRATEGIES:
+            raise ValueError(f"Unknown key strategy: {strategy} (choose from {KEY_STRATEGIES})")
+        self.keys = list(keys)
+        self.strategy = strategy
+        self.default_cooldown = cooldown
+        self.inflight = {k: 0 for k in self.keys}
+        self.cool_until = {k: 0.0 for k in self.keys}
+        self.next = 0
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _available(self, now: float) -> List[str]:
+        return [k for k in self.keys if self.cool_until[k] <= now]
+
+    def acquire(self) -> str:
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                avail = self._available(now)
+                if avail:
+                    break
+                # 모든 키가 쿨다운 중이면 가장 먼저 풀리는 키까지 대기
+                self.cond.wait(min(self.cool_until.values()) - now)
+            if self.strategy == "least_loaded":
+                key = min(avail, key=lambda k: self.inflight[k])
+            else:
+                for _ in range(len(self.keys)):
+                    key = self.keys[self.next % len(self.keys)]
+                    self.next += 1
+                    if key in avail:
+                        break
+            self.inflight[key] += 1
+            return key
+
+    def release(self, key: str):
+        with self.cond:
+            self.inflight[key] -= 1
+            self.cond.notify_all()
+
+    def cooldown(self, key: str, seconds: Optional[float] = None):
+        with self.cond:
+            until = time.monotonic() + (seconds if seconds is not None else self.default_cooldown)
+            self.cool_until[key] = max(self.cool_until[key], until)
+
+    @contextmanager
+    def lease(self):
+        key = self.acquire()
+        try:
+            yield key
+        finally:
+            self.release(key)
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header on the exception's response, if any."""
+    resp = getattr(exc, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,268 @@
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Optional, Sequence
+
+from .clients import shared_session
+from .resilience import is_retryable
+
+
+
+class Cancel:
+    """Cancellation token for one hedged attempt.
+
+    The attempt registers its (streaming) HTTP response; cancelling closes it,
+    which aborts the read and makes the server stop generating.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.responses = []
+        self.lock = threading.Lock()
+
+    def is_set(self) -> bool:
+        return self.event.is_set()
+
+    def register(self, response):
+        with self.lock:
+            if not self.event.is_set():
+                self.responses.append(response)
+                return
+        response.close()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            responses, self.responses = self.responses, []
+        for r in responses:
+            _abort(r)
+
+
+def _abort(response):
+    # 다른 스레드의 blocking read는 close()만으로 깨어나지 않으므로 socket을 shutdown
+    sock = getattr(getattr(getattr(response, "raw", None), "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+class LatencyWindow:
+    """Running quantile over the last `size` successful call latencies."""
+
+    def __init__(self, size: int = 200):
+        self.values = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.values.append(seconds)
+
+    def __len__(self):
+        return len(self.values)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self.lock:
+            if not self.values:
+                return None
+            ordered = sorted(self.values)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class EndpointPool:
+    """Several replicas of one self-hosted model (vLLM/TGI/Ollama).
+
+    - least outstanding requests: each call goes to the healthy replica with
+      the fewest requests in flight
+    - health: `fail_threshold` consecutive connection errors / 5xx take a
+      replica out; a background thread probes `health_url(url)` and puts it back
+    - hedging (optional): if a call runs past the running p95 latency, the same
+      request goes to another replica, whichever finishes first wins and the
+      other one is cancelled. Hedged calls run on a pool sized from
+      `max_workers` (set to the model's worker count), so they never queue.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        health_url: Optional[Callable[[str], str]] = None,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        fail_threshold: int = 3,
+        health_interval: float = 10.0,
+        max_workers: int = 16,
+    ):
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError("EndpointPool requires at least one endpoint")
+        self.urls: List[str] = list(urls)
+        self.health_url = health_url
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.fail_threshold = fail_threshold
+        self.health_interval = health_interval
+        self.max_workers = max_workers
+        self._executor = None
+        self.inflight = {u: 0 for u in self.urls}
+        self.failures = {u: 0 for u in self.urls}
+        self.healthy = {u: True for u in self.urls}
+        self.latency = LatencyWindow()
+        self.counts = {"calls": 0, "hedged": 0, "hedge_wins": 0, "ejected": 0}
+        self.lock = threading.Lock()
+        self._checker = None
+
+    def __len__(self):
+        return len(self.urls)
+
+    # ---- selection / bookkeeping ----
+    def acquire(self, exclude: Sequence[str] = ()) -> Optional[str]:
+        with self.lock:
+            candidates = [u for u in self.urls if u not in exclude]
+            if not candidates:
+                return None
+            # 건강한 replica가 하나도 없으면 전체에서 선택 (멈추지 않도록)
+            pool = [u for u in candidates if self.healthy[u]] or candidates
+            url = min(pool, key=lambda u: self.inflight[u])
+            self.inflight[url] += 1
+            return url
+
+    def release(self, url: str, error: Optional[Exception] = None):
+        with self.lock:
+            self.inflight[url] -= 1
+            if error is None:
+                self.failures[url] = 0
+                return
+            if not is_retryable(error):
+                return
+            self.failures[url] += 1
+            if self.healthy[url] and self.failures[url] >= self.fail_threshold:
+                self.healthy[url] = False
+                self.counts["ejected"] += 1
+                self._start_checker()
+
+    def _run(self, fn: Callable, url: str, cancel: Optional[Cancel] = None,
+             started: Optional[threading.Event] = None):
+        if started is not None:
+            started.set()
+        t0 = time.perf_counter()
+        try:
+            result = fn(url, cancel)
+        except Exception as e:
+            # 헤지에서 진 쪽이 취소되어 난 오류는 replica 실패로 세지 않음
+            self.release(url, None if cancel is not None and cancel.is_set() else e)
+            raise
+        self.release(url)
+        if cancel is None or not cancel.is_set():
+            self.latency.add(time.perf_counter() - t0)
+        return result
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self._executor is None:
+                # worker마다 원 요청 + 헤지 요청 하나
+                self._executor = ThreadPoolExecutor(max_workers=2 * max(self.max_workers, 1),
+                                                    thread_name_prefix="hedge")
+            return self._executor
+
+    # ---- call ----
+    def call(self, fn: Callable):
+        """Run `fn(url, cancel)` on a chosen replica (hedged if enabled); returns fn's result.
+
+        `cancel` is None for plain calls; hedged attempts get a Cancel token
+        and should register their streaming response with it.
+        """
+        with self.lock:
+            self.counts["calls"] += 1
+        url = self.acquire()
+        threshold = self._hedge_after()
+        if threshold is None:
+            return self._run(fn, url)
+
+        pool = self._pool()
+        started = threading.Event()
+        attempts = {}
+        primary_cancel = Cancel()
+        primary = pool.submit(self._run, fn, url, primary_cancel, started)
+        attempts[primary] = (url, primary_cancel)
+        # 헤지 지연은 원 요청이 실제로 시작된 시점부터 (pool 대기 시간 제외)
+        started.wait()
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        backup_url = self.acquire(exclude=[url])
+        if backup_url is None:
+            return primary.result()
+        with self.lock:
+            self.counts["hedged"] += 1
+        backup_cancel = Cancel()
+        backup = pool.submit(self._run, fn, backup_url, backup_cancel)
+        attempts[backup] = (backup_url, backup_cancel)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is backup:
+                        with self.lock:
+                            self.counts["hedge_wins"] += 1
+                    for loser in pending:
+                        self._cancel(loser, *attempts[loser])
+                    return fut.result()
+                error = fut.exception()
+        raise error
+
+    def _cancel(self, fut, url: str, cancel: Cancel):
+        cancel.cancel()
+        if fut.cancel():
+            # 시작 전에 취소됨 -> _run이 release하지 않으므로 여기서
+            self.release(url)
+
+    def _hedge_after(self) -> Optional[float]:
+        if not self.hedge or len(self.urls) < 2 or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    # ---- health checks ----
+    def _start_checker(self):
+        if self.health_url is None or (self._checker is not None and self._checker.is_alive()):
+            return
+        self._checker = threading.Thread(target=self._check_loop, name="endpoint-health", daemon=True)
+        self._checker.start()
+
+    def _check_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            with self.lock:
+                down = [u for u in self.urls if not self.healthy[u]]
+            if not down:
+                return
+            for url in down:
+                if self.probe(url):
+                    with self.lock:
+                        self.healthy[url] = True
+                        self.failures[url] = 0
+
+    def probe(self, url: str) -> bool:
+        try:
+            r = shared_session(url).get(self.health_url(url), timeout=5)
+            return r.status_code < 500
+        except Exception:
+            return False
+
+    def stats(self) -> dict:
+        with self.lock:
+            out = dict(self.counts)
+            out["healthy"] = sum(self.healthy.values())
+            out["endpoints"] = len(self.urls)
+        p95 = self.latency.quantile(0.95)
+        if p95 is not None:
+            out["p95_latency"] = round(p95, 2)
+        return out
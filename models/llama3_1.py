@@ -1,62 +1,148 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-
-class Llama31Model:
-    def __init__(self, model_id="NousResearch/Meta-Llama-3-8B-Instruct"):
-        self.name = "llama3_1"
-        print(f"Loading Model: {model_id}...")
-        
-        # 4-bit Quantization for efficient resource usage
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_use_double_quant=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.bfloat16
-        )
-
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-        self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
-        
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_id,
-            quantization_config=bnb_config,
-            device_map="auto"
-        )
-
-    def generate(self, prompt: str) -> str:
-        try:
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-            
-            # Text-based input formatting for stability
-            prompt_str = self.tokenizer.apply_chat_template(
-                messages, 
-                tokenize=False, 
-                add_generation_prompt=True
-            )
-            
-            inputs = self.tokenizer(prompt_str, return_tensors="pt").to(self.model.device)
-
-            terminators = [
-                self.tokenizer.eos_token_id,
-                self.tokenizer.convert_tokens_to_ids("<|eot_id|>")
-            ]
-
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=2048,
-                eos_token_id=terminators,
-                do_sample=True,
-                temperature=0.6,
-                top_p=0.9,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-            
-            response = outputs[0][inputs.input_ids.shape[-1]:]
-            return self.tokenizer.decode(response, skip_special_tokens=True)
-            
-        except Exception as e:
-            print(f"[Llama Error] {e}")
-            return ""
\ No newline at end of file
+import time
+
+from .basemodel import BaseModel, Decoding, to_hf_generate_kwargs
+from .local_batch import BatchEngine
+from .tools import STOP_TAG, expected_stops, read_stream
+
+# 새로 생성된 마지막 몇 토큰만 디코딩해서 </pe> 등장 여부 확인
+_TAIL_TOKENS = 8
+
+
+class Llama31Model(BaseModel):
+    """Local transformers inference with length-bucketed, padded batches.
+
+    Prompts from concurrent `generate` calls are collected by a BatchEngine,
+    grouped by token length (`batch_size`, `max_padding_waste`) and decoded
+    together; each row stops on EOS/<|eot_id|> or once it has produced all of
+    its </pe> tags. 4-bit loading is used on CUDA only, so small checkpoints
+    run on CPU as well. Per-row stopping needs transformers >= 4.39.
+    """
+
+    def __init__(
+        self,
+        model_id="NousResearch/Meta-Llama-3-8B-Instruct",
+        decoding=None,
+        batch_size: int = 8,
+        max_padding_waste: float = 0.3,
+        max_wait: float = 0.05,
+        device: str | None = None,
+        quantize: bool | None = None,
+    ):
+        super().__init__("llama3_1", model_id, decoding or Decoding(temperature=0.6, top_p=0.9, max_tokens=2048))
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        self.torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"Loading Model: {model_id} ({self.device})...")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # batch 생성은 왼쪽 padding이어야 함
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+
+        load_kwargs = {}
+        if quantize if quantize is not None else self.device == "cuda":
+            # 4-bit Quantization for efficient resource usage (GPU 전용)
+            from transformers import BitsAndBytesConfig
+            load_kwargs["quantization_config"] = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.bfloat16
+            )
+            load_kwargs["device_map"] = "auto"
+        self.model = AutoModelForCausalLM.from_pretrained(model_id, **load_kwargs)
+        if "device_map" not in load_kwargs:
+            self.model.to(self.device)
+        self.model.eval()
+
+        self.terminators = [self.tokenizer.eos_token_id]
+        eot = self.tokenizer.convert_tokens_to_ids("<|eot_id|>")
+        if eot is not None and eot != self.tokenizer.unk_token_id:
+            self.terminators.append(eot)
+
+        self.engine = BatchEngine(self._generate_batch, batch_size, max_padding_waste, max_wait)
+        # batch를 채울 만큼 동시 요청이 들어오도록 (설정의 max_workers가 있으면 그쪽이 우선)
+        self.max_workers = batch_size * 2
+
+    def _prompt_ids(self, system: str, user: str) -> list[int]:
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+        if self.tokenizer.chat_template:
+            return self.tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True)
+        # chat template이 없는 작은 테스트용 체크포인트
+        return self.tokenizer(f"{system}\n\n{user}\n", add_special_tokens=True)["input_ids"]
+
+    def _generate(self, system: str, user: str) -> tuple[str, dict]:
+        t0 = time.perf_counter()
+        ids = self._prompt_ids(system, user)
+        # latency에는 batch를 기다린 시간이 포함됨 (요청 기준 지연)
+        # 디코딩 설정은 요청마다 전달 (sweep 변형이 engine을 공유해도 자기 설정으로 생성, 같은 설정끼리만 batch)
+        kwargs = to_hf_generate_kwargs(self.decoding)
+        item = (ids, expected_stops(user), kwargs)
+        text, out_token, stopped, batch = self.engine.submit(item, len(ids), key=tuple(sorted(kwargs.items()))).result()
+        latency = time.perf_counter() - t0
+        return text, {
+            "input_token": len(ids),
+            "output_token": out_token,
+            "latency": round(latency, 2),
+            "early_stop": stopped,
+            "local_batch": batch,
+        }
+
+    def _generate_batch(self, items: list) -> list:
+        torch = self.torch
+        width = max(len(ids) for ids, _, _ in items)
+        pad = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad] * (width - len(ids)) + ids for ids, _, _ in items], device=self.model.device)
+        attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids, _, _ in items],
+                                      device=self.model.device)
+        stop = _PeStop(self.tokenizer, width, [n for _, n, _ in items])
+
+        with torch.inference_mode():
+            out = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                eos_token_id=self.terminators,
+                pad_token_id=pad,
+                stopping_criteria=[stop],
+                **items[0][2],      # engine이 같은 디코딩 설정끼리만 batch를 만듦
+            )
+
+        results = []
+        ends = set(self.terminators) | {pad}
+        for row, (_, n_stops, _) in zip(out[:, width:].tolist(), items):
+            n_tok = next((i for i, t in enumerate(row) if t in ends), len(row))
+            decoded = self.tokenizer.decode(row[:n_tok], skip_special_tokens=True)
+            text, _, stopped = read_stream([decoded], 0.0, count=n_stops)
+            results.append((text.strip(), n_tok, stopped, len(items)))
+        return results
+
+
+class _PeStop:
+    """Per-row stopping criterion: a row is done once it has emitted `counts[i]` </pe> tags."""
+
+    def __init__(self, tokenizer, prompt_len: int, counts: list[int]):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.counts = counts
+        self.seen = [0] * len(counts)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        done = []
+        for i, row in enumerate(input_ids[:, self.prompt_len:].tolist()):
+            if self.seen[i] >= self.counts[i]:
+                done.append(True)
+                continue
+            # 새 토큰이 포함된 tail에만 있고 직전 tail에는 없던 </pe> = 이번 step에 완성된 태그
+            tail = self.tokenizer.decode(row[-_TAIL_TOKENS:])
+            prev = self.tokenizer.decode(row[-_TAIL_TOKENS:-1]) if len(row) > 1 else ""
+            if tail.count(STOP_TAG) > prev.count(STOP_TAG):
+                self.seen[i] += 1
+            done.append(self.seen[i] >= self.counts[i])
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -1,29 +1,87 @@
 import time
 import ollama
 
-class OllamaModel:
-    def __init__(self, model_name="llama3.1:8b"):
+from .basemodel import BaseModel, to_ollama_options
+from .tools import read_stream, expected_stops, decode_tps
+
+# Decoding 필드 -> Ollama option 이름
+_OPTION_NAMES = {
+    "temperature": "temperature", "top_p": "top_p", "max_tokens": "num_predict", "num_ctx": "num_ctx",
+    "repetition_penalty": "repeat_penalty", "min_p": "min_p", "stop": "stop",
+}
+
+class OllamaModel(BaseModel):
+    def __init__(self, model_name="llama3.1:8b", decoding=None, keep_alive=None, host=None):
+        super().__init__(f"ollama_{model_name.replace(':', '_')}", model_name, decoding)
         self.model_name = model_name
-        self.name = f"ollama_{model_name.replace(':', '_')}"
+        # 사용자가 지정한 디코딩 필드만 options로 보냄 (--models llama는 지정 없음 -> Ollama 기본값 유지)
+        if decoding is None:
+            self.configured = frozenset()
+        elif isinstance(decoding, dict):
+            self.configured = frozenset(decoding)
+        else:
+            self.configured = frozenset(_OPTION_NAMES)
+        # 모듈 전역 클라이언트 대신 모델별 클라이언트 (host별 keep-alive 커넥션 풀)
+        self.client = ollama.Client(host=host)
+        # 모델을 메모리에 유지해야 같은 prefix의 KV cache가 재사용됨
+        self.keep_alive = keep_alive
 
-    def generate(self, system: str, user: str) -> tuple[str, dict]:
+    def _generate(self, system: str, user: str) -> tuple[str, dict]:
         start_time = time.time()
-        try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user}
-                ]
-            )
-            text = response['message']['content']
-            latency = time.time() - start_time
+        t0 = time.perf_counter()
+        # 실패는 raise -> models.resilience가 재시도, generate.py가 [ERROR] 행으로 기록
+        response = self.client.chat(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user}
+            ],
+            options=self.options(),
+            keep_alive=self.keep_alive,
+            stream=self.stream,
+        )
+        extra = {}
+        if self.stream:
+            response, extra = self._read(response, t0, expected_stops(user))
+        text = response['message']['content']
+        latency = time.time() - start_time
             
-            usage = {
-                "input_token": response.get('prompt_eval_count', 0),
-                "output_token": response.get('eval_count', 0),
-                "latency": round(latency, 2)
-            }
-            return text, usage
-        except Exception as e:
-            return f"[ERROR] Ollama failed: {str(e)}", {"input_token": 0, "output_token": 0, "latency": 0.0}
\ No newline at end of file
+        usage = {
+            "input_token": response.get('prompt_eval_count', 0),
+            "output_token": response.get('eval_count') or self.count_tokens(text),
+            "latency": round(latency, 2),
+            **extra,
+        }
+        if "ttft" in extra:
+            usage["decode_tps"] = decode_tps(usage["output_token"], latency, extra["ttft"])
+        return text, usage
+
+    def with_decoding(self, **overrides):
+        # 새 집합으로 교체 (sweep 변형은 얕은 복사본이라 base 모델과 공유하지 않게)
+        self.configured = self.configured | set(overrides)
+        return super().with_decoding(**overrides)
+
+    def options(self) -> dict:
+        names = {_OPTION_NAMES[f] for f in self.configured if f in _OPTION_NAMES}
+        return {k: v for k, v in to_ollama_options(self.decoding).items() if k in names}
+
+    def _read(self, parts, t0: float, n_stops: int):
+        """Consume a chat stream until </pe>; returns a non-stream shaped response + timing."""
+        final = {}
+
+        def pieces():
+            for part in parts:
+                if part.get('done'):
+                    final.update(prompt_eval_count=part.get('prompt_eval_count'), eval_count=part.get('eval_count'))
+                yield part['message']['content']
+
+        gen = pieces()
+        try:
+            text, ttft, stopped = read_stream(gen, t0, count=n_stops)
+        finally:
+            # generator를 닫으면 HTTP 스트림도 닫혀 Ollama가 생성을 중단함
+            gen.close()
+            if hasattr(parts, "close"):
+                parts.close()
+        response = {'message': {'content': text}, **{k: v for k, v in final.items() if v is not None}}
+        return response, {"ttft": ttft, "early_stop": stopped}
@@ -2,12 +2,45 @@ from pathlib import Path
 from typing import Optional, List
 import yaml
 
-from . import REGISTRY
-from .basemodel import BaseModel, Decoding, OpenAIModel, OllamaModel, HFChatModel
+from . import REGISTRY, BACKENDS
+from .basemodel import BaseModel, Decoding
+from .tokens import get_counter
+
+def _apply_model_extras(model: BaseModel, m: dict):
+    # 문서 컨텍스트 토큰 예산 (prompts.context.budget_for): 명시값 또는 num_ctx에서 유도
+    if m.get("context_budget"):
+        model.context_budget = int(m["context_budget"])
+    if m.get("num_ctx"):
+        model.num_ctx = int(m["num_ctx"])
+        # 모델 단위 num_ctx를 요청 options에도 반영 (decoding에 명시한 값이 우선)
+        if model.decoding.num_ctx is None:
+            model.decoding.num_ctx = model.num_ctx
+    # Ollama: 마지막 요청 후 모델을 메모리에 유지하는 시간 (예: "30m", -1). --keep_alive가 우선
+    if m.get("keep_alive") is not None and hasattr(model, "keep_alive"):
+        model.keep_alive = m["keep_alive"]
+    # 로컬 토크나이저 (tokenizer.json 경로, 모델 디렉터리 또는 "tiktoken:<encoding>")
+    # 못 쓰면 (패키지/파일 없음, 오프라인에서 BPE 미캐시) heuristic 유지 -> dry-run 계획에 heuristic으로 표시됨
+    if m.get("tokenizer"):
+        try:
+            model.token_counter = get_counter(m["tokenizer"])
+        except Exception as e:
+            print(f"[WARN] {m['name']}: tokenizer {m['tokenizer']!r} unavailable, using heuristic counts ({e})")
+    # 1M 토큰당 가격 (USD) — dry-run 비용 추정용
+    if m.get("price"):
+        model.price = dict(m["price"])
+    # 모델별 실행 설정: worker pool 크기, {rpm, tpm} 한도
+    if m.get("max_workers"):
+        model.max_workers = int(m["max_workers"])
+    if m.get("rate_limits"):
+        model.rate_limits = dict(m["rate_limits"])
+    # replica가 여러 개인 self-hosted 모델: p95를 넘긴 요청은 다른 replica로 헤지
+    if m.get("hedge") and hasattr(model, "endpoints"):
+        model.endpoints.hedge = True
 
 def load_models_from_yaml(cfg_path: Path, select_names: Optional[List[str]] = None) -> List[BaseModel]:
     cfg = yaml.safe_load(Path(cfg_path).read_text(encoding="utf-8"))
     items = cfg.get("models", [])
+    default_decoding = (cfg.get("defaults") or {}).get("decoding") or {}
     models: List[BaseModel] = []
 
     for m in items:
@@ -16,7 +49,7 @@ def load_models_from_yaml(cfg_path: Path, select_names: Optional[List[str]] = No
             continue
 
         decoding_cfg = m.get("decoding") or {}
-        decoding = decoding_cfg if isinstance(decoding_cfg, Decoding) else Decoding(**decoding_cfg)
+        decoding = decoding_cfg if isinstance(decoding_cfg, Decoding) else Decoding(**{**default_decoding, **decoding_cfg})
 
         # 1) Apply registered models:
         if name in REGISTRY:
@@ -38,6 +71,7 @@ def load_models_from_yaml(cfg_path: Path, select_names: Optional[List[str]] = No
             if "model_id" in m:
                 setattr(model, "model_id", m["model_id"])
 
+            _apply_model_extras(model, m)
             models.append(model)
             continue
 
@@ -46,26 +80,42 @@ def load_models_from_yaml(cfg_path: Path, select_names: Optional[List[str]] = No
         model_id = m.get("model_id")
 
         if backend == "openai":
-            model = OpenAIModel(name=name, model_id=model_id, decoding=decoding)
+            model = BACKENDS["openai"](name=name, model_id=model_id, decoding=decoding)
 
         elif backend == "ollama":
             host = m.get("host")
-            model = OllamaModel(name=name, model_id=model_id, decoding=decoding, host=host)
+            model = BACKENDS["ollama"](name=name, model_id=model_id, decoding=decoding, host=host)
 
         elif backend == "hf":
             endpoint = m.get("endpoint")
             if not endpoint:
                 raise ValueError(f"[{name}] backend=hf requires 'endpoint'")
-            model = HFChatModel(
+            model = BACKENDS["hf"](
                 name=name,
                 model_id=model_id,
                 decoding=decoding,
                 endpoint=endpoint,
             )
 
+        elif backend == "local":
+            # transformers로 직접 추론 (length-bucket batch). torch는 이 경우에만 import
+            model = BACKENDS["local"](
+                model_id=model_id,
+                decoding=decoding,
+                batch_size=int(m.get("batch_size", 8)),
+                max_padding_waste=float(m.get("max_padding_waste", 0.3)),
+                device=m.get("device"),
+            )
+            model.name = name
+
+        elif backend in BACKENDS:
+            # entry point로 등록된 외부 백엔드: 나머지 인자는 options로 전달
+            model = BACKENDS[backend](name=name, model_id=model_id, decoding=decoding, **(m.get("options") or {}))
+
         else:
-            raise ValueError(f"Unknown backend: {backend} (model: {name})")
+            raise ValueError(f"Unknown backend: {backend} (model: {name}, available: {sorted(BACKENDS)})")
 
+        _apply_model_extras(model, m)
         models.append(model)
 
     if not models:
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+
+def padding_waste(lengths: Sequence[int]) -> float:
+    """Share of a padded batch that is padding (0.0 = all rows equally long)."""
+    if not lengths:
+        return 0.0
+    return 1.0 - sum(lengths) / (max(lengths) * len(lengths))
+
+
+def length_buckets(items: List[Tuple[int, Any]], batch_size: int, max_waste: float) -> List[list]:
+    """Group (length, item) pairs into batches of similar length.
+
+    Sorted by length, a batch is closed once it is full or adding the next
+    item would push its padding waste over `max_waste`.
+    """
+    buckets, cur = [], []
+    for length, item in sorted(items, key=lambda x: x[0]):
+        if cur and (len(cur) >= batch_size or padding_waste([l for l, _ in cur] + [length]) > max_waste):
+            buckets.append(cur)
+            cur = []
+        cur.append((length, item))
+    if cur:
+        buckets.append(cur)
+    return buckets
+
+
+class BatchEngine:
+    """Collect prompts submitted from many threads and run them as padded batches.
+
+    `run_batch(items)` gets a list of submitted items (one length bucket) and
+    returns one result per item. Callers block on the returned Future, so the
+    usual thread-per-request pipeline (generate.py --max_workers) feeds it.
+    Items are only batched with items submitted under the same `key` (e.g.
+    the generate kwargs of a decoding variant).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list], list],
+        batch_size: int = 8,
+        max_padding_waste: float = 0.3,
+        max_wait: float = 0.05,
+    ):
+        self.run_batch = run_batch
+        self.batch_size = max(batch_size, 1)
+        self.max_padding_waste = max_padding_waste
+        self.max_wait = max_wait
+        self.queue: "queue.Queue[Tuple[int, Any, Future, Any]]" = queue.Queue()
+        self.stats = {"batches": 0, "rows": 0, "padding_waste": 0.0}
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._loop, name="local-batch", daemon=True)
+        self.worker.start()
+
+    def submit(self, item, length: int, key=None) -> Future:
+        fut = Future()
+        self.queue.put((length, item, fut, key))
+        return fut
+
+    def _collect(self) -> list:
+        pending = [self.queue.get()]
+        # 길이 bucket을 고를 여지가 있도록 batch 2개 분량까지 모음
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.batch_size * 2:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for length, item, fut, key in self._collect():
+                groups.setdefault(key, []).append((length, (item, fut)))
+            buckets = [b for pairs in groups.values()
+                       for b in length_buckets(pairs, self.batch_size, self.max_padding_waste)]
+            for bucket in buckets:
+                lengths = [l for l, _ in bucket]
+                items = [item for _, (item, _) in bucket]
+                futs = [fut for _, (_, fut) in bucket]
+                try:
+                    results = self.run_batch(items)
+                except Exception as e:
+                    for fut in futs:
+                        fut.set_exception(e)
+                    continue
+                with self.lock:
+                    self.stats["batches"] += 1
+                    self.stats["rows"] += len(items)
+                    self.stats["padding_waste"] += padding_waste(lengths) * len(items)
+                for fut, res in zip(futs, results):
+                    fut.set_result(res)
+
+    def summary(self) -> dict:
+        with self.lock:
+            rows = self.stats["rows"]
+            return {
+                "batches": self.stats["batches"],
+                "rows": rows,
+                "mean_batch": round(rows / self.stats["batches"], 2) if self.stats["batches"] else 0,
+                "padding_waste": round(self.stats["padding_waste"] / rows, 3) if rows else 0.0,
+            }
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate_per_min` tokens per minute."""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        if rate_per_min <= 0:
+            raise ValueError("rate_per_min must be positive")
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(capacity or rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        # 버킷 용량보다 큰 요청은 용량만큼만 기다림 (영원히 막히지 않도록)
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def debit(self, amount: float):
+        """Charge tokens after the fact (may go negative; later acquires wait it out)."""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """Per-backend requests/min + tokens/min limit. Either side may be None (unlimited)."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def acquire(self, est_tokens: int = 0):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and est_tokens:
+            self.tokens.acquire(est_tokens)
+
+    def settle(self, est_tokens: int, used_tokens: int):
+        # 실제 사용량이 추정치보다 많으면 차액을 추가로 차감
+        if self.tokens and used_tokens > est_tokens:
+            self.tokens.debit(used_tokens - est_tokens)
+
+
+def limiter_for(model, rpm: Optional[float] = None, tpm: Optional[float] = None) -> RateLimiter:
+    """Build a limiter from the backend's `rate_limits` defaults, overridden by explicit values.
+
+    Limits are per API key; with a key pool the aggregate limit scales with the number of keys.
+    """
+    limits = dict(getattr(model, "rate_limits", None) or {})
+    if rpm is not None:
+        limits["rpm"] = rpm
+    if tpm is not None:
+        limits["tpm"] = tpm
+    n_keys = len(getattr(model, "key_pool", None) or [None])
+    scale = lambda v: v * n_keys if v else v
+    return RateLimiter(rpm=scale(limits.get("rpm")), tpm=scale(limits.get("tpm")))
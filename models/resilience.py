@@ -0,0 +1,248 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from .clients import retry_after
+
+# 과부하 신호: 동시성을 줄여야 하는 상태 코드
+OVERLOAD_STATUS = {429, 529}
+RETRYABLE_STATUS = OVERLOAD_STATUS | {408, 500, 502, 503, 504}
+
+
+class CircuitOpen(RuntimeError):
+    """Raised when a backend has tripped its breaker too many times in a row."""
+
+
+class RetryBudgetExceeded(RuntimeError):
+    """Raised when the run-wide retry budget is used up."""
+
+
+def status_of(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_timeout(exc: Exception) -> bool:
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(exc).__name__
+    return is_timeout(exc) or "Connection" in name or isinstance(exc, ConnectionError)
+
+
+def is_overload(exc: Exception) -> bool:
+    return status_of(exc) in OVERLOAD_STATUS or is_timeout(exc)
+
+
+class Backoff:
+    """Exponential backoff with full jitter; a server Retry-After always wins if longer."""
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int, server_hint: Optional[float] = None) -> float:
+        d = random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+        if server_hint is not None:
+            d = max(d, server_hint)
+        return d
+
+
+class RetryBudget:
+    """Run-wide cap on retries: `min_retries` plus `ratio` of all first attempts."""
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        with self.lock:
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+class AIMDLimiter:
+    """Adaptive concurrency: additive increase on success, multiplicative decrease on overload."""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease: float = 0.5):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = min_limit
+        self.decrease = decrease
+        self.limit = float(self.max_limit)
+        self.inflight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+
+    def release(self):
+        with self.cond:
+            self.inflight -= 1
+            self.cond.notify_all()
+
+    def on_success(self):
+        with self.cond:
+            # 한 "창(limit개 요청)"이 성공할 때마다 +1
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def on_overload(self):
+        with self.cond:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+
+
+class CircuitBreaker:
+    """Pause a failing backend instead of turning the rest of the dataset into [ERROR] rows.
+
+    After `threshold` consecutive failures the breaker opens and callers wait
+    `reset_timeout` seconds; then one probe call is let through (half-open).
+    After `max_trips` consecutive trips without a success it gives up and
+    raises CircuitOpen for every call.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0, max_trips: int = 5):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.cond = threading.Condition()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def before_call(self) -> bool:
+        """Block while open. Returns True if this call is the half-open probe."""
+        with self.cond:
+            while True:
+                if self.trips >= self.max_trips:
+                    raise CircuitOpen(f"circuit open after {self.trips} consecutive trips")
+                if self.opened_at is None:
+                    return False
+                wait = self.opened_at + self.reset_timeout - time.monotonic()
+                if wait <= 0 and not self.probing:
+                    self.probing = True     # half-open: 이 호출 하나만 통과
+                    return True
+                self.cond.wait(max(wait, 0.05) if wait > 0 else None)
+
+    def release_probe(self):
+        """Let another probe through if this one ended without success/failure (e.g. interrupted)."""
+        with self.cond:
+            if self.probing:
+                self.probing = False
+                self.cond.notify_all()
+
+    def record_success(self):
+        with self.cond:
+            self.failures = 0
+            self.trips = 0
+            self.opened_at = None
+            self.probing = False
+            self.cond.notify_all()
+
+    def record_failure(self):
+        with self.cond:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+                self.cond.notify_all()
+
+
+class Resilience:
+    """Retry / AIMD / retry-budget / circuit-breaker wrapper around one backend call."""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        backoff: Optional[Backoff] = None,
+        budget: Optional[RetryBudget] = None,
+        aimd: Optional[AIMDLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff()
+        self.budget = budget
+        self.aimd = aimd
+        self.breaker = breaker
+        self.sleep = sleep
+        self.retries = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def call(self, fn: Callable):
+        """Returns (result, attempts). Non-retryable errors are raised immediately."""
+        if self.budget is not None:
+            self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self.breaker.before_call() if self.breaker is not None else False
+            if self.aimd is not None:
+                self.aimd.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.aimd is not None and is_overload(e):
+                    self.aimd.on_overload()
+                if self.breaker is not None:
+                    # 재시도 불가 오류(400 등)는 백엔드가 응답한 것 -> 성공으로 보고 breaker를 닫음
+                    if retryable:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                with self.lock:
+                    self.failures += 1
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                if self.budget is not None and not self.budget.try_spend():
+                    raise RetryBudgetExceeded(f"retry budget exhausted ({e})") from e
+                with self.lock:
+                    self.retries += 1
+                self.sleep(self.backoff.delay(attempt - 1, retry_after(e)))
+                continue
+            finally:
+                if self.aimd is not None:
+                    self.aimd.release()
+                if probe:
+                    self.breaker.release_probe()
+            if self.aimd is not None:
+                self.aimd.on_success()
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result, attempt
+
+    def stats(self) -> dict:
+        out = {"retries": self.retries, "failures": self.failures}
+        if self.aimd is not None:
+            out["concurrency_limit"] = round(self.aimd.limit, 2)
+        if self.breaker is not None:
+            out["breaker"] = self.breaker.state
+        return out
@@ -0,0 +1,80 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from .tools import rough_token_count
+
+
+class TokenCounter:
+    """Offline token counter. `count` is memoized per string."""
+
+    name = "base"
+
+    def __init__(self, cache_size: int = 65536):
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        raise NotImplementedError
+
+
+class HeuristicCounter(TokenCounter):
+    """Script-aware estimate (models.tools.rough_token_count); no files needed."""
+
+    name = "heuristic"
+
+    def _count(self, text: str) -> int:
+        return rough_token_count(text)
+
+
+class HFTokenizerCounter(TokenCounter):
+    """Local HF `tokenizer.json` (file or model directory) via the `tokenizers` package."""
+
+    def __init__(self, path: str, cache_size: int = 65536):
+        super().__init__(cache_size)
+        from tokenizers import Tokenizer
+        p = Path(path)
+        if p.is_dir():
+            p = p / "tokenizer.json"
+        self.tokenizer = Tokenizer.from_file(str(p))
+        self.name = f"hf:{p}"
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class TiktokenCounter(TokenCounter):
+    """tiktoken encoding (e.g. o200k_base); works offline once the BPE file is cached."""
+
+    def __init__(self, encoding: str, cache_size: int = 65536):
+        super().__init__(cache_size)
+        import tiktoken
+        self.enc = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.enc.encode(text, disallowed_special=()))
+
+
+_COUNTERS: dict = {}
+
+def get_counter(spec: Optional[str] = None) -> TokenCounter:
+    """Resolve a tokenizer spec from the model config (shared per spec).
+
+    - None / "heuristic"  -> HeuristicCounter
+    - "tiktoken:<enc>"    -> TiktokenCounter
+    - path to tokenizer.json or a model directory -> HFTokenizerCounter
+    """
+    key = spec or "heuristic"
+    if key not in _COUNTERS:
+        if key == "heuristic":
+            counter = HeuristicCounter()
+        elif key.startswith("tiktoken:"):
+            counter = TiktokenCounter(key.split(":", 1)[1])
+        else:
+            counter = HFTokenizerCounter(key)
+        _COUNTERS[key] = counter
+    return _COUNTERS[key]
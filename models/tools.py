@@ -2,6 +2,7 @@ import time
 from pathlib import Path
 import random
 import os
+import re
 
 
 def timed(call):
@@ -12,10 +13,57 @@ def timed(call):
         return out, latency
     return wrapper
 
+# 한글/가나/한자는 글자당 약 1토큰, 그 외는 단어/구두점 단위로 추정
+_CJK = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af\u3040-\u30ff\u4e00-\u9fff]")
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
 def rough_token_count(text: str) -> int:
     if not text:
         return 0
-    return len(text.split())
+    cjk = len(_CJK.findall(text))
+    pieces = _PIECE.findall(_CJK.sub(" ", text))
+    # 긴 단어는 여러 subword로 쪼개짐 (평균 ~8자/토큰)
+    other = sum(1 + len(p) // 8 for p in pieces)
+    return cjk + other
+
+STOP_TAG = "</pe>"
+
+def expected_stops(user: str) -> int:
+    # 배치 프롬프트(<seg id=k> N개)는 </pe>가 N번 나와야 끝남
+    return user.count("<seg id=") or 1
+
+def read_stream(pieces, t0: float, stop: str | None = STOP_TAG, count: int = 1):
+    """Accumulate streamed text pieces until `stop` has appeared `count` times.
+
+    `t0` is the perf_counter() taken just before the request was sent.
+    Returns (text, ttft, stopped); the caller closes the stream when stopped
+    so the server cancels the rest of the generation.
+    """
+    buf, tail, ttft, seen = [], "", None, 0
+    for piece in pieces:
+        if not piece:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        buf.append(piece)
+        if not stop:
+            continue
+        window = tail + piece
+        seen += window.count(stop)
+        if seen >= count:
+            text = "".join(buf)
+            end = -1
+            for _ in range(count):
+                end = text.find(stop, end + 1)
+            return text[: end + len(stop)], ttft, True
+        tail = window[-(len(stop) - 1):]
+    return "".join(buf), ttft, False
+
+def decode_tps(out_tokens: int, latency: float, ttft: float | None) -> float | None:
+    """Output tokens/sec after the first token (None without a TTFT)."""
+    if ttft is None or latency <= ttft:
+        return None
+    return round(out_tokens / (latency - ttft), 2)
 
 def get_keys(name: str) -> list[str]:
     keys = os.getenv(name)
@@ -0,0 +1,261 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from models.clients import shared_session
+from .batching import split_batch_output, split_usage
+from .io import ERROR_PREFIX
+
+DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com",
+    "anthropic": "https://api.anthropic.com",
+}
+ANTHROPIC_VERSION = "2023-06-01"
+CUSTOM_ID_MAX = 64
+
+
+def custom_id(rows: List[dict]) -> str:
+    """Encode a chunk's sample_ids in the request id, so results map back without extra state."""
+    cid = "s" + "_".join(str(r.get("sample_id")) for r in rows)
+    if len(cid) > CUSTOM_ID_MAX:
+        raise ValueError(f"custom_id too long for {len(rows)} rows; use a smaller --batch_size")
+    return cid
+
+
+def sample_ids(cid: str) -> List[int]:
+    return [int(x) if x.lstrip("-").isdigit() else x for x in cid[1:].split("_")]
+
+
+class OpenAIBatch:
+    """OpenAI Batch API: upload a JSONL file, create a batch, download the output file."""
+
+    name = "openai"
+    max_requests = 50000
+    terminal = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, model, base_url: Optional[str] = None):
+        self.model = model
+        base = base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URLS["openai"]
+        # OPENAI_BASE_URL은 보통 .../v1 형태
+        self.base = base.rstrip("/").removesuffix("/v1")
+        self.session = shared_session(self.base)
+        self.headers = {"Authorization": f"Bearer {model.key_pool.keys[0]}"}
+
+    def _req(self, method: str, path: str, **kwargs):
+        r = self.session.request(method, f"{self.base}/v1{path}", headers=self.headers, timeout=600, **kwargs)
+        r.raise_for_status()
+        return r
+
+    def submit(self, requests: List[Tuple[str, str, str]]) -> str:
+        lines = "".join(
+            json.dumps({
+                "custom_id": cid,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self.model.batch_params(system, user),
+            }, ensure_ascii=False) + "\n"
+            for cid, system, user in requests
+        )
+        f = self._req("POST", "/files", data={"purpose": "batch"},
+                      files={"file": ("batch.jsonl", lines.encode("utf-8"), "application/jsonl")}).json()
+        job = self._req("POST", "/batches", json={
+            "input_file_id": f["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        }).json()
+        return job["id"]
+
+    def status(self, job_id: str) -> Tuple[str, bool]:
+        status = self._req("GET", f"/batches/{job_id}").json()["status"]
+        return status, status in self.terminal
+
+    def results(self, job_id: str) -> Iterator[Tuple[str, Optional[str], dict, Optional[str]]]:
+        job = self._req("GET", f"/batches/{job_id}").json()
+        # expired/cancelled 배치도 끝난 요청의 결과는 output 파일에 있음
+        for file_id in (job.get("output_file_id"), job.get("error_file_id")):
+            if not file_id:
+                continue
+            for line in self._req("GET", f"/files/{file_id}/content").text.splitlines():
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                resp = rec.get("response") or {}
+                body = resp.get("body") or {}
+                if resp.get("status_code") == 200 and body.get("choices"):
+                    text = (body["choices"][0]["message"]["content"] or "").strip()
+                    usage = body.get("usage") or {}
+                    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+                    yield rec["custom_id"], text, {
+                        "input_token": usage.get("prompt_tokens", 0),
+                        "output_token": usage.get("completion_tokens", 0),
+                        **({"cached_input_token": cached} if cached is not None else {}),
+                    }, None
+                else:
+                    err = rec.get("error") or body.get("error") or resp.get("status_code")
+                    yield rec["custom_id"], None, {}, str(err)
+
+
+class AnthropicBatch:
+    """Anthropic Message Batches: one POST with all requests, results as JSONL from results_url."""
+
+    name = "anthropic"
+    max_requests = 100000
+    terminal = ("ended",)
+
+    def __init__(self, model, base_url: Optional[str] = None):
+        self.model = model
+        base = base_url or os.getenv("ANTHROPIC_BASE_URL") or DEFAULT_BASE_URLS["anthropic"]
+        self.base = base.rstrip("/")
+        self.session = shared_session(self.base)
+        self.headers = {"x-api-key": model.key_pool.keys[0], "anthropic-version": ANTHROPIC_VERSION}
+
+    def _req(self, method: str, url: str, **kwargs):
+        if url.startswith("/"):
+            url = f"{self.base}{url}"
+        r = self.session.request(method, url, headers=self.headers, timeout=600, **kwargs)
+        r.raise_for_status()
+        return r
+
+    def submit(self, requests: List[Tuple[str, str, str]]) -> str:
+        body = {"requests": [
+            {"custom_id": cid, "params": self.model.batch_params(system, user)}
+            for cid, system, user in requests
+        ]}
+        return self._req("POST", "/v1/messages/batches", json=body).json()["id"]
+
+    def status(self, job_id: str) -> Tuple[str, bool]:
+        status = self._req("GET", f"/v1/messages/batches/{job_id}").json()["processing_status"]
+        return status, status in self.terminal
+
+    def results(self, job_id: str) -> Iterator[Tuple[str, Optional[str], dict, Optional[str]]]:
+        job = self._req("GET", f"/v1/messages/batches/{job_id}").json()
+        url = job.get("results_url") or f"/v1/messages/batches/{job_id}/results"
+        for line in self._req("GET", url).text.splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            result = rec.get("result") or {}
+            if result.get("type") == "succeeded":
+                msg = result["message"]
+                text = "".join(b.get("text", "") for b in msg.get("content", []) if b.get("type") == "text")
+                u = msg.get("usage") or {}
+                cache_read = u.get("cache_read_input_tokens") or 0
+                yield rec["custom_id"], text, {
+                    "input_token": (u.get("input_tokens") or 0) + (u.get("cache_creation_input_tokens") or 0) + cache_read,
+                    "output_token": u.get("output_tokens") or 0,
+                    "cached_input_token": cache_read,
+                }, None
+            else:
+                err = result.get("error") or result.get("type")
+                yield rec["custom_id"], None, {}, str(err)
+
+
+PROVIDERS = {"openai": OpenAIBatch, "anthropic": AnthropicBatch}
+
+
+def provider_for(model, base_url: Optional[str] = None):
+    name = getattr(model, "batch_provider", None)
+    if name not in PROVIDERS:
+        raise ValueError(f"{model.name}: no batch API for this backend (supported: {sorted(PROVIDERS)})")
+    return PROVIDERS[name](model, base_url)
+
+
+def _load_state(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _save_state(path: Path, state: dict):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def run_batch_api(
+    model,
+    chunks: Iterable[List[dict]],
+    render: Callable[[List[dict]], Tuple[str, str, dict]],
+    state_path: Path,
+    base_url: Optional[str] = None,
+    job_id: Optional[str] = None,
+    poll: float = 30.0,
+    max_poll: float = 600.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[dict]:
+    """Submit every chunk as one provider batch job (or resume saved jobs) and yield output records.
+
+    Job ids are saved to `state_path` right after submission, so an interrupted
+    run picks up the same jobs instead of paying for them twice. `job_id`
+    attaches to a job submitted elsewhere.
+    """
+    state_path = Path(state_path)
+    provider = provider_for(model, base_url)
+    state = _load_state(state_path)
+
+    if job_id:
+        state = {"provider": provider.name, "model_id": model.model_id, "jobs": [{"id": job_id}], "meta": {}}
+        _save_state(state_path, state)
+        print(f"[BATCH] {model.name}: attaching to job {job_id}")
+    elif state and not state.get("collected"):
+        print(f"[BATCH] {model.name}: resuming {[j['id'] for j in state['jobs']]} ({state_path})")
+    else:
+        state = {"provider": provider.name, "model_id": model.model_id, "jobs": [], "meta": {}}
+        pending: List[Tuple[str, str, str]] = []
+
+        def flush():
+            jid = provider.submit(pending)
+            state["jobs"].append({"id": jid, "requests": len(pending)})
+            _save_state(state_path, state)
+            print(f"[BATCH] {model.name}: submitted {jid} ({len(pending)} requests)")
+            pending.clear()
+
+        for rows in chunks:
+            system, user, meta = render(rows)
+            cid = custom_id(rows)
+            pending.append((cid, system, user))
+            if meta:
+                state["meta"][cid] = meta
+            if len(pending) >= provider.max_requests:
+                flush()
+        if pending:
+            flush()
+        if not state["jobs"]:
+            return
+
+    for job in state["jobs"]:
+        delay = poll
+        while True:
+            status, done = provider.status(job["id"])
+            if done:
+                break
+            print(f"[BATCH] {job['id']}: {status}, next poll in {delay:.0f}s")
+            sleep(delay)
+            delay = min(delay * 1.5, max_poll)
+        print(f"[BATCH] {job['id']}: {status}")
+
+        for cid, text, usage, error in provider.results(job["id"]):
+            ids = sample_ids(cid)
+            meta = state["meta"].get(cid, {})
+            base = {"batch_job": job["id"], "latency": 0.0}
+            if text is None:
+                for sid in ids:
+                    yield {"sample_id": sid, "output": f"{ERROR_PREFIX} batch: {error}", **base}
+                continue
+            if len(ids) == 1:
+                yield {"sample_id": ids[0], "output": text, **usage, **meta, **base}
+                continue
+            outputs = split_batch_output(text, len(ids))
+            shares = iter(split_usage(usage, [o for o in outputs if o is not None]))
+            for sid, out in zip(ids, outputs):
+                if out is None:
+                    # 배치 API에는 단일 요청 fallback이 없음 -> --resume 재실행 시 다시 요청됨
+                    yield {"sample_id": sid, "output": f"{ERROR_PREFIX} batch: missing <pe id>", **base,
+                           "batch_size": len(ids)}
+                else:
+                    yield {"sample_id": sid, "output": out, **next(shares), **meta, **base, "batch_size": len(ids)}
+
+    state["collected"] = True
+    _save_state(state_path, state)
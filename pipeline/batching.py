@@ -0,0 +1,80 @@
+import re
+from typing import Iterable, Iterator, List, Optional
+
+PE_ID = re.compile(r"<pe\s+id\s*=\s*[\"']?(\d+)[\"']?\s*>(.*?)</pe\s*>", re.DOTALL | re.IGNORECASE)
+
+
+def chunk_rows(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """Group consecutive rows of the same doc_id into chunks of at most `size` rows."""
+    chunk: List[dict] = []
+    for row in rows:
+        if chunk and (len(chunk) >= size or row.get("doc_id") != chunk[0].get("doc_id")):
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def split_batch_output(text: str, n: int) -> List[Optional[str]]:
+    """Map a batched response back to N segments as single-segment '<pe>...</pe>' strings.
+
+    An entry is None when its id is missing, repeated, or empty, so the caller can
+    fall back to a single-segment call for just that row.
+    """
+    found: dict = {}
+    repeated = set()
+    for m in PE_ID.finditer(text or ""):
+        k = int(m.group(1))
+        if k in found:
+            repeated.add(k)
+        found[k] = m.group(2).strip()
+
+    out: List[Optional[str]] = []
+    for k in range(1, n + 1):
+        pe = found.get(k)
+        if k in repeated or not pe:
+            out.append(None)
+        else:
+            out.append(f"<pe>{pe}</pe>")
+    return out
+
+
+def split_usage(usage: dict, outputs: List[Optional[str]]) -> List[dict]:
+    """Spread one batched call's usage over its rows.
+
+    Input tokens and latency are split evenly (the prompt is shared); output
+    tokens are split in proportion to each row's share of the returned text.
+    """
+    n = len(outputs)
+    if n == 0:
+        return []
+    lengths = [len(o) if o else 0 for o in outputs]
+    total_len = sum(lengths) or 1
+
+    def even(total, i):
+        base, rem = divmod(int(total), n)
+        return base + (1 if i < rem else 0)
+
+    in_tok = usage.get("input_token", 0)
+    out_tok = usage.get("output_token", 0)
+    cached = usage.get("cached_input_token")
+    latency = float(usage.get("latency", 0))
+
+    shares = []
+    assigned = 0
+    for i in range(n):
+        if i == n - 1:
+            o = int(out_tok) - assigned
+        else:
+            o = int(round(out_tok * lengths[i] / total_len))
+            assigned += o
+        u = {
+            "input_token": even(in_tok, i),
+            "output_token": max(o, 0),
+            "latency": latency / n,
+        }
+        if cached is not None:
+            u["cached_input_token"] = even(cached, i)
+        shares.append(u)
+    return shares
@@ -0,0 +1,27 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, Any
+
+
+def run_ordered(fn: Callable[[Any], Any], items: Iterable[Any], max_workers: int = 1) -> Iterator[Tuple[Any, Any]]:
+    """Run `fn` over `items` on a thread pool and yield (item, result) in input order.
+
+    At most `2 * max_workers` calls are in flight, so a slow head-of-line row
+    never lets finished results pile up without bound.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    window = max_workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for item in items:
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= window:
+                head, fut = pending.popleft()
+                yield head, fut.result()
+        while pending:
+            head, fut = pending.popleft()
+            yield head, fut.result()
@@ -0,0 +1,233 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence
+
+ERROR_PREFIX = "[ERROR]"
+# JSON 문자열 안의 따옴표는 escape되므로 원본 줄에서 키를 바로 찾아도 안전
+DOC_ID = re.compile(rb'"doc_id"\s*:\s*("(?:[^"\\]|\\.)*"|[^,}\s]+)')
+SHARD_TAG = re.compile(r"\.shard(\d+)of(\d+)$")
+
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_jsonl(path: Path) -> list[dict]:
+    return list(iter_jsonl(path))
+
+def write_jsonl(path: Path, records):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+def is_error(rec: dict) -> bool:
+    return str(rec.get("output", "")).startswith(ERROR_PREFIX)
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with Path(path).open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class JsonlWriter:
+    """Append-only JSONL writer that flushes every record as soon as it is written.
+
+    With `fsync=True` each record is also forced to disk, so a crash or Ctrl-C
+    loses at most the record being written.
+    """
+
+    def __init__(self, path: Path, append: bool = False, fsync: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        torn = append and self.path.exists() and not _ends_with_newline(self.path)
+        self.f = self.path.open("a" if append else "w", encoding="utf-8")
+        if torn:
+            # 이전 실행이 줄 중간에 죽은 경우 새 레코드가 붙지 않도록 줄바꿈 추가
+            self.f.write("\n")
+
+    def write(self, rec: dict):
+        self.f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.f.flush()
+        if self.fsync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def succeeded_ids(path: Path) -> set:
+    """sample_ids whose latest record in `path` is not an [ERROR] row."""
+    status = {}
+    path = Path(path)
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                # 크래시로 잘린 마지막 줄은 무시 (해당 sample은 재시도)
+                continue
+            status[rec.get("sample_id")] = not is_error(rec)
+    return {sid for sid, ok in status.items() if ok}
+
+
+def compact_jsonl(path: Path):
+    """Rewrite `path` with one record per sample_id (last one wins), sorted by sample_id.
+
+    Only byte offsets are held in memory; records are copied line by line.
+    """
+    path = Path(path)
+    offsets = {}
+    with path.open("rb") as f:
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                sid = json.loads(line).get("sample_id")
+            except json.JSONDecodeError:
+                continue
+            offsets[sid] = pos
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with path.open("rb") as src, tmp.open("wb") as dst:
+        for sid in sorted(offsets, key=lambda s: (s is None, s)):
+            src.seek(offsets[sid])
+            line = src.readline()
+            dst.write(line if line.endswith(b"\n") else line + b"\n")
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp, path)
+
+
+class JsonlIndex:
+    """Byte offset (and raw doc_id) of every non-empty line, found in one pass without parsing JSON.
+
+    Rows are parsed only when read, so --offset/--limit/--shard selection and
+    random access never decode the rest of the file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.offsets: List[int] = []
+        self.docs: List = []
+        with self.path.open("rb") as f:
+            pos = 0
+            for line in f:
+                if line.strip():
+                    self.offsets.append(pos)
+                    m = DOC_ID.search(line)
+                    self.docs.append(m.group(1) if m else None)
+                pos += len(line)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> dict:
+        return next(self.read([i]))
+
+    def read(self, positions: Iterable[int]) -> Iterator[dict]:
+        with self.path.open("rb") as f:
+            for i in positions:
+                f.seek(self.offsets[i])
+                yield json.loads(f.readline())
+
+
+def shard_positions(docs: Sequence, positions: Sequence[int], index: int, count: int) -> List[int]:
+    """Rows of shard `index` (0-based) out of `count`, keeping every doc_id in one shard.
+
+    Documents are taken in order of first appearance and cut into `count`
+    contiguous runs of roughly equal row counts, so the split is deterministic
+    for a given file and shards stay in input order.
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"shard index must be in [0, {count}), got {index}")
+    key = lambda i: docs[i] if docs[i] is not None else ("row", i)
+    sizes = OrderedDict()
+    for i in positions:
+        sizes[key(i)] = sizes.get(key(i), 0) + 1
+    total = len(positions) or 1
+    assign, seen = {}, 0
+    for k, n in sizes.items():
+        # 문서 중간 지점이 속하는 구간의 shard로 배정
+        assign[k] = min(int((seen + n / 2) * count // total), count - 1)
+        seen += n
+    return [i for i in positions if assign[key(i)] == index]
+
+
+def shard_name(path: Path, index: int, count: int) -> Path:
+    """out.jsonl -> out.shard{index}of{count}.jsonl"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.shard{index}of{count}{path.suffix}")
+
+
+def unshard_name(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(SHARD_TAG.sub("", path.stem) + path.suffix)
+
+
+def merge_jsonl(paths: Sequence[Path], out: Path) -> int:
+    """Stitch shard outputs into one file in sample_id order (one record per sample_id).
+
+    A successful record is never replaced by an [ERROR] one; otherwise later
+    records win, as in compact_jsonl. Only byte offsets are held in memory.
+    """
+    best = {}   # sample_id -> (file idx, offset, ok)
+    for n, path in enumerate(paths):
+        with Path(path).open("rb") as f:
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                sid, ok = rec.get("sample_id"), not is_error(rec)
+                if sid in best and best[sid][2] and not ok:
+                    continue
+                best[sid] = (n, pos, ok)
+
+    out = Path(out)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    files = [Path(p).open("rb") for p in paths]
+    try:
+        with tmp.open("wb") as dst:
+            for sid in sorted(best, key=lambda s: (s is None, s)):
+                n, pos, _ = best[sid]
+                files[n].seek(pos)
+                line = files[n].readline()
+                dst.write(line if line.endswith(b"\n") else line + b"\n")
+    finally:
+        for f in files:
+            f.close()
+    os.replace(tmp, out)
+    return len(best)
@@ -0,0 +1,281 @@
+import math
+import re
+from collections import Counter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .io import ERROR_PREFIX
+
+# 참조 통계 캐시 형식이 바뀌면 올림 (이전 캐시 무효화)
+METRICS_VERSION = 1
+CHRF_ORDER = 6
+CHRF_BETA = 2
+BLEU_ORDER = 4
+TER_MAX_SPAN = 10     # tercom 기본값
+TER_MAX_DIST = 50
+
+PE_TAG = re.compile(r"<pe(?:\s+id\s*=\s*[\"']?\d+[\"']?)?\s*>(.*?)</pe\s*>", re.DOTALL | re.IGNORECASE)
+PE_OPEN = re.compile(r"<pe(?:\s+id\s*=\s*[\"']?\d+[\"']?)?\s*>", re.IGNORECASE)
+FENCE = re.compile(r"^```[\w-]*\s*|\s*```$")
+# 지시문의 예시 문구를 그대로 따라 쓴 경우 (예: "<pe>Korean corrected sentence only</pe>")
+PLACEHOLDER = re.compile(r"corrected sentence only", re.IGNORECASE)
+
+# sacrebleu 13a 토크나이저와 같은 규칙
+_TOK_13A = [
+    (re.compile(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])"), r" \1 "),
+    (re.compile(r"([^0-9])([\.,])"), r"\1 \2 "),
+    (re.compile(r"([\.,])([^0-9])"), r" \1 \2"),
+    (re.compile(r"([0-9])(-)"), r"\1 \2 "),
+]
+
+
+def extract_pe(output) -> Tuple[Optional[str], str]:
+    """Pull the post-edit out of a raw model output.
+
+    Returns (text, status). status is one of:
+      ok        - a complete <pe>...</pe> (the last non-placeholder one if repeated)
+      unclosed  - an opening <pe> without its closing tag (truncated output)
+      untagged  - no <pe> at all; the stripped output is used as is
+      empty     - the tags (or the whole output) are empty
+      error     - an [ERROR] record or no output; text is None
+    """
+    if output is None or str(output).startswith(ERROR_PREFIX):
+        return None, "error"
+    text = FENCE.sub("", str(output).strip())
+    found = [m.strip() for m in PE_TAG.findall(text)]
+    if found:
+        real = [f for f in found if f and not PLACEHOLDER.search(f)]
+        pe = (real or found)[-1]
+        return pe, "ok" if pe else "empty"
+    opens = list(PE_OPEN.finditer(text))
+    if opens:
+        pe = text[opens[-1].end():].strip()
+        return pe, "unclosed" if pe else "empty"
+    text = text.strip().strip('"“”')
+    return text, "untagged" if text else "empty"
+
+
+def tokenize_13a(text: str) -> List[str]:
+    text = f" {text} "
+    for pattern, repl in _TOK_13A:
+        text = pattern.sub(repl, text)
+    return text.split()
+
+
+def char_ngrams(text: str, order: int = CHRF_ORDER) -> List[Counter]:
+    chars = "".join(text.split())   # chrF는 공백을 무시
+    return [Counter(chars[i:i + n] for i in range(len(chars) - n + 1)) for n in range(1, order + 1)]
+
+
+def word_ngrams(tokens: Sequence[str], order: int = BLEU_ORDER) -> List[Counter]:
+    return [Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)) for n in range(1, order + 1)]
+
+
+class RefStats(NamedTuple):
+    """Everything about one reference/draft pair that does not depend on the hypothesis."""
+
+    ref: str
+    draft: str
+    chrf: List[Counter]
+    bleu: List[Counter]
+    bleu_len: int
+    ter_words: List[str]
+
+
+def reference_stats(ref: str, draft: Optional[str] = None) -> RefStats:
+    tokens = tokenize_13a(ref)
+    return RefStats(
+        ref=ref,
+        draft=ref if draft is None else draft,
+        chrf=char_ngrams(ref),
+        bleu=word_ngrams(tokens),
+        bleu_len=len(tokens),
+        ter_words=ref.split(),
+    )
+
+
+# ---- edit distances ----
+def levenshtein(a: Sequence, b: Sequence) -> int:
+    if a == b:
+        return 0
+    # 공통 접두/접미는 비용 0 (post-edit은 대부분 초안을 그대로 둠)
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        cur = [i]
+        for j, y in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = cur
+    return prev[-1]
+
+
+def _align(hyp: Sequence[str], ref: Sequence[str]):
+    """Word Levenshtein with backtrace: (distance, matched hyp idx, matched ref idx, ref idx -> hyp idx)."""
+    n, m = len(hyp), len(ref)
+    d = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        d[i][0] = i
+    for j in range(m + 1):
+        d[0][j] = j
+    for i in range(1, n + 1):
+        row, up, h = d[i], d[i - 1], hyp[i - 1]
+        for j in range(1, m + 1):
+            row[j] = min(up[j] + 1, row[j - 1] + 1, up[j - 1] + (h != ref[j - 1]))
+    hyp_ok, ref_ok, ref_to_hyp = set(), set(), [0] * (m + 1)
+    i, j = n, m
+    while i > 0 or j > 0:
+        ref_to_hyp[j] = i
+        if i > 0 and j > 0 and d[i][j] == d[i - 1][j - 1] + (hyp[i - 1] != ref[j - 1]):
+            if hyp[i - 1] == ref[j - 1]:
+                hyp_ok.add(i - 1)
+                ref_ok.add(j - 1)
+            i, j = i - 1, j - 1
+        elif i > 0 and d[i][j] == d[i - 1][j] + 1:
+            i -= 1
+        else:
+            j -= 1
+    return d[n][m], hyp_ok, ref_ok, ref_to_hyp
+
+
+def ter_edits(hyp: Sequence[str], ref: Sequence[str]) -> int:
+    """TER edit count: greedy block shifts (tercom limits) + word Levenshtein.
+
+    A shift moves a span that starts at a misaligned hypothesis word onto a
+    matching, not yet aligned reference span; the best shift is applied while
+    it lowers the edit distance, and each shift costs one edit.
+    """
+    cur = list(hyp)
+    dist, hyp_ok, ref_ok, ref_to_hyp = _align(cur, ref)
+    positions = {}
+    for k, w in enumerate(ref):
+        positions.setdefault(w, []).append(k)
+    shifts = 0
+    while dist > 0:
+        best_gain, best = 0, None
+        for i in range(len(cur)):
+            if i in hyp_ok:
+                continue
+            starts = [k for k in positions.get(cur[i], ()) if abs(i - k) <= TER_MAX_DIST and k not in ref_ok]
+            for span in range(1, TER_MAX_SPAN + 1):
+                if i + span > len(cur) or not starts:
+                    break
+                starts = [k for k in starts if tuple(ref[k:k + span]) == tuple(cur[i:i + span])]
+                for k in starts:
+                    rest = cur[:i] + cur[i + span:]
+                    j = ref_to_hyp[k]
+                    j = j - span if j > i else j
+                    if j == i:
+                        continue
+                    cand = rest[:j] + cur[i:i + span] + rest[j:]
+                    gain = dist - levenshtein(cand, ref)
+                    if gain > best_gain:
+                        best_gain, best = gain, cand
+        if best is None:
+            break
+        cur = best
+        shifts += 1
+        dist, hyp_ok, ref_ok, ref_to_hyp = _align(cur, ref)
+    return shifts + dist
+
+
+# ---- scores ----
+def chrf_from_stats(stats: Sequence[float]) -> float:
+    """chrF (sacrebleu 2.x formula) from [hyp, ref, match] * CHRF_ORDER."""
+    prec = rec = 0.0
+    order = 0
+    for n in range(CHRF_ORDER):
+        hyp, ref, match = stats[3 * n:3 * n + 3]
+        if hyp > 0 and ref > 0:
+            prec += match / hyp
+            rec += match / ref
+            order += 1
+    if not order:
+        return 0.0
+    prec, rec = prec / order, rec / order
+    if not prec + rec:
+        return 0.0
+    factor = CHRF_BETA ** 2
+    return 100 * (1 + factor) * prec * rec / (factor * prec + rec)
+
+
+def bleu_from_stats(stats: Sequence[float], smooth: bool = False) -> float:
+    """BLEU from [match, total] * BLEU_ORDER + [hyp_len, ref_len].
+
+    smooth=True is sacrebleu's sentence-level 'exp' smoothing with effective order.
+    """
+    hyp_len, ref_len = stats[-2], stats[-1]
+    if hyp_len == 0:
+        return 0.0
+    logs = []
+    k = 1.0
+    for n in range(BLEU_ORDER):
+        match, total = stats[2 * n], stats[2 * n + 1]
+        if total == 0:
+            if smooth:
+                break
+            return 0.0
+        if match == 0:
+            if not smooth:
+                return 0.0
+            k *= 2
+            logs.append(math.log(1 / (k * total)))
+        else:
+            logs.append(math.log(match / total))
+    if not logs:
+        return 0.0
+    bp = 1.0 if hyp_len >= ref_len else math.exp(1 - ref_len / hyp_len)
+    return 100 * bp * math.exp(sum(logs) / len(logs))
+
+
+def _rate(edits: float, length: float) -> float:
+    if length == 0:
+        return 0.0 if edits == 0 else 1.0
+    return edits / length
+
+
+# 문장별 충분 통계 (코퍼스 점수는 이 벡터들의 합으로 계산)
+STAT_FIELDS = (
+    [f"chrf_{k}{n}" for n in range(1, CHRF_ORDER + 1) for k in ("hyp", "ref", "match")]
+    + [f"bleu_{k}{n}" for n in range(1, BLEU_ORDER + 1) for k in ("match", "total")]
+    + ["bleu_hyp_len", "bleu_ref_len", "ter_edits", "ter_ref_len", "edit_chars", "draft_chars", "changed"]
+)
+_CHRF = slice(0, 3 * CHRF_ORDER)
+_BLEU = slice(3 * CHRF_ORDER, 3 * CHRF_ORDER + 2 * BLEU_ORDER + 2)
+_TER = 3 * CHRF_ORDER + 2 * BLEU_ORDER + 2
+
+
+def segment_stats(hyp: str, ref: RefStats) -> List[int]:
+    stats = []
+    for h, r in zip(char_ngrams(hyp), ref.chrf):
+        stats += [sum(h.values()), sum(r.values()), sum((h & r).values())]
+    tokens = tokenize_13a(hyp)
+    for h, r in zip(word_ngrams(tokens), ref.bleu):
+        stats += [sum((h & r).values()), sum(h.values())]
+    stats += [len(tokens), ref.bleu_len]
+    stats += [ter_edits(hyp.split(), ref.ter_words), len(ref.ter_words)]
+    stats += [levenshtein(hyp, ref.draft), len(ref.draft), int(hyp.strip() != ref.draft.strip())]
+    return stats
+
+
+def scores_from_stats(stats: Sequence[float], sentence: bool = False) -> dict:
+    """chrF / BLEU / TER (vs. the reference) and edit rate (characters, vs. the draft)."""
+    return {
+        "chrf": round(chrf_from_stats(stats[_CHRF]), 4),
+        "bleu": round(bleu_from_stats(stats[_BLEU], smooth=sentence), 4),
+        "ter": round(100 * _rate(stats[_TER], stats[_TER + 1]), 4),
+        "edit_rate": round(100 * _rate(stats[_TER + 2], stats[_TER + 3]), 4),
+    }
+
+
+def corpus_scores(stats: Sequence[Sequence[float]]) -> dict:
+    total = [sum(col) for col in zip(*stats)] if stats else [0] * len(STAT_FIELDS)
+    out = scores_from_stats(total)
+    out["changed_rate"] = round(total[-1] / len(stats), 4) if stats else 0.0
+    return out
@@ -0,0 +1,114 @@
+import json
+import statistics
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from .io import is_error
+
+# USD per 1M tokens. 설정의 `price: {input, output}`가 있으면 그쪽이 우선
+PRICES = {
+    "claude-3-5-sonnet-20240620": {"input": 3.0, "output": 15.0},
+    "gpt-4o": {"input": 2.5, "output": 10.0},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+}
+# 지연 이력이 없을 때의 가정: 요청 오버헤드 + 디코딩 속도
+DEFAULT_OVERHEAD_S = 0.5
+DEFAULT_DECODE_TPS = 50.0
+PE_TAG_TOKENS = 8
+
+
+def price_for(model) -> dict:
+    return getattr(model, "price", None) or PRICES.get(model.model_id) or {"input": 0.0, "output": 0.0}
+
+
+def latency_history(paths: Iterable[Path]) -> Optional[dict]:
+    """Per-row latency / output-token stats from earlier output files (error rows skipped)."""
+    latencies, out_tokens = [], []
+    for path in paths:
+        with Path(path).open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if is_error(rec) or not rec.get("latency"):
+                    continue
+                latencies.append(float(rec["latency"]))
+                out_tokens.append(int(rec.get("output_token", 0)))
+    if not latencies:
+        return None
+    latencies.sort()
+    return {
+        "rows": len(latencies),
+        "mean_latency": statistics.fmean(latencies),
+        "p50_latency": latencies[len(latencies) // 2],
+        "p95_latency": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+        "mean_output_token": statistics.fmean(out_tokens),
+    }
+
+
+def plan_run(
+    model,
+    requests: Iterable[Tuple[list, str, str]],
+    concurrency: int = 1,
+    history: Optional[dict] = None,
+) -> dict:
+    """Estimate tokens, cost and wall-clock for a run without calling the backend.
+
+    `requests` yields (rows, system, user) exactly as the real run would send them.
+    """
+    calls = rows_total = in_tok = out_tok = 0
+    busy_s = 0.0
+    for rows, system, user in requests:
+        calls += 1
+        rows_total += len(rows)
+        tin = model.count_tokens(system) + model.count_tokens(user)
+        if history:
+            tout = history["mean_output_token"] * len(rows)
+            lat = history["mean_latency"] * len(rows)
+        else:
+            tout = sum(model.count_tokens(r.get("tgt_seg", "")) + PE_TAG_TOKENS for r in rows)
+            lat = DEFAULT_OVERHEAD_S + tout / DEFAULT_DECODE_TPS
+        in_tok += tin
+        out_tok += int(tout)
+        busy_s += lat
+
+    price = price_for(model)
+    cost = in_tok / 1e6 * price["input"] + out_tok / 1e6 * price["output"]
+
+    # 벽시계 시간 = max(동시성으로 나눈 처리 시간, rpm 한도, tpm 한도)
+    wall_s = busy_s / max(concurrency, 1)
+    limits = getattr(model, "rate_limits", None) or {}
+    limiter = getattr(model, "limiter", None)
+    rpm = limits.get("rpm")
+    tpm = limits.get("tpm")
+    if limiter is not None:
+        rpm = limiter.requests.rate * 60 if limiter.requests else None
+        tpm = limiter.tokens.rate * 60 if limiter.tokens else None
+    if rpm:
+        wall_s = max(wall_s, calls / rpm * 60)
+    if tpm:
+        wall_s = max(wall_s, (in_tok + out_tok) / tpm * 60)
+
+    return {
+        "model": model.name,
+        "model_id": model.model_id,
+        "tokenizer": model.token_counter.name,
+        "token_source": "heuristic" if model.token_counter.name == "heuristic" else "tokenizer",
+        "rows": rows_total,
+        "calls": calls,
+        "input_token": in_tok,
+        "expected_output_token": out_tok,
+        "cost_usd": round(cost, 4),
+        "concurrency": concurrency,
+        "latency_source": "history" if history else "default",
+        "wall_clock_min": round(wall_s / 60, 1),
+    }
+
+
+def format_plan(plan: dict) -> str:
+    lines = [f"  {k:<22} {v}" for k, v in plan.items()]
+    if plan.get("token_source") == "heuristic":
+        # 문자 기반 추정: 한글은 글자당 약 1토큰으로 셈 -> o200k/cl100k 계열보다 많게 나옴
+        lines.append("  (token counts are a character heuristic; set `tokenizer:` in the model config for exact counts)")
+    return "\n".join(lines)
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from prompts.ape_prompt import build_prompt, build_batch_prompt
+
+
+class PromptRenderer:
+    """Render each distinct (rows, condition) prompt once and share it between models.
+
+    Keys are the chunk's sample_ids plus the rendering condition (with_doc, layout,
+    context selector key). A bounded LRU keeps memory flat when models drift apart,
+    and a key that is being rendered by one thread is waited on, not rendered again.
+    """
+
+    def __init__(self, max_items: int = 4096):
+        self.max_items = max_items
+        self.items: OrderedDict = OrderedDict()
+        self.pending: dict = {}                # key -> Event (다른 thread가 렌더링 중)
+        self.lock = threading.Lock()
+        self.hits = self.renders = 0
+
+    def render(self, rows: list[dict], with_doc: bool, layout: str = "seg_first", context=None) -> Tuple[str, str, dict]:
+        key = (
+            tuple(r.get("sample_id") for r in rows),
+            with_doc,
+            layout,
+            context.key if context is not None else None,
+        )
+        while True:
+            with self.lock:
+                if key in self.items:
+                    self.items.move_to_end(key)
+                    self.hits += 1
+                    return self.items[key]
+                wait = self.pending.get(key)
+                if wait is None:
+                    done = self.pending[key] = threading.Event()
+                    break
+            wait.wait()
+
+        try:
+            meta = {}
+            if len(rows) == 1:
+                system, user = build_prompt(rows[0], with_doc, layout=layout, context=context, meta=meta)
+            else:
+                system, user = build_batch_prompt(rows, with_doc, context=context, meta=meta)
+            out = (system, user, meta)
+            with self.lock:
+                self.renders += 1
+                self.items[key] = out
+                while len(self.items) > self.max_items:
+                    self.items.popitem(last=False)
+        finally:
+            # 렌더링 실패 시 기다리던 thread는 직접 다시 시도함
+            with self.lock:
+                del self.pending[key]
+            done.set()
+        return out
+
+
+@dataclass
+class Condition:
+    """How rows are turned into requests for one output file."""
+
+    with_doc: bool = False
+    layout: str = "seg_first"
+    context: Optional[object] = None       # prompts.context.ContextSelector
+    batch_size: int = 1
+    prefix_cache: bool = False
+
+    @property
+    def suffix(self) -> str:
+        suffix = "doc_first" if self.prefix_cache else ("doc" if self.with_doc else "seg")
+        if self.context is not None and self.context.budget:
+            suffix = f"{suffix}.{self.context.strategy}{self.context.budget}"
+        if self.batch_size > 1:
+            suffix = f"batch{self.batch_size}.{suffix}"
+        return suffix
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, List, Sequence
+
+
+def group_by_doc(rows: Iterable[dict]) -> Iterator[dict]:
+    """Reorder rows so that every doc_id runs back-to-back (docs in first-seen order).
+
+    Consecutive requests then share the same document prefix, which is what
+    provider prompt caches and vLLM/Ollama KV prefix reuse key on.
+    Holds every row; for an input file use `doc_positions` instead.
+    """
+    groups: OrderedDict = OrderedDict()
+    for row in rows:
+        groups.setdefault(row.get("doc_id"), []).append(row)
+    for doc_rows in groups.values():
+        yield from doc_rows
+
+
+def doc_positions(docs: Sequence, positions: Iterable[int]) -> List[int]:
+    """`group_by_doc` order of the rows at `positions`, from a JsonlIndex's raw doc_ids.
+
+    Only row numbers are grouped; the rows themselves are read lazily afterwards.
+    """
+    groups: OrderedDict = OrderedDict()
+    for i in positions:
+        groups.setdefault(docs[i], []).append(i)
+    return [i for group in groups.values() for i in group]
+
+
+def interleave(iterables: Iterable[Iterable]) -> Iterator:
+    """Round-robin over several iterables until all are exhausted (a, b, c, a, b, c, ...).
+
+    Submitting several conditions' chunks this way keeps one worker pool busy
+    with all of them, and the same chunk of different conditions/variants is
+    rendered and sent close together.
+    """
+    iterators = [iter(it) for it in iterables]
+    while iterators:
+        alive = []
+        for it in iterators:
+            for item in it:
+                yield item
+                alive.append(it)
+                break
+        iterators = alive
+
+
+class DocPrimer:
+    """Let the first row of each document run alone so the others hit a warm prefix.
+
+    With several workers, N segments of the same doc would otherwise all miss the
+    cache at once. Rows must be submitted in `group_by_doc` order so the first row
+    of a doc is always started before its siblings start waiting.
+    """
+
+    def __init__(self):
+        self.events: dict = {}
+        self.lock = threading.Lock()
+
+    def run(self, doc_id, fn: Callable):
+        with self.lock:
+            ev = self.events.get(doc_id)
+            first = ev is None
+            if first:
+                ev = self.events[doc_id] = threading.Event()
+        if first:
+            try:
+                return fn()
+            finally:
+                ev.set()
+        ev.wait()
+        return fn()
+
+
+def residency_lanes(models: list) -> list:
+    """Split (label, model) pairs into lanes that may run concurrently.
+
+    Models that expose `residency_key()` (Ollama) and share a host set go into
+    one lane, ordered by (model_id, num_ctx), and run one after another: each
+    (model, num_ctx) is then loaded once instead of being swapped in and out by
+    interleaved requests. Every other model gets a lane of its own.
+    """
+    shared: OrderedDict = OrderedDict()
+    lanes = []
+    for label, model in models:
+        key = getattr(model, "residency_key", None)
+        if key is None:
+            lanes.append([(label, model)])
+        else:
+            shared.setdefault(key()[0], []).append((label, model))
+    for group in shared.values():
+        group.sort(key=lambda item: (item[1].residency_key()[1], item[1].residency_key()[2] or 0))
+        lanes.append(group)
+    return lanes
@@ -0,0 +1,208 @@
+import csv
+import json
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .io import iter_jsonl, is_error
+
+ROOT = Path(__file__).resolve().parent.parent
+ASSETS = ROOT / "assets"
+SAMPLES_TAG = "_5_samples."
+
+# results 테이블 스키마 (run마다 필드가 달라도 같은 dataset으로 읽히도록 고정)
+RESULT_COLUMNS = {
+    "run": "string", "model": "string", "mode": "string", "with_doc": "bool",
+    "sample_id": "int64", "doc_id": "int64", "doc_name": "string", "bucket": "string",
+    "domain": "string", "system": "string", "src_chars": "int64", "error": "bool",
+    "input_token": "int64", "cached_input_token": "int64", "output_token": "int64",
+    "latency": "float64", "load_time": "float64", "ttft": "float64", "decode_tps": "float64", "retries": "int64",
+    "batch_size": "int64", "batch_wasted_input_token": "int64", "batch_wasted_output_token": "int64",
+    "batch_wasted_latency": "float64", "context_strategy": "string", "context_tokens": "int64",
+    "pe_status": "string", "chrf": "float64", "bleu": "float64", "ter": "float64", "edit_rate": "float64",
+}
+SPAN_COLUMNS = {
+    "run": "string", "model": "string", "span": "string", "ts": "float64", "seconds": "float64",
+    "status": "string", "input_token": "int64", "output_token": "int64",
+}
+SCORE_FIELDS = ("pe_status", "chrf", "bleu", "ter", "edit_rate")
+
+
+def _schema(columns: dict):
+    import pyarrow as pa
+    return pa.schema([(name, pa.type_for_alias(t)) for name, t in columns.items()])
+
+
+def parse_output_name(path: Path):
+    """'<label>_5_samples.<suffix>.jsonl' -> (label, suffix), e.g. ('gpt-4o', 'batch4.doc')."""
+    stem = Path(path).name.removesuffix(".jsonl")
+    if SAMPLES_TAG not in stem:
+        raise ValueError(f"Not a generate.py output file: {path}")
+    label, suffix = stem.rsplit(SAMPLES_TAG, 1)
+    return label, suffix
+
+
+def mode_with_doc(mode: str) -> bool:
+    """True for document-context conditions: base token 'doc' or 'doc_first' (e.g. 'batch4.doc_first.window600')."""
+    return any(token in ("doc", "doc_first") for token in mode.split("."))
+
+
+def doc_buckets(assets: Path = ASSETS) -> dict:
+    """Numeric doc_id -> (document name, length bucket) from assets/doc_id.json + bucket_id.json."""
+    names = json.loads((assets / "doc_id.json").read_text(encoding="utf-8"))
+    buckets = json.loads((assets / "bucket_id.json").read_text(encoding="utf-8"))
+    return {idx: (name, buckets.get(name)) for name, idx in names.items()}
+
+
+def input_index(input_file: Path) -> dict:
+    """sample_id -> the per-row columns that come from the input file."""
+    docs = doc_buckets()
+    index = {}
+    for row in iter_jsonl(input_file):
+        doc_id = row.get("doc_id")
+        name, bucket = docs.get(doc_id, (None, None))
+        index[row.get("sample_id")] = {
+            "doc_id": doc_id, "doc_name": name, "bucket": bucket,
+            "domain": row.get("domain"), "system": row.get("system"),
+            "src_chars": len(row.get("src_seg", "")),
+        }
+    return index
+
+
+def _scores(out_path: Path, score_dir: Optional[Path]) -> dict:
+    # evaluate.py 출력 (<출력 폴더>/scores/<stem>.scores.jsonl)이 있으면 합침
+    path = (score_dir or out_path.parent / "scores") / f"{out_path.stem}.scores.jsonl"
+    if not path.exists():
+        return {}
+    return {rec["sample_id"]: rec for rec in iter_jsonl(path)}
+
+
+def result_rows(out_path: Path, index: dict, run: str, score_dir: Optional[Path] = None) -> Iterable[dict]:
+    label, mode = parse_output_name(out_path)
+    scores = _scores(out_path, score_dir)
+    for rec in iter_jsonl(out_path):
+        sid = rec.get("sample_id")
+        row = {k: rec.get(k) for k in RESULT_COLUMNS}
+        row.update(index.get(sid, {}))
+        row.update({k: v for k, v in scores.get(sid, {}).items() if k in SCORE_FIELDS})
+        row.update(run=run, model=label, mode=mode, with_doc=mode_with_doc(mode),
+                   sample_id=sid, error=is_error(rec))
+        yield row
+
+
+def span_rows(sink: Path, run: str) -> Iterable[dict]:
+    """Rows of a generate.py --telemetry sink (JSONL or CSV)."""
+    sink = Path(sink)
+    if sink.suffix == ".csv":
+        with sink.open(encoding="utf-8", newline="") as f:
+            recs = list(csv.DictReader(f))
+    else:
+        recs = list(iter_jsonl(sink))
+    cast = {"int64": lambda v: int(float(v)), "float64": float, "string": str}
+    for rec in recs:
+        # CSV 값은 모두 문자열 -> 스키마 타입으로 변환
+        row = {k: cast[t](rec[k]) if rec.get(k) not in (None, "") else None for k, t in SPAN_COLUMNS.items()}
+        row["run"] = run
+        yield row
+
+
+def _write(rows: List[dict], columns: dict, root: Path, partitions: List[str], run: str):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if not rows:
+        return 0
+    schema = _schema(columns)
+    table = pa.Table.from_pylist(rows, schema=schema)
+    # 같은 run을 다시 넣으면 그 run의 파일만 덮어씀 (다른 run은 유지)
+    ds.write_dataset(
+        table, root, format="parquet", schema=schema,
+        partitioning=partitions, partitioning_flavor="hive",
+        basename_template=f"{run}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def ingest(outputs: List[Path], input_file: Path, store: Path, run: str,
+           telemetry: Optional[Path] = None, score_dir: Optional[Path] = None) -> dict:
+    """Write outputs (+ scores) to <store>/results and a telemetry sink to <store>/spans.
+
+    results is partitioned by model/mode and spans by model (hive layout), so
+    readers can prune whole directories when filtering.
+    """
+    store = Path(store)
+    index = input_index(input_file)
+    counts = {}
+    for path in outputs:
+        rows = list(result_rows(Path(path), index, run, score_dir))
+        counts[Path(path).name] = _write(rows, RESULT_COLUMNS, store / "results", ["model", "mode"], run)
+    if telemetry:
+        counts["spans"] = _write(list(span_rows(telemetry, run)), SPAN_COLUMNS, store / "spans", ["model"], run)
+    return counts
+
+
+# ---- report ----
+AGGREGATES = {
+    "rows": ("sample_id", "count"),
+    "errors": ("error", "sum"),
+    "latency_mean": ("latency", "mean"),
+    "latency_p95": ("latency", "tdigest"),
+    "load_time": ("load_time", "sum"),
+    "input_token": ("input_token", "sum"),
+    "cached_input_token": ("cached_input_token", "sum"),
+    "output_token": ("output_token", "sum"),
+    "batch_wasted_input_token": ("batch_wasted_input_token", "sum"),
+    "batch_wasted_output_token": ("batch_wasted_output_token", "sum"),
+    "context_tokens": ("context_tokens", "mean"),
+    "chrf": ("chrf", "mean"),
+    "bleu": ("bleu", "mean"),
+    "ter": ("ter", "mean"),
+    "edit_rate": ("edit_rate", "mean"),
+}
+
+
+def load_results(store: Path, models: Optional[List[str]] = None, modes: Optional[List[str]] = None,
+                 runs: Optional[List[str]] = None):
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(Path(store) / "results", format="parquet", partitioning="hive",
+                         schema=_schema(RESULT_COLUMNS))
+    cond = None
+    for col, values in (("model", models), ("mode", modes), ("run", runs)):
+        if values:
+            expr = ds.field(col).isin(values)
+            cond = expr if cond is None else cond & expr
+    return dataset.to_table(filter=cond)
+
+
+def report(table, by: List[str], metrics: Optional[List[str]] = None):
+    """Vectorized group-by over the results table; returns a pyarrow Table sorted by `by`."""
+    import pyarrow.compute as pc
+
+    metrics = metrics or list(AGGREGATES)
+    unknown = [m for m in metrics if m not in AGGREGATES]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown} (choose from {list(AGGREGATES)})")
+    aggs = []
+    for m in metrics:
+        col, fn = AGGREGATES[m]
+        aggs.append((col, fn, pc.TDigestOptions(q=0.95)) if fn == "tdigest" else (col, fn))
+    out = table.group_by(by).aggregate(aggs)
+    # pyarrow 결과 이름 (latency_mean, error_sum, ...) -> 지표 이름
+    names = {f"{AGGREGATES[m][0]}_{AGGREGATES[m][1]}": m for m in metrics}
+    out = out.rename_columns([names.get(c, c) for c in out.column_names])
+    if "latency_p95" in out.column_names:
+        idx = out.column_names.index("latency_p95")
+        out = out.set_column(idx, "latency_p95", pc.list_element(out["latency_p95"], 0))
+    return out.select(by + metrics).sort_by([(c, "ascending") for c in by])
+
+
+def format_table(table) -> str:
+    cols = table.column_names
+    data = table.to_pylist()
+    fmt = lambda v: f"{v:.3f}" if isinstance(v, float) else ("" if v is None else str(v))
+    cells = [[fmt(r[c]) for c in cols] for r in data]
+    widths = [max([len(c)] + [len(row[i]) for row in cells]) for i, c in enumerate(cols)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(cols, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+import csv
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from .io import is_error
+
+CSV_FIELDS = ("ts", "span", "model", "seconds", "status", "input_token", "output_token", "attrs")
+# 요약의 "시간이 어디에 쓰였나" 순서
+SPAN_ORDER = ("queue_wait", "render", "limiter_wait", "backoff", "model_load", "call")
+
+
+def _quantile(ordered: list, q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class Telemetry:
+    """Per-call spans and counters for one run.
+
+    Every span is appended to an optional JSONL/CSV sink (chosen by the file
+    suffix); aggregates back the end-of-run summary and the Prometheus-text
+    endpoint. All methods are thread-safe and cheap enough to call per row.
+    """
+
+    def __init__(self, sink: Optional[str] = None):
+        self.lock = threading.Lock()
+        self.span_seconds = defaultdict(float)       # (model, span) -> 총 초
+        self.span_count = defaultdict(int)
+        self.latencies = defaultdict(list)           # model -> 성공한 call 지연
+        self.counters = defaultdict(float)           # (model, name) -> 값
+        self.wall = {}                               # model -> (start, end)
+        self.server = None
+        self.sink = self.writer = None
+        if sink:
+            path = Path(sink)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.sink = path.open("a", encoding="utf-8", newline="")
+            if path.suffix == ".csv":
+                self.writer = csv.writer(self.sink)
+                if self.sink.tell() == 0:
+                    self.writer.writerow(CSV_FIELDS)
+
+    # ---- recording ----
+    def record(self, span: str, seconds: float, model: str = "", **attrs):
+        with self.lock:
+            self.span_seconds[model, span] += seconds
+            self.span_count[model, span] += 1
+            if span == "call" and attrs.get("status", "ok") == "ok":
+                self.latencies[model].append(seconds)
+            if self.sink is not None:
+                self._emit(span, seconds, model, attrs)
+
+    @contextmanager
+    def span(self, span: str, model: str = "", **attrs):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(span, time.perf_counter() - t0, model, **attrs)
+
+    def count(self, name: str, value: float = 1, model: str = ""):
+        with self.lock:
+            self.counters[model, name] += value
+
+    def row(self, model: str, rec: dict):
+        """Count one written output record (rows, errors, tokens, retries)."""
+        with self.lock:
+            c = self.counters
+            c[model, "rows"] += 1
+            if is_error(rec):
+                c[model, "errors"] += 1
+            # batch_wasted_*: 파싱 실패로 버려진 배치 호출의 몫 (실제로 쓴 토큰이므로 합산)
+            c[model, "input_token"] += (rec.get("input_token", 0) or 0) + (rec.get("batch_wasted_input_token", 0) or 0)
+            c[model, "output_token"] += (rec.get("output_token", 0) or 0) + (rec.get("batch_wasted_output_token", 0) or 0)
+            c[model, "retries"] += rec.get("retries", 0) or 0
+            if rec.get("cache_hit"):
+                c[model, "cache_hits"] += 1
+
+    def start(self, model: str):
+        with self.lock:
+            self.wall[model] = (time.perf_counter(), None)
+
+    def finish(self, model: str):
+        with self.lock:
+            start, _ = self.wall.get(model, (time.perf_counter(), None))
+            self.wall[model] = (start, time.perf_counter())
+
+    def _emit(self, span, seconds, model, attrs):
+        ts = round(time.time(), 3)
+        if self.writer is not None:
+            extra = {k: v for k, v in attrs.items() if k not in ("status", "input_token", "output_token")}
+            self.writer.writerow((ts, span, model, round(seconds, 6), attrs.get("status", ""),
+                                  attrs.get("input_token", ""), attrs.get("output_token", ""),
+                                  json.dumps(extra, ensure_ascii=False) if extra else ""))
+        else:
+            self.sink.write(json.dumps({"ts": ts, "span": span, "model": model, "seconds": round(seconds, 6),
+                                        **attrs}, ensure_ascii=False) + "\n")
+
+    # ---- reporting ----
+    def summary(self, model: str) -> dict:
+        with self.lock:
+            c = lambda name: self.counters.get((model, name), 0)
+            lat = sorted(self.latencies.get(model, []))
+            start, end = self.wall.get(model, (None, None))
+            spans = {s: round(v, 2) for (m, s), v in self.span_seconds.items() if m == model}
+        wall = (end or time.perf_counter()) - start if start else 0.0
+        rows = c("rows")
+        per_min = lambda v: round(v / wall * 60, 1) if wall > 0 else None
+        out = {
+            "rows": int(rows),
+            "wall_s": round(wall, 1),
+            "rows_per_min": per_min(rows),
+            "tokens_per_min": per_min(c("input_token") + c("output_token")),
+            "output_tokens_per_min": per_min(c("output_token")),
+            "error_rate": round(c("errors") / rows, 4) if rows else 0.0,
+            "retry_rate": round(c("retries") / rows, 4) if rows else 0.0,
+            "cache_hits": int(c("cache_hits")),
+        }
+        for q in (0.5, 0.95, 0.99):
+            v = _quantile(lat, q)
+            out[f"p{int(q * 100)}_latency"] = round(v, 3) if v is not None else None
+        # 스레드별 시간의 합 (동시 실행이면 wall보다 클 수 있음)
+        out["time_s"] = {s: spans[s] for s in SPAN_ORDER if s in spans}
+        return out
+
+    def format_summary(self, model: str) -> str:
+        s = self.summary(model)
+        times = s.pop("time_s")
+        total = sum(times.values()) or 1.0
+        lines = [f"  {k:<22} {v}" for k, v in s.items()]
+        lines.append("  time spent (thread-seconds):")
+        lines += [f"    {k:<20} {v:>10.2f}s  {v / total:6.1%}" for k, v in times.items()]
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            spans = dict(self.span_seconds)
+            counts = dict(self.span_count)
+            lats = {m: sorted(v) for m, v in self.latencies.items()}
+        lines = []
+        for name in sorted({n for _, n in counters}):
+            lines.append(f"# TYPE longform_{name}_total counter")
+            for (m, n), v in sorted(counters.items()):
+                if n == name:
+                    lines.append(f'longform_{name}_total{{model="{m}"}} {v:g}')
+        lines.append("# TYPE longform_span_seconds_total counter")
+        for (m, s), v in sorted(spans.items()):
+            lines.append(f'longform_span_seconds_total{{model="{m}",span="{s}"}} {v:.6f}')
+        lines.append("# TYPE longform_span_count_total counter")
+        for (m, s), v in sorted(counts.items()):
+            lines.append(f'longform_span_count_total{{model="{m}",span="{s}"}} {v}')
+        lines.append("# TYPE longform_call_latency_seconds summary")
+        for m, lat in sorted(lats.items()):
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'longform_call_latency_seconds{{model="{m}",quantile="{q}"}} {_quantile(lat, q):.6f}')
+            lines.append(f'longform_call_latency_seconds_sum{{model="{m}"}} {sum(lat):.6f}')
+            lines.append(f'longform_call_latency_seconds_count{{model="{m}"}} {len(lat)}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """Expose prometheus_text() at http://host:port/metrics on a daemon thread."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not self.path.startswith("/metrics"):
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+        if self.sink is not None:
+            with self.lock:
+                self.sink.close()
+                self.sink = None
@@ -0,0 +1,197 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from .io import is_error
+
+# status 집계에서 처리량/ETA를 계산하는 최근 구간 (초)
+RATE_WINDOW = 600.0
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """SQLite task queue shared by any number of worker processes.
+
+    One task per (model, mode, sample_id), leased in input order. A lease lasts
+    `lease` seconds and is renewed by the holder while it works; a worker that
+    dies simply stops renewing and its tasks are leased again. A result is
+    stored in the same transaction that marks its task done, and only the
+    current lease holder can do so, so every sample is written exactly once.
+    """
+
+    def __init__(self, path: Path, lease: float = 120.0, max_attempts: int = 3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # isolation_level=None: 트랜잭션은 _tx()의 BEGIN IMMEDIATE로 직접 관리
+        self.db = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " model TEXT NOT NULL, mode TEXT NOT NULL, sample_id NOT NULL, seq INTEGER NOT NULL,"
+            " row TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_until REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error INTEGER, started REAL, finished REAL,"
+            " PRIMARY KEY (model, mode, sample_id))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_todo ON tasks (model, mode, status, seq)")
+
+    @contextmanager
+    def _tx(self):
+        # BEGIN IMMEDIATE: 쓰기 잠금을 먼저 잡아서 두 worker가 같은 task를 lease하지 않게 함
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def enqueue(self, model: str, mode: str, rows: Iterable[Tuple[int, dict]]) -> int:
+        """Add (seq, row) tasks; tasks that already exist are left alone, so every worker can call this."""
+        with self._tx() as db:
+            cur = db.executemany(
+                "INSERT OR IGNORE INTO tasks (model, mode, sample_id, seq, row) VALUES (?, ?, ?, ?, ?)",
+                ((model, mode, row.get("sample_id"), seq, json.dumps(row, ensure_ascii=False)) for seq, row in rows),
+            )
+            return cur.rowcount
+
+    def lease(self, model: str, mode: str, worker: str, n: int) -> List[dict]:
+        """Up to n pending (or expired) tasks in input order, now held by `worker`."""
+        now = time.time()
+        with self._tx() as db:
+            got = db.execute(
+                "SELECT sample_id, row FROM tasks WHERE model = ? AND mode = ?"
+                " AND (status = 'pending' OR (status = 'leased' AND lease_until < ?)) ORDER BY seq LIMIT ?",
+                (model, mode, now, n),
+            ).fetchall()
+            db.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1,"
+                " started = ? WHERE model = ? AND mode = ? AND sample_id = ?",
+                [(worker, now + self.lease_seconds, now, model, mode, sid) for sid, _ in got],
+            )
+        return [json.loads(row) for _, row in got]
+
+    def renew(self, model: str, mode: str, worker: str):
+        with self._tx() as db:
+            db.execute("UPDATE tasks SET lease_until = ? WHERE model = ? AND mode = ? AND worker = ? AND status = 'leased'",
+                       (time.time() + self.lease_seconds, model, mode, worker))
+
+    def complete(self, model: str, mode: str, worker: str, recs: List[dict]) -> dict:
+        """Commit one chunk's records. [ERROR] records are requeued until max_attempts.
+
+        Returns counts of done / retry / lost (lease taken over by another worker).
+        """
+        counts = {"done": 0, "retry": 0, "lost": 0}
+        now = time.time()
+        with self._tx() as db:
+            for rec in recs:
+                key = (model, mode, rec.get("sample_id"), worker)
+                row = db.execute(
+                    "SELECT attempts FROM tasks WHERE model = ? AND mode = ? AND sample_id = ?"
+                    " AND worker = ? AND status = 'leased'", key,
+                ).fetchone()
+                if row is None:
+                    counts["lost"] += 1
+                    continue
+                error = is_error(rec)
+                retry = error and row[0] < self.max_attempts
+                db.execute(
+                    "UPDATE tasks SET status = ?, result = ?, error = ?, finished = ?, lease_until = NULL,"
+                    " worker = CASE WHEN ? THEN NULL ELSE worker END"
+                    " WHERE model = ? AND mode = ? AND sample_id = ? AND worker = ?",
+                    ("pending" if retry else "done", json.dumps(rec, ensure_ascii=False), int(error),
+                     None if retry else now, retry, *key),
+                )
+                counts["retry" if retry else "done"] += 1
+        return counts
+
+    def release(self, model: str, mode: str, worker: str):
+        """Hand this worker's unfinished tasks of one run back (on a clean shutdown, instead of waiting for expiry).
+
+        Scoped to (model, mode): one process runs several models on the same worker id.
+        """
+        with self._tx() as db:
+            db.execute("UPDATE tasks SET status = 'pending', worker = NULL, lease_until = NULL,"
+                       " attempts = MAX(attempts - 1, 0) WHERE model = ? AND mode = ? AND worker = ? AND status = 'leased'",
+                       (model, mode, worker))
+
+    def counts(self, model: str, mode: str) -> dict:
+        with self.lock:
+            rows = self.db.execute("SELECT status, COUNT(*) FROM tasks WHERE model = ? AND mode = ? GROUP BY status",
+                                   (model, mode)).fetchall()
+        return dict(rows)
+
+    def export(self, model: str, mode: str, path: Path) -> int:
+        """Write the finished records to `path` in input order (atomic replace).
+
+        Several workers can finish at the same time; each writes its own tmp
+        file (same content), so the replace never sees a half-written file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.tmp")
+        n = 0
+        with self.lock, tmp.open("w", encoding="utf-8") as f:
+            for (result,) in self.db.execute(
+                "SELECT result FROM tasks WHERE model = ? AND mode = ? AND status = 'done' ORDER BY seq", (model, mode)
+            ):
+                f.write(result + "\n")
+                n += 1
+        os.replace(tmp, path)
+        return n
+
+    def status(self) -> Tuple[List[dict], List[dict]]:
+        """Progress per (model, mode) and throughput per worker, for `results.py status`."""
+        now = time.time()
+        with self.lock:
+            runs = self.db.execute(
+                "SELECT model, mode, COUNT(*),"
+                " SUM(status = 'done'), SUM(status = 'done' AND error = 1), SUM(status = 'leased'),"
+                " SUM(status = 'done' AND finished >= ?), MIN(started), MAX(finished)"
+                " FROM tasks GROUP BY model, mode ORDER BY model, mode",
+                (now - RATE_WINDOW,),
+            ).fetchall()
+            workers = self.db.execute(
+                "SELECT worker, SUM(status = 'done'), SUM(status = 'leased'), SUM(status = 'done' AND finished >= ?),"
+                " MIN(started), MAX(finished) FROM tasks WHERE worker IS NOT NULL GROUP BY worker ORDER BY worker",
+                (now - RATE_WINDOW,),
+            ).fetchall()
+
+        progress = []
+        for model, mode, total, done, errors, leased, recent, first, last in runs:
+            done, errors, leased, recent = done or 0, errors or 0, leased or 0, recent or 0
+            window = min(RATE_WINDOW, now - first) if first else 0
+            rate = recent / window * 60 if window > 0 else None      # rows/min (최근 구간)
+            left = total - done
+            progress.append({
+                "model": model, "mode": mode, "total": total, "done": done, "errors": errors,
+                "leased": leased, "pending": left - leased, "pct": round(100 * done / total, 1) if total else 0.0,
+                "rows_per_min": round(rate, 1) if rate else None,
+                "eta_min": round(left / rate, 1) if rate and left else (0.0 if not left else None),
+            })
+        per_worker = []
+        for worker, done, leased, recent, first, last in workers:
+            done = done or 0
+            span = (last - first) if first and last and last > first else 0
+            per_worker.append({
+                "worker": worker, "done": done, "leased": leased or 0,
+                "rows_per_min": round(done / span * 60, 1) if span else None,
+                "recent_rows_per_min": round((recent or 0) / RATE_WINDOW * 60, 1),
+                "last_seen_s": round(now - last, 1) if last else None,
+            })
+        return progress, per_worker
+
+    def close(self):
+        self.db.close()
@@ -1,50 +1,176 @@
 import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Tuple
 
-TEMPLATE = "prompts/template.jsonl"
+ROOT = Path(__file__).resolve().parent.parent
+TEMPLATE = ROOT / "prompts" / "template.jsonl"
+DOC_DIR = ROOT / "data" / "inputs"
 LANG_CODE = {"en": "English", "ko": "Korean"}
-_CACHED_TEMPLATES = None
+# seg_first: 원래 레이아웃 (segment -> document)
+# doc_first: 문서 컨텍스트를 system에 먼저 배치 -> 같은 doc_id 끼리 prefix 공유 (prompt/KV cache 재사용)
+LAYOUTS = ("seg_first", "doc_first")
 
-def _get_templates():
-    global _CACHED_TEMPLATES
-    if _CACHED_TEMPLATES is None:
-        with open(TEMPLATE, "r", encoding="utf-8") as f:
-            _CACHED_TEMPLATES = [json.loads(l) for l in f.readlines()]
-    return _CACHED_TEMPLATES
+
+@lru_cache(maxsize=None)
+def _get_templates() -> dict:
+    """(has_doc, layout) -> template row. Loaded once per process (lru_cache is thread-safe)."""
+    with open(TEMPLATE, "r", encoding="utf-8") as f:
+        rows = [json.loads(l) for l in f if l.strip()]
+    templates = {}
+    for t in rows:
+        templates.setdefault((t["has_doc"], t.get("layout", "seg_first")), t)
+    return templates
+
+
+class DocumentStore:
+    """Source/target documents indexed once by doc_id and loaded lazily.
+
+    The directory listing is read once at construction, so lookups never touch
+    `Path.exists()`. Loaded documents are kept in an LRU bounded by `max_docs`.
+    Safe to share between worker threads; each worker process builds its own.
+    """
+
+    def __init__(self, root: Path = DOC_DIR, max_docs: int = 128):
+        root = Path(root)
+        self.src_index = {p.stem: p for p in (root / "src_docs").glob("*.txt")}
+        self.tgt_index = {p.stem: p for p in (root / "tgt_docs").glob("*.txt")}
+        self.max_docs = max_docs
+        self.docs: OrderedDict[str, Tuple[str, str]] = OrderedDict()
+        self.lock = threading.Lock()
+        # 디스크 읽기 통계 (pipeline.telemetry 요약의 doc_io)
+        self.loads = 0
+        self.io_seconds = 0.0
+
+    def _read(self, index: dict, key: str) -> str:
+        path = index.get(key)
+        return path.read_text(encoding="utf-8") if path else ""
+
+    def get(self, doc_id) -> Tuple[str, str]:
+        if doc_id is None or doc_id == "":
+            return "", ""
+        key = str(doc_id)
+        with self.lock:
+            if key in self.docs:
+                self.docs.move_to_end(key)
+                return self.docs[key]
+        # 파일 읽기는 lock 밖에서 (같은 문서를 동시에 읽어도 결과는 동일)
+        t0 = time.perf_counter()
+        doc = (self._read(self.src_index, key), self._read(self.tgt_index, key))
+        elapsed = time.perf_counter() - t0
+        with self.lock:
+            self.loads += 1
+            self.io_seconds += elapsed
+            self.docs[key] = doc
+            self.docs.move_to_end(key)
+            while len(self.docs) > self.max_docs:
+                self.docs.popitem(last=False)
+        return doc
+
+
+_DEFAULT_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def default_store() -> DocumentStore:
+    global _DEFAULT_STORE
+    with _STORE_LOCK:
+        if _DEFAULT_STORE is None:
+            _DEFAULT_STORE = DocumentStore()
+        return _DEFAULT_STORE
 
 def load_document(doc_id) -> Tuple[str, str]:
-    if not doc_id: return "", ""
-    src_path = Path("data/inputs/src_docs") / f"{doc_id}.txt"
-    tgt_path = Path("data/inputs/tgt_docs") / f"{doc_id}.txt"
-    src_doc = src_path.read_text(encoding="utf-8") if src_path.exists() else ""
-    tgt_doc = tgt_path.read_text(encoding="utf-8") if tgt_path.exists() else ""
-    return src_doc, tgt_doc
+    return default_store().get(doc_id)
 
-def build_prompt(row: dict, has_doc=True):
+def _validate(row: dict):
     # Schema Validation
     required = ["src_lang", "tgt_lang", "src_seg", "tgt_seg"]
     for k in required:
         if k not in row: raise KeyError(f"Missing key in data: {k}")
 
+def _documents(rows: list[dict], store, context, meta):
+    src_doc, tgt_doc = (store or default_store()).get(rows[0].get('doc_id'))
+    if context is not None:
+        src_doc, tgt_doc, info = context.select(
+            src_doc, tgt_doc, [r["src_seg"] for r in rows], [r["tgt_seg"] for r in rows]
+        )
+        if meta is not None:
+            meta.update(info)
+    return src_doc, tgt_doc
+
+def build_prompt(
+    row: dict,
+    has_doc=True,
+    store: DocumentStore | None = None,
+    layout: str = "seg_first",
+    context=None,
+    meta: dict | None = None,
+):
+    """Render (system, user) for one row.
+
+    `context` (prompts.context.ContextSelector) trims the documents to a token
+    budget; if `meta` is given it receives the strategy and context token count.
+    """
+    _validate(row)
+
     src_lang = LANG_CODE[row["src_lang"]]
     tgt_lang = LANG_CODE[row["tgt_lang"]]
-    
-    src_doc, tgt_doc = "", ""
-    if has_doc:
-        src_doc, tgt_doc = load_document(row.get('doc_id'))
-    
-    templates = _get_templates()
-    template_row = next((t for t in templates if t["has_doc"] == has_doc), None)
-    
+
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    # seg 모드는 레이아웃 구분 없음
+    template_row = _get_templates()[(has_doc, layout if has_doc else "seg_first")]
+
     user_kwargs = {
         "src_lang": src_lang, "tgt_lang": tgt_lang,
         "src_seg": row["src_seg"], "tgt_seg": row["tgt_seg"]
     }
     if has_doc:
+        src_doc, tgt_doc = _documents([row], store, context, meta)
         user_kwargs.update({"src_doc": src_doc, "tgt_doc": tgt_doc})
-        
+
     user = template_row["user"].format(**user_kwargs)
-    system = template_row["system"].format(tgt_lang=tgt_lang)
-    
-    return system, user
\ No newline at end of file
+    system = template_row["system"].format(**user_kwargs)
+
+    return system, user
+
+def build_batch_prompt(
+    rows: list[dict],
+    has_doc=True,
+    store: DocumentStore | None = None,
+    context=None,
+    meta: dict | None = None,
+):
+    """One request for N consecutive segments of the same document.
+
+    Segments are numbered 1..N as <seg id=k>; the model answers with <pe id=k>.
+    """
+    if not rows:
+        raise ValueError("build_batch_prompt requires at least one row")
+    for row in rows:
+        _validate(row)
+    doc_ids = {row.get("doc_id") for row in rows}
+    if has_doc and len(doc_ids) > 1:
+        raise ValueError(f"Batched rows must share one doc_id (got {sorted(map(str, doc_ids))})")
+
+    src_lang = LANG_CODE[rows[0]["src_lang"]]
+    tgt_lang = LANG_CODE[rows[0]["tgt_lang"]]
+    template_row = _get_templates()[(has_doc, "batch")]
+
+    segments = "\n\n".join(
+        template_row["segment"].format(
+            k=k, src_lang=src_lang, tgt_lang=tgt_lang, src_seg=row["src_seg"], tgt_seg=row["tgt_seg"]
+        )
+        for k, row in enumerate(rows, 1)
+    )
+    kwargs = {"src_lang": src_lang, "tgt_lang": tgt_lang, "segments": segments}
+    if has_doc:
+        src_doc, tgt_doc = _documents(rows, store, context, meta)
+        kwargs.update({"src_doc": src_doc, "tgt_doc": tgt_doc})
+
+    user = template_row["user"].format(**kwargs)
+    system = template_row["system"].format(**kwargs)
+
+    return system, user
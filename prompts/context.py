@@ -0,0 +1,183 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+STRATEGIES = ("full", "window", "head", "relevant")
+ELLIPSIS = "..."
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?。？！\"”’)])\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _whitespace_count(text: str) -> int:
+    return len(text.split()) if text else 0
+
+
+def split_sentences(doc: str) -> List[str]:
+    return [s for s in _SENT_SPLIT.split(doc.strip()) if s] if doc else []
+
+
+def _locate(sents: List[str], segs: List[str]) -> Tuple[int, int]:
+    """Sentence index span [lo, hi] that covers the given segments in the document."""
+    if not sents:
+        return 0, 0
+    starts, pos = [], 0
+    doc = " ".join(sents)
+    for s in sents:
+        starts.append(pos)
+        pos += len(s) + 1
+
+    def index_at(offset: int) -> int:
+        i = 0
+        while i + 1 < len(starts) and starts[i + 1] <= offset:
+            i += 1
+        return i
+
+    hits = []
+    for seg in segs:
+        off = doc.find(seg.strip()) if seg else -1
+        if off >= 0:
+            hits.append((index_at(off), index_at(off + len(seg.strip()) - 1)))
+    if not hits:
+        # 문서에서 segment를 못 찾으면 어휘 겹침이 가장 큰 문장을 중심으로
+        best = max(range(len(sents)), key=lambda i: _overlap(sents[i], " ".join(segs)))
+        return best, best
+    return min(h[0] for h in hits), max(h[1] for h in hits)
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD.findall(text)}
+
+
+def _overlap(a: str, b: str) -> float:
+    wa, wb = _words(a), _words(b)
+    if not wa or not wb:
+        return 0.0
+    return len(wa & wb) / len(wa | wb)
+
+
+def _join(sents: List[str], keep: List[int]) -> str:
+    """Join kept sentences in document order, marking skipped spans with '...'."""
+    out, prev = [], -1
+    for i in sorted(keep):
+        if i != prev + 1:
+            out.append(ELLIPSIS)
+        out.append(sents[i])
+        prev = i
+    if prev != len(sents) - 1 and keep:
+        out.append(ELLIPSIS)
+    return " ".join(out)
+
+
+class ContextSelector:
+    """Fit a document into a token budget around the current segment.
+
+    Strategies:
+    - full:     the whole document (original behaviour)
+    - window:   sliding window grown symmetrically around the segment
+    - head:     the document opening (`head_ratio` of the budget) plus the segment's neighbourhood
+    - relevant: sentences with the highest lexical overlap with the segment, in document order
+    """
+
+    def __init__(
+        self,
+        strategy: str = "window",
+        budget: Optional[int] = None,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        head_ratio: float = 0.3,
+        counter_name: str = "heuristic",
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy: {strategy} (choose from {STRATEGIES})")
+        self.strategy = strategy
+        self.budget = budget
+        self.count_tokens = count_tokens or _whitespace_count
+        self.head_ratio = head_ratio
+        # 같은 key면 같은 컨텍스트가 선택됨 (렌더링 결과 공유용)
+        self.key = (strategy, budget, head_ratio, counter_name)
+
+    def _window(self, sents, costs, lo, hi, budget, keep):
+        # 양쪽으로 번갈아 한 문장씩 확장. 다음 문장이 예산을 넘으면 그쪽은 멈춤 (창에 빈틈이 생기지 않게)
+        used = sum(costs[i] for i in keep)
+        edge = {1: hi + 1, -1: lo - 1}
+        while edge:
+            for step in (1, -1):
+                if step not in edge:
+                    continue
+                i = edge[step]
+                if not 0 <= i < len(sents):
+                    del edge[step]
+                elif i in keep:
+                    edge[step] = i + step
+                elif used + costs[i] <= budget:
+                    keep.add(i)
+                    used += costs[i]
+                    edge[step] = i + step
+                else:
+                    del edge[step]
+        return used
+
+    def _select_one(self, doc: str, segs: List[str], budget: int) -> Tuple[str, int]:
+        sents = split_sentences(doc)
+        if not sents:
+            return "", 0
+        costs = [self.count_tokens(s) for s in sents]
+        if sum(costs) <= budget:
+            return doc, sum(costs)
+
+        lo, hi = _locate(sents, segs)
+        # 현재 segment 자체는 예산과 무관하게 항상 포함
+        keep = set(range(lo, hi + 1))
+
+        if self.strategy == "window":
+            self._window(sents, costs, lo, hi, budget, keep)
+
+        elif self.strategy == "head":
+            head_budget = int(budget * self.head_ratio)
+            head_used = 0
+            for i in range(lo):
+                if head_used + costs[i] > head_budget:
+                    break
+                keep.add(i)
+                head_used += costs[i]
+            self._window(sents, costs, lo, hi, budget, keep)
+
+        elif self.strategy == "relevant":
+            query = " ".join(segs)
+            used = sum(costs[i] for i in keep)
+            ranked = sorted((i for i in range(len(sents)) if i not in keep),
+                            key=lambda i: _overlap(sents[i], query), reverse=True)
+            for i in ranked:
+                if used + costs[i] <= budget:
+                    keep.add(i)
+                    used += costs[i]
+
+        return _join(sents, list(keep)), sum(costs[i] for i in keep)
+
+    def select(self, src_doc: str, tgt_doc: str, src_segs: List[str], tgt_segs: List[str]) -> Tuple[str, str, dict]:
+        """Returns (src_doc, tgt_doc, info) where info = {context_strategy, context_tokens}."""
+        if self.strategy == "full" or not self.budget:
+            tokens = self.count_tokens(src_doc) + self.count_tokens(tgt_doc)
+            return src_doc, tgt_doc, {"context_strategy": "full", "context_tokens": tokens}
+
+        # 예산은 source/target 문서에 반씩
+        half = self.budget // 2
+        src, src_tok = self._select_one(src_doc, src_segs, half)
+        tgt, tgt_tok = self._select_one(tgt_doc, tgt_segs, half)
+        return src, tgt, {"context_strategy": self.strategy, "context_tokens": src_tok + tgt_tok}
+
+
+def budget_for(model, reserve: int = 512) -> Optional[int]:
+    """Context token budget from the model config.
+
+    An explicit `context_budget` wins; otherwise num_ctx minus the output budget
+    (max_tokens) and a reserve for instructions and the segment itself.
+    """
+    explicit = getattr(model, "context_budget", None)
+    if explicit:
+        return int(explicit)
+    dec = getattr(model, "decoding", None)
+    num_ctx = (getattr(dec, "num_ctx", None) if dec else None) or getattr(model, "num_ctx", None)
+    if not num_ctx:
+        return None
+    max_tokens = getattr(dec, "max_tokens", 0) if dec else 0
+    return max(int(num_ctx) - int(max_tokens) - reserve, 0)
@@ -0,0 +1,104 @@
+import argparse
+import glob
+import re
+import time
+from pathlib import Path
+from pipeline.io import merge_jsonl, unshard_name, SHARD_TAG
+from pipeline.workqueue import WorkQueue
+from pipeline.store import ingest, load_results, report, format_table, AGGREGATES
+
+GROUP_COLUMNS = ("model", "mode", "with_doc", "run", "doc_id", "doc_name", "bucket", "domain", "system",
+                 "pe_status", "context_strategy", "batch_size")
+
+def cmd_ingest(args):
+    paths = []
+    for pattern in args.outputs:
+        matched = sorted(glob.glob(pattern)) or [pattern]
+        paths += [Path(p) for p in matched if not p.endswith(".scores.jsonl")]
+    # run 이름은 파일 이름에 들어가므로 경로 구분자 등은 제거
+    run = re.sub(r"[^\w.-]+", "-", args.run or time.strftime("%Y%m%d-%H%M%S"))
+    counts = ingest(paths, Path(args.input_file), Path(args.store), run,
+                    telemetry=args.telemetry, score_dir=Path(args.score_dir) if args.score_dir else None)
+    for name, n in counts.items():
+        print(f"[INGEST] {name}: {n} rows")
+    print(f"[DONE] run={run} -> {args.store}")
+
+def cmd_report(args):
+    table = load_results(Path(args.store), args.models, args.modes, args.runs)
+    if table.num_rows == 0:
+        print("[REPORT] no rows match")
+        return
+    out = report(table, args.by, args.metrics)
+    print(format_table(out))
+    if args.csv:
+        import pyarrow.csv as pacsv
+        pacsv.write_csv(out, args.csv)
+        print(f"[DONE] {args.csv}")
+
+def cmd_merge(args):
+    groups = {}
+    for pattern in args.inputs:
+        for p in sorted(glob.glob(pattern)) or [pattern]:
+            groups.setdefault(unshard_name(Path(p)), []).append(Path(p))
+    if args.out and len(groups) > 1:
+        raise SystemExit(f"--out needs shards of one output, got {len(groups)}: {[g.name for g in groups]}")
+    for target, paths in groups.items():
+        counts = {int(m.group(2)) for p in paths if (m := SHARD_TAG.search(p.stem))}
+        if len(counts) == 1 and len(paths) != next(iter(counts)):
+            print(f"[WARN] {target.name}: {len(paths)} of {next(iter(counts))} shards found")
+        out = Path(args.out) if args.out else target
+        n = merge_jsonl(paths, out)
+        print(f"[MERGE] {len(paths)} shards -> {out} ({n} samples)")
+
+def cmd_status(args):
+    queue = WorkQueue(args.queue)
+    progress, workers = queue.status()
+    queue.close()
+    fmt = lambda v: "-" if v is None else str(v)
+    for title, rows in (("progress", progress), ("workers", workers)):
+        if not rows:
+            continue
+        cols = list(rows[0])
+        widths = [max(len(c), *(len(fmt(r[c])) for r in rows)) for c in cols]
+        print(f"[{title.upper()}]")
+        print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+        for r in rows:
+            print("  ".join(fmt(r[c]).rjust(w) for c, w in zip(cols, widths)))
+
+def main():
+    ap = argparse.ArgumentParser(description="실행 결과를 Parquet store에 넣고 그룹별로 집계")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="generate.py 출력(+ evaluate.py 점수, telemetry)을 store에 추가")
+    ing.add_argument("--outputs", required=True, nargs="+", help="출력 JSONL 파일(들) 또는 glob")
+    ing.add_argument("--input_file", required=True, help="doc_id/domain/system을 가져올 입력 JSONL")
+    ing.add_argument("--store", default="results_store", help="Parquet dataset 폴더")
+    ing.add_argument("--run", default=None, help="run 이름 (같은 이름으로 다시 넣으면 덮어씀, 기본: 현재 시각)")
+    ing.add_argument("--telemetry", default=None, help="generate.py --telemetry 파일 (JSONL/CSV)")
+    ing.add_argument("--score_dir", default=None, help="evaluate.py 점수 폴더 (기본: <출력 폴더>/scores)")
+    ing.set_defaults(func=cmd_ingest)
+
+    rep = sub.add_parser("report", help="store에서 group-by 집계")
+    rep.add_argument("--store", default="results_store")
+    rep.add_argument("--by", nargs="+", choices=GROUP_COLUMNS, default=["model", "mode"])
+    rep.add_argument("--metrics", nargs="+", choices=list(AGGREGATES), default=None)
+    rep.add_argument("--models", nargs="+", default=None)
+    rep.add_argument("--modes", nargs="+", default=None)
+    rep.add_argument("--runs", nargs="+", default=None)
+    rep.add_argument("--csv", default=None, help="집계 결과를 CSV로 저장")
+    rep.set_defaults(func=cmd_report)
+
+    mer = sub.add_parser("merge", help="generate.py --shard 출력들을 sample_id 순서로 합침")
+    mer.add_argument("--inputs", required=True, nargs="+", help="shard 파일(들) 또는 glob (예: out/*.shard*of4.jsonl)")
+    mer.add_argument("--out", default=None, help="합친 파일 경로 (기본: shard 태그를 뺀 원래 이름)")
+    mer.set_defaults(func=cmd_merge)
+
+    st = sub.add_parser("status", help="generate.py --queue 진행률, ETA, worker별 처리량")
+    st.add_argument("--queue", required=True, help="작업 큐 SQLite 경로")
+    st.set_defaults(func=cmd_status)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Experiment sweep: models x conditions x decoding variants in one process.
+
+    python sweep.py --config config/models.yaml --models gpt-4o-mini llama3-8b-instruct \
+        --conditions seg doc window --decoding default: t0:temperature=0 \
+        --input_file data/inputs/en-ko.jsonl --output_dir outputs/sweep --max_workers 8
+
+The input is read once and each distinct prompt is rendered once (variants of
+a model share its renders). Every backend gets one worker pool that takes
+chunks from all of its cells in turn, so no condition waits for another to
+finish. Output files are named like generate.py's (`<label>_5_samples.<mode>.jsonl`,
+label `<model>@<variant>` for non-default variants) and the run is recorded
+in <output_dir>/sweep_manifest.json.
+"""
+import argparse
+import copy
+import dataclasses
+import hashlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from tqdm import tqdm
+
+from generate import add_run_args, build_models, configure_model, make_cache, make_condition, run_batch, warm_up
+from models.clients import configure_pool
+from models.resilience import RetryBudget
+from pipeline.batching import chunk_rows
+from pipeline.executor import run_ordered
+from pipeline.io import JsonlIndex, JsonlWriter, succeeded_ids, compact_jsonl, is_error
+from pipeline.render import PromptRenderer, Condition
+from pipeline.scheduler import group_by_doc, interleave, residency_lanes, DocPrimer
+from pipeline.telemetry import Telemetry
+from prompts.ape_prompt import TEMPLATE
+from prompts.context import STRATEGIES, budget_for
+
+ROOT = Path(__file__).resolve().parent
+# seg, doc(전체 문서) + 문서 컨텍스트 선택 전략 (window = windowed-doc)
+CONDITIONS = ("seg", "doc") + tuple(s for s in STRATEGIES if s != "full")
+DEFAULT_VARIANT = "default"
+
+
+@dataclasses.dataclass
+class Cell:
+    """One output file: (model, decoding variant, condition)."""
+
+    label: str
+    variant: str
+    condition: str
+    model: object
+    cond: Condition
+    out_path: Path
+    rows: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+def parse_variant(value: str) -> tuple[str, dict]:
+    """'t0:temperature=0,top_p=1' -> ('t0', {'temperature': 0, 'top_p': 1}). 'default:' = no overrides."""
+    import yaml
+
+    name, _, spec = value.partition(":")
+    if not name:
+        raise argparse.ArgumentTypeError(f"expected NAME:key=value,..., got {value!r}")
+    overrides = {}
+    for item in filter(None, (x.strip() for x in spec.split(","))):
+        key, sep, raw = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"expected key=value in {value!r}, got {item!r}")
+        overrides[key.strip()] = yaml.safe_load(raw)    # 숫자/리스트/null 그대로
+    return name, overrides
+
+
+def condition_args(args, condition: str) -> argparse.Namespace:
+    """generate.py 옵션 형태로 변환 (make_condition/configure_model 재사용)."""
+    with_doc = condition != "seg"
+    return argparse.Namespace(**{**vars(args), "with_doc": with_doc, "dry_run": False, "batch_api": False,
+                                 "context": "full" if condition in ("seg", "doc") else condition})
+
+
+def make_variant(model, name: str, overrides: dict):
+    """Shallow copy with its own Decoding: clients, limiter, endpoints and resilience stay shared.
+
+    Backends must read `self.decoding` per request (the local engine gets it
+    with each submitted item), since shared members still point at the base model.
+    """
+    if not overrides and name == DEFAULT_VARIANT:
+        return model
+    unknown = set(overrides) - {f.name for f in dataclasses.fields(model.decoding)}
+    if unknown:
+        raise ValueError(f"Unknown decoding fields for variant {name!r}: {sorted(unknown)}")
+    variant = copy.copy(model)
+    variant.decoding = dataclasses.replace(model.decoding)
+    variant.name = f"{model.name}@{name}"
+    return variant.with_decoding(**overrides)
+
+
+def build_cells(models, variants: dict, conditions: list, args) -> list:
+    out_dir = Path(args.output_dir)
+    cells = []
+    for label, model in models:
+        for vname, overrides in variants.items():
+            vm = make_variant(model, vname, overrides)
+            for condition in conditions:
+                cargs = condition_args(args, condition)
+                if cargs.context != "full" and not (args.context_budget or budget_for(vm)):
+                    raise ValueError(f"{vm.name}: condition {condition!r} needs a context budget "
+                                     "(--context_budget, or context_budget/num_ctx in the model config)")
+                cond = make_condition(vm, cargs)
+                cm = copy.copy(vm)
+                cm.prompt_cache = cond.prefix_cache
+                out_path = out_dir / f"{vm.name}_5_samples.{cond.suffix}.jsonl"
+                cells.append(Cell(vm.name, vname, condition, cm, cond, out_path))
+    paths = [c.out_path for c in cells]
+    dup = {p.name for p in paths if paths.count(p) > 1}
+    if dup:
+        raise ValueError(f"Sweep cells write the same file: {sorted(dup)}")
+    return cells
+
+
+def backend_groups(cells: list) -> "OrderedDict":
+    """Cells that share one backend (and, for Ollama, one resident (model, num_ctx)) -> one worker pool."""
+    groups: OrderedDict = OrderedDict()
+    for cell in cells:
+        base = cell.label.split("@")[0]
+        key = getattr(cell.model, "residency_key", None)
+        groups.setdefault((base, key() if key else None), []).append(cell)
+    return groups
+
+
+def run_group(cells: list, rows_source, args, renderer: PromptRenderer, position: int = 0):
+    """Run all cells of one backend on a single worker pool, chunks interleaved across cells."""
+    model = cells[0].model
+    workers = getattr(model, "max_workers", None) or args.max_workers
+    tel = model.telemetry
+    warm_up(cells[0].label, model, args)
+    for name in dict.fromkeys(c.model.name for c in cells):
+        if tel is not None:
+            tel.start(name)
+
+    def chunks(i: int, cell: Cell):
+        done = succeeded_ids(cell.out_path) if args.resume else set()
+        if done:
+            print(f"[RESUME] {cell.out_path.name}: {len(done)}개 sample 건너뜀")
+        todo = (row for row in rows_source() if row.get("sample_id") not in done)
+        if cell.cond.prefix_cache:
+            todo = group_by_doc(todo)
+        for rows in chunk_rows(todo, cell.cond.batch_size):
+            yield i, time.perf_counter(), rows
+
+    primers = [DocPrimer() if c.cond.prefix_cache else None for c in cells]
+
+    def task(item):
+        i, submitted, rows = item
+        cell = cells[i]
+        if tel is not None:
+            tel.record("queue_wait", time.perf_counter() - submitted, cell.model.name)
+        call = lambda: run_batch(cell.model, rows, cell.cond, renderer)
+        return call() if primers[i] is None else primers[i].run(rows[0].get("doc_id"), call)
+
+    t0 = time.perf_counter()
+    with ExitStack() as stack:
+        writers = [stack.enter_context(JsonlWriter(c.out_path, append=args.resume, fsync=args.fsync)) for c in cells]
+        jobs = run_ordered(task, interleave(chunks(i, c) for i, c in enumerate(cells)), workers)
+        for (i, _, _), recs in tqdm(jobs, desc=f"Sweep {cells[0].label.split('@')[0]}", position=position):
+            cell = cells[i]
+            for rec in recs:
+                writers[i].write(rec)
+                cell.rows += 1
+                cell.errors += is_error(rec)
+                if tel is not None:
+                    tel.row(cell.model.name, rec)
+            cell.seconds = time.perf_counter() - t0
+
+    for cell in cells:
+        if args.resume or cell.cond.prefix_cache:
+            compact_jsonl(cell.out_path)
+        print(f"[DONE] {cell.out_path} ({cell.rows} rows, {cell.errors} errors, {cell.seconds:.1f}s)")
+    if tel is not None:
+        for name in dict.fromkeys(c.model.name for c in cells):
+            tel.finish(name)
+            print(f"[TELEMETRY] {name}\n{tel.format_summary(name)}")
+
+
+def _sha256(path: Path) -> Optional[str]:
+    if not Path(path).exists():
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _git() -> dict:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "-uno"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def write_manifest(path: Path, args, variants: dict, cells: list, n_rows: int, renderer: PromptRenderer,
+                   started: float):
+    cond_info = lambda c: {
+        "with_doc": c.with_doc, "layout": c.layout, "batch_size": c.batch_size, "prefix_cache": c.prefix_cache,
+        "context": c.context.strategy if c.context else "full", "context_budget": c.context.budget if c.context else None,
+    }
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "wall_s": round(time.time() - started, 1),
+        "argv": sys.argv,
+        "git": _git(),
+        "input": {"path": str(args.input_file), "sha256": _sha256(args.input_file),
+                  "offset": args.offset, "limit": args.limit, "rows": n_rows},
+        "template_sha256": _sha256(TEMPLATE),
+        "variants": variants,
+        "render": {"renders": renderer.renders, "hits": renderer.hits},
+        "cells": [{
+            "label": c.label, "model_id": c.model.model_id, "backend": type(c.model).__name__,
+            "variant": c.variant, "condition": c.condition, "mode": c.cond.suffix,
+            "decoding": dataclasses.asdict(c.model.decoding), "prompt": cond_info(c.cond),
+            "output": str(c.out_path), "output_sha256": _sha256(c.out_path),
+            "rows": c.rows, "errors": c.errors, "seconds": round(c.seconds, 2),
+        } for c in cells],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run models x conditions x decoding variants with shared rendering")
+    ap.add_argument("--models", required=True, nargs="+", help="설정 파일의 모델 이름(들) (공백 또는 쉼표 구분)")
+    ap.add_argument("--conditions", nargs="+", choices=CONDITIONS, default=["seg", "doc", "window"],
+                    help="seg: 문서 없음, doc: 전체 문서, window/head/relevant: 토큰 예산 안의 문서 컨텍스트")
+    ap.add_argument("--decoding", nargs="+", type=parse_variant, default=[(DEFAULT_VARIANT, {})],
+                    metavar="NAME:key=value,...",
+                    help="디코딩 변형 (BaseModel.with_decoding). 예: default: t0:temperature=0 long:max_tokens=4096")
+    ap.add_argument("--manifest", default=None, help="manifest 경로 (기본: <output_dir>/sweep_manifest.json)")
+    add_run_args(ap)
+    args = ap.parse_args()
+    if not args.config:
+        ap.error("--config is required")
+
+    variants = dict(args.decoding)
+    if len(variants) != len(args.decoding):
+        ap.error("decoding variant names must be unique")
+    started = time.time()
+    if args.pool_size:
+        configure_pool(args.pool_size)
+    cache = make_cache(args)
+    budget = RetryBudget(ratio=args.retry_budget)
+    telemetry = Telemetry(args.telemetry)
+    if args.metrics_port:
+        telemetry.serve(args.metrics_port)
+        print(f"[TELEMETRY] Prometheus metrics: http://0.0.0.0:{args.metrics_port}/metrics")
+
+    models = build_models(args)
+    # keep_alive 기본값 등은 문서 컨텍스트 조건이 하나라도 있으면 그 기준으로 설정
+    base_args = condition_args(args, "doc" if set(args.conditions) - {"seg"} else "seg")
+    for _, model in models:
+        configure_model(model, base_args, cache, budget, telemetry)
+    try:
+        cells = build_cells(models, variants, args.conditions, base_args)
+    except ValueError as e:
+        ap.error(str(e))
+    print(f"[SWEEP] {len(cells)} cells: {len(models)} models x {len(variants)} variants x {len(args.conditions)} conditions")
+
+    index = JsonlIndex(Path(args.input_file))
+    positions = range(args.offset, len(index))
+    if args.limit:
+        positions = positions[:args.limit]
+    rows = list(index.read(positions))
+    renderer = PromptRenderer()
+
+    # backend마다 worker pool 하나. 같은 Ollama 서버의 (model, num_ctx) 그룹은 한 lane에서 차례로 실행
+    groups = backend_groups(cells)
+    errors = {}
+
+    def lane_worker(i, lane):
+        for key, _ in lane:
+            try:
+                run_group(groups[key], lambda: iter(rows), base_args, renderer, position=i)
+            except Exception as e:
+                errors[key[0]] = e
+
+    lanes = residency_lanes([(key, group[0].model) for key, group in groups.items()])
+    threads = [threading.Thread(target=lane_worker, args=(i, lane), name=f"sweep-{lane[0][0][0]}")
+               for i, lane in enumerate(lanes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for label, e in errors.items():
+        print(f"[ERROR] {label}: {e}")
+
+    print(f"[RENDER] {renderer.renders} prompts rendered, {renderer.hits} shared")
+    if cache is not None:
+        print(f"[CACHE] {cache.stats()}")
+        cache.close()
+    manifest = Path(args.manifest) if args.manifest else Path(args.output_dir) / "sweep_manifest.json"
+    write_manifest(manifest, args, variants, cells, len(rows), renderer, started)
+    print(f"[MANIFEST] {manifest}")
+    telemetry.close()
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
 #!/bin/bash
+# 로컬 mock 서버에 대해 generate.py를 한 번 돌려보는 스모크 테스트 (API 키/비용 없음)
+set -e
+PORT=${MOCK_PORT:-8800}
 
+python -m bench.mock_server --port "$PORT" &
+MOCK_PID=$!
+trap 'kill $MOCK_PID 2>/dev/null' EXIT
+sleep 1
+
+OPENAI_BASE_URL="http://127.0.0.1:$PORT/v1" OPENAI_API_KEYS="mock-key" \
 python generate.py \
   --config config/models.yaml \
   --input_file unittest/dummy_in.jsonl \
-  --output_dir unittest \
+  --output_dir unittest/out \
   --models "gpt-4o" \
   --with_doc \
-  --max_workers 1
\ No newline at end of file
+  --max_workers 1 \
+  --rpm 1e9 --tpm 1e12
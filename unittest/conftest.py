@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 저장소 루트의 models/, pipeline/, bench/를 import할 수 있도록
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
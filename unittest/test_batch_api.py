@@ -0,0 +1,66 @@
+import json
+import time
+
+import pytest
+
+from bench.mock_server import MockConfig, start
+from pipeline.batch_api import run_batch_api
+
+ROWS = [{"sample_id": i, "doc_id": 1, "src_seg": f"segment {i}"} for i in range(5)]
+
+
+def render(rows):
+    return "sys", "\n".join(f"<pe>{r['src_seg']}</pe>" for r in rows), {"prompt_tokens_est": 10}
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    server = start(MockConfig(batch_delay=0.3))
+    base = f"http://127.0.0.1:{server.server_port}/v1"
+    monkeypatch.setenv("OPENAI_API_KEYS", "mock-key")
+    from models.basemodel import OpenAIModel
+    yield server, base, OpenAIModel("gpt-4o-mini", "gpt-4o-mini")
+    server.shutdown()
+
+
+def test_submit_poll_collect(mock, tmp_path):
+    server, base, model = mock
+    state_path = tmp_path / "out.jsonl.batch.json"
+    delays = []
+
+    def sleep(d):
+        delays.append(d)
+        time.sleep(0.1)
+
+    recs = list(run_batch_api(model, ([r] for r in ROWS), render, state_path, base_url=base, poll=0.1, sleep=sleep))
+    assert sorted(r["sample_id"] for r in recs) == [0, 1, 2, 3, 4]
+    assert all(r["output"].startswith("<pe>") and r["batch_job"] for r in recs)
+    assert delays and delays == sorted(delays)      # polling 간격은 늘어나기만 함
+    state = json.loads(state_path.read_text())
+    assert state["collected"] and len(state["jobs"]) == 1 and state["jobs"][0]["requests"] == 5
+    assert len(server.state.batches) == 1
+
+
+def test_resume_from_state_file(mock, tmp_path):
+    server, base, model = mock
+    state_path = tmp_path / "out.jsonl.batch.json"
+
+    def interrupt(d):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        list(run_batch_api(model, ([r] for r in ROWS), render, state_path, base_url=base, poll=0.1, sleep=interrupt))
+    state = json.loads(state_path.read_text())
+    assert len(state["jobs"]) == 1 and not state.get("collected")
+
+    def no_chunks():
+        raise AssertionError("resume must not render or submit again")
+        yield
+
+    recs = list(run_batch_api(model, no_chunks(), render, state_path, base_url=base, poll=0.1,
+                              sleep=lambda d: time.sleep(0.1)))
+    assert sorted(r["sample_id"] for r in recs) == [0, 1, 2, 3, 4]
+    assert {r["batch_job"] for r in recs} == {state["jobs"][0]["id"]}
+    assert all(r.get("prompt_tokens_est") == 10 for r in recs)     # 저장된 meta도 복원
+    assert len(server.state.batches) == 1
+    assert json.loads(state_path.read_text())["collected"]
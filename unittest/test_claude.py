@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import models.claude
+from models.claude import ClaudeModel
+
+
+class RecordingMessages:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        usage = SimpleNamespace(input_tokens=10, output_tokens=3)
+        return SimpleNamespace(content=[SimpleNamespace(text="<pe>ok</pe>")], usage=usage)
+
+
+def test_decoding_overrides_reach_the_request(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "k")
+    monkeypatch.setattr(models.claude, "httpx_client", lambda: None)
+    model = ClaudeModel()
+    messages = RecordingMessages()
+    model.clients = {"k": SimpleNamespace(messages=messages)}
+
+    # --models claude: max_tokens만 보내고 샘플링은 API 기본값 (baseline과 같은 조건)
+    model._generate("sys", "user")
+    assert {k: v for k, v in messages.calls[0].items() if k not in ("system", "messages")} == {
+        "model": model.model_name, "max_tokens": 4096}
+
+    model.with_decoding(temperature=0.0, max_tokens=64)
+    model._generate("sys", "user")
+    assert messages.calls[1]["temperature"] == 0.0
+    assert messages.calls[1]["max_tokens"] == 64
+    assert "top_p" not in messages.calls[1]
+    assert model.batch_params("sys", "user")["temperature"] == 0.0
@@ -0,0 +1,10 @@
+from prompts.context import ContextSelector
+
+
+def test_window_is_contiguous():
+    # 세그먼트 오른쪽에 긴 문장이 있으면 그 너머의 짧은 문장은 건너뛰지 않고 멈춤
+    doc = "a. seg here. " + " ".join(["long"] * 20) + ". b. c."
+    selector = ContextSelector("window", budget=2 * 8)
+    src, _, info = selector.select(doc, "", ["seg here."], [])
+    assert src == "a. seg here. ..."
+    assert info["context_tokens"] == 3
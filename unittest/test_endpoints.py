@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from bench.mock_server import MockConfig, start
+from models.basemodel import HFChatModel
+
+USER = "Correct the translation.\n<pe>x</pe>"
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def make(**cfg):
+        server = start(MockConfig(**cfg))
+        started.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+    yield make
+    for server in started:
+        server.shutdown()
+
+
+def test_hedge_wins_and_cancels_slow_replica(servers):
+    slow, slow_url = servers(ttft="fixed:2.0")
+    _, fast_url = servers(ttft="fixed:0.01")
+    model = HFChatModel("m", "mock", endpoint=[slow_url, fast_url], hedge=True)
+    pool = model.endpoints
+    pool.hedge_min_samples = 1
+    pool.latency.add(0.05)
+
+    t0 = time.perf_counter()
+    (text, _, out_token, extra), _ = model._call("sys", USER)
+    assert time.perf_counter() - t0 < 1.0
+    assert text.startswith("<pe>")
+    # --stream 없이: 취소용 스트리밍이라도 끝까지 읽고 ttft/early_stop은 기록하지 않음 (비헤지 행과 같은 필드)
+    assert out_token is not None and "ttft" not in extra and "early_stop" not in extra
+    assert pool.counts["hedged"] == 1 and pool.counts["hedge_wins"] == 1
+
+    # 진 요청은 ttft(2초)를 기다리지 않고 끊김
+    deadline = time.monotonic() + 1.0
+    while pool.inflight[slow_url] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert pool.inflight[slow_url] == 0
+    assert pool.failures[slow_url] == 0 and pool.healthy[slow_url]
+
+
+def test_failing_replica_is_ejected(servers):
+    _, bad_url = servers(error_rate=1.0)
+    good, good_url = servers(ttft="fixed:0.01")
+    model = HFChatModel("m", "mock", endpoint=[bad_url, good_url])
+    pool = model.endpoints
+    pool.health_interval = 60
+
+    errors = 0
+    for _ in range(8):
+        try:
+            model._call("sys", USER)
+        except Exception:
+            errors += 1
+    assert errors == pool.fail_threshold
+    assert not pool.healthy[bad_url] and pool.counts["ejected"] == 1
+    assert good.state.counts["requests"] == 8 - pool.fail_threshold
@@ -0,0 +1,51 @@
+import generate
+from pipeline.render import Condition
+
+
+class FixedRenderer:
+    def render(self, rows, *args):
+        return "sys", "user", {}
+
+
+class BatchedModel:
+    telemetry = None
+
+    def generate(self, system, user):
+        usage = {"input_token": 10, "output_token": 4, "latency": 1.0, "ttft": 0.2,
+                 "early_stop": True, "cache_hit": True, "retries": 2}
+        return "<pe id=1>a</pe>\n<pe id=2>bb</pe>", usage
+
+
+def test_batched_rows_keep_call_level_usage():
+    rows = [{"sample_id": 1}, {"sample_id": 2}]
+    recs = generate.run_batch(BatchedModel(), rows, Condition(batch_size=2), FixedRenderer())
+    assert [r["output"] for r in recs] == ["<pe>a</pe>", "<pe>bb</pe>"]
+    assert sum(r["input_token"] for r in recs) == 10 and sum(r["latency"] for r in recs) == 1.0
+    for r in recs:
+        assert r["ttft"] == 0.2 and r["early_stop"] and r["cache_hit"] and r["batch_size"] == 2
+    # 재시도는 호출 단위 -> 합계가 실제 재시도 수와 같음
+    assert sum(r["retries"] for r in recs) == 2
+
+
+class UnparsableBatchModel:
+    telemetry = None
+
+    def generate(self, system, user):
+        if "<seg id=" in user:
+            return "no tags", {"input_token": 10, "output_token": 7, "latency": 2.0}
+        return "<pe>x</pe>", {"input_token": 3, "output_token": 1, "latency": 0.5}
+
+
+class SegRenderer:
+    def render(self, rows, *args):
+        return "sys", "".join(f"<seg id={i}>" for i in range(len(rows))) if len(rows) > 1 else "user", {}
+
+
+def test_wasted_batch_usage_is_kept_on_fallback_rows():
+    rows = [{"sample_id": 1}, {"sample_id": 2}]
+    recs = generate.run_batch(UnparsableBatchModel(), rows, Condition(batch_size=2), SegRenderer())
+    assert all(r["batch_fallback"] and r["input_token"] == 3 for r in recs)
+    # 버려진 배치 호출의 토큰/지연도 합계에 남음
+    assert sum(r["batch_wasted_input_token"] for r in recs) == 10
+    assert sum(r["batch_wasted_output_token"] for r in recs) == 7
+    assert sum(r["batch_wasted_latency"] for r in recs) == 2.0
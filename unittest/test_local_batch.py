@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from models.local_batch import BatchEngine, length_buckets, padding_waste
+
+
+def sizes(buckets):
+    return [[length for length, _ in b] for b in buckets]
+
+
+def test_buckets_respect_batch_size():
+    items = [(10, i) for i in range(10)]
+    assert [len(b) for b in length_buckets(items, batch_size=4, max_waste=0.3)] == [4, 4, 2]
+
+
+def test_buckets_respect_padding_waste():
+    items = [(41, "e"), (10, "a"), (40, "d"), (11, "c"), (10, "b")]
+    buckets = length_buckets(items, batch_size=8, max_waste=0.3)
+    assert sizes(buckets) == [[10, 10, 11], [40, 41]]
+    assert all(padding_waste(lengths) <= 0.3 for lengths in sizes(buckets))
+    # 상한이 0이면 길이가 다른 항목은 같은 batch에 들어가지 않음
+    assert sizes(length_buckets(items, 8, 0.0)) == [[10, 10], [11], [40], [41]]
+
+
+def test_engine_batches_concurrent_submits():
+    seen = []
+
+    def run_batch(items):
+        seen.append(list(items))
+        return [item * 2 for item in items]
+
+    engine = BatchEngine(run_batch, batch_size=4, max_padding_waste=0.5, max_wait=0.2)
+    results = {}
+
+    def submit(i):
+        results[i] = engine.submit(i, 100 + i).result(5)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == {i: i * 2 for i in range(8)}
+    assert all(len(b) <= 4 for b in seen)
+    summary = engine.summary()
+    assert summary["rows"] == 8 and summary["batches"] == len(seen)
+
+
+class PeTokenizer:
+    """Every token decodes to '</pe>', so each generated token completes one tag."""
+
+    pad_token_id = 0
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "</pe>" * len(ids)
+
+
+def test_pe_stop_per_row_on_cpu():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from models.basemodel import BaseModel, Decoding
+    from models.llama3_1 import Llama31Model
+
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=64, n_positions=64, n_embd=16, n_layer=1, n_head=2)
+    model = Llama31Model.__new__(Llama31Model)
+    BaseModel.__init__(model, "tiny", "tiny-gpt2", Decoding(temperature=0.0, max_tokens=10))
+    model.torch = torch
+    model.tokenizer = PeTokenizer()
+    model.model = transformers.GPT2LMHeadModel(config).eval()
+    model.terminators = [63]
+
+    kwargs = {"max_new_tokens": 10, "do_sample": False, "suppress_tokens": [0, 63]}
+    # 1번 row는 </pe> 하나, 2번 row는 둘을 기다림 -> 각각 1, 2 토큰에서 멈춤
+    out = model._generate_batch([([5, 6, 7], 1, kwargs), ([8, 9], 2, kwargs)])
+    assert [n_tok for _, n_tok, _, _ in out] == [1, 2]
+    assert all(stopped for _, _, stopped, _ in out)
+    assert all(batch == 2 for _, _, _, batch in out)
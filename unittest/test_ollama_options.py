@@ -0,0 +1,31 @@
+from models.llama_ollama import OllamaModel
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"message": {"content": "<pe>ok</pe>"}, "prompt_eval_count": 10, "eval_count": 3}
+
+
+def test_decoding_is_sent_as_options():
+    model = OllamaModel(decoding={"temperature": 0.0, "max_tokens": 77, "num_ctx": 4096})
+    model.client = RecordingClient()
+    model.with_decoding(top_p=0.5)
+    model._generate("sys", "user")
+    options = model.client.calls[0]["options"]
+    assert options == {"temperature": 0.0, "top_p": 0.5, "num_predict": 77, "num_ctx": 4096}
+
+
+def test_legacy_model_keeps_ollama_defaults():
+    # --models llama: 디코딩 지정이 없으면 options를 보내지 않음 (baseline과 같은 조건)
+    model = OllamaModel()
+    model.client = RecordingClient()
+    model._generate("sys", "user")
+    assert model.client.calls[0]["options"] == {}
+
+    model.with_decoding(temperature=0.0)
+    model._generate("sys", "user")
+    assert model.client.calls[1]["options"] == {"temperature": 0.0}
@@ -0,0 +1,15 @@
+from models.loaders import load_models_from_yaml
+from pipeline.planner import format_plan, plan_run
+
+
+def test_unavailable_tokenizer_is_labelled_heuristic(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("OPENAI_API_KEYS", "k")
+    config = tmp_path / "models.yaml"
+    config.write_text("models:\n  - name: m\n    backend: openai\n    model_id: gpt-4o-mini\n"
+                      f"    tokenizer: {tmp_path / 'missing'}\n", encoding="utf-8")
+    [model] = load_models_from_yaml(config, ["m"])
+    assert "tokenizer" in capsys.readouterr().out
+
+    plan = plan_run(model, [([{"tgt_seg": "번역"}], "system", "원문 문장")])
+    assert plan["token_source"] == "heuristic"
+    assert "character heuristic" in format_plan(plan)
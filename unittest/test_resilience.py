@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from models.resilience import CircuitBreaker, Resilience
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def fail(status):
+    def fn():
+        raise HTTPError(status)
+    return fn
+
+
+def run_with_timeout(fn, timeout=2.0):
+    box = {}
+
+    def target():
+        try:
+            box["result"] = fn()
+        except Exception as e:
+            box["error"] = e
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "call blocked on the circuit breaker"
+    return box
+
+
+def test_non_retryable_probe_closes_breaker():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    res = Resilience(max_attempts=1, breaker=breaker, sleep=lambda s: None)
+    with pytest.raises(HTTPError):
+        res.call(fail(503))
+    assert breaker.state == "open"
+
+    # half-open probe가 400을 받음 -> 백엔드는 응답했으므로 닫힘
+    box = run_with_timeout(lambda: res.call(fail(400)))
+    assert isinstance(box["error"], HTTPError)
+    assert breaker.state == "closed"
+
+    box = run_with_timeout(lambda: res.call(lambda: "ok"))
+    assert box["result"] == ("ok", 1)
+
+
+def test_interrupted_probe_is_released():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    res = Resilience(max_attempts=1, breaker=breaker, sleep=lambda s: None)
+    with pytest.raises(HTTPError):
+        res.call(fail(503))
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        res.call(interrupted)
+    assert not breaker.probing
+
+    box = run_with_timeout(lambda: res.call(lambda: "ok"))
+    assert box["result"] == ("ok", 1)
@@ -0,0 +1,16 @@
+import json
+
+from pipeline.io import JsonlIndex, iter_jsonl
+from pipeline.scheduler import doc_positions, group_by_doc
+
+
+def test_doc_positions_matches_group_by_doc(tmp_path):
+    path = tmp_path / "in.jsonl"
+    docs = [3, 1, 3, "a", 1, None, 3, "a", None]
+    path.write_text("".join(json.dumps({"sample_id": i, "doc_id": d}) + "\n" for i, d in enumerate(docs)))
+    index = JsonlIndex(path)
+
+    positions = range(1, len(index))
+    grouped = list(index.read(doc_positions(index.docs, positions)))
+    assert grouped == list(group_by_doc(list(iter_jsonl(path))[1:]))
+    assert [r["sample_id"] for r in grouped] == [1, 4, 2, 6, 3, 7, 5, 8]
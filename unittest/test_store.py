@@ -0,0 +1,17 @@
+import json
+
+import pytest
+
+from pipeline.store import result_rows
+
+
+@pytest.mark.parametrize("mode, with_doc", [
+    ("seg", False), ("doc", True), ("doc_first", True), ("batch4.doc_first", True),
+    ("batch4.seg", False), ("doc.window600", True),
+])
+def test_with_doc_from_mode(tmp_path, mode, with_doc):
+    out = tmp_path / f"m_5_samples.{mode}.jsonl"
+    out.write_text(json.dumps({"sample_id": 0, "output": "ok"}) + "\n", encoding="utf-8")
+    [row] = result_rows(out, {}, "r")
+    assert row["mode"] == mode
+    assert row["with_doc"] is with_doc
@@ -0,0 +1,56 @@
+import threading
+
+from models.basemodel import Decoding, BaseModel
+from models.llama3_1 import Llama31Model
+from models.local_batch import BatchEngine
+from sweep import make_variant, parse_variant
+
+
+class FakeTokenizer:
+    chat_template = None
+
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": list(range(len(text.split())))}
+
+
+def local_model(run_batch):
+    """Llama31Model without loading a checkpoint: only what _generate needs."""
+    model = Llama31Model.__new__(Llama31Model)
+    BaseModel.__init__(model, "llama3_1", "tiny", Decoding(temperature=0.6, top_p=0.9, max_tokens=64))
+    model.tokenizer = FakeTokenizer()
+    model.engine = BatchEngine(run_batch, batch_size=8, max_padding_waste=1.0, max_wait=0.2)
+    return model
+
+
+def test_parse_variant():
+    assert parse_variant("t0:temperature=0,max_tokens=128") == ("t0", {"temperature": 0, "max_tokens": 128})
+    assert parse_variant("default:") == ("default", {})
+
+
+def test_variant_decoding_reaches_local_generate():
+    batches = []
+
+    def run_batch(items):
+        batches.append([kwargs for _, _, kwargs in items])
+        return [("<pe>x</pe>", 3, True, len(items)) for _ in items]
+
+    base = local_model(run_batch)
+    variant = make_variant(base, "t0", {"temperature": 0.0, "max_tokens": 16})
+    assert variant.engine is base.engine
+    assert base.decoding.temperature == 0.6
+
+    threads = [threading.Thread(target=m._generate, args=("sys", "translate <pe> this </pe>"))
+               for m in (base, variant, base, variant)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    seen = [kw for batch in batches for kw in batch]
+    assert len(seen) == 4
+    assert sorted(kw["max_new_tokens"] for kw in seen) == [16, 16, 64, 64]
+    for kw in seen:
+        assert kw["do_sample"] == (kw["max_new_tokens"] == 64)
+    # 다른 디코딩 설정은 같은 batch로 묶이지 않음
+    for batch in batches:
+        assert len({tuple(sorted(kw.items())) for kw in batch}) == 1
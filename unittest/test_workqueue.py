@@ -0,0 +1,46 @@
+import json
+import threading
+
+from pipeline.workqueue import WorkQueue
+
+
+def test_concurrent_export(tmp_path):
+    queue = WorkQueue(tmp_path / "q.sqlite")
+    rows = [{"sample_id": i, "src_seg": "x" * 200} for i in range(500)]
+    queue.enqueue("m", "seg", enumerate(rows))
+    leased = queue.lease("m", "seg", "w", 500)
+    queue.complete("m", "seg", "w", [{"sample_id": r["sample_id"], "output": "ok"} for r in leased])
+
+    out = tmp_path / "out.jsonl"
+    errors = []
+
+    def export():
+        try:
+            queue.export("m", "seg", out)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert [json.loads(l)["sample_id"] for l in out.read_text().splitlines()] == list(range(500))
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_release_keeps_other_models_leases(tmp_path):
+    # 한 프로세스의 모델 thread들은 같은 worker id를 씀: 먼저 끝난 모델이 다른 모델의 lease를 풀면 안 됨
+    queue = WorkQueue(tmp_path / "q.sqlite")
+    rows = [{"sample_id": i} for i in range(4)]
+    for model in ("a", "b"):
+        queue.enqueue(model, "seg", enumerate(rows))
+    queue.lease("a", "seg", "w", 4)
+    leased = queue.lease("b", "seg", "w", 4)
+
+    queue.release("a", "seg", "w")
+    assert queue.counts("a", "seg") == {"pending": 4}
+    queue.renew("b", "seg", "w")
+    counts = queue.complete("b", "seg", "w", [{"sample_id": r["sample_id"], "output": "ok"} for r in leased])
+    assert counts == {"done": 4, "retry": 0, "lost": 0}